@@ -1,6 +1,19 @@
+import re
 from semantic_text_splitter import TextSplitter
 from langchain.text_splitter import NLTKTextSplitter
 
+# Các cấp cấu trúc văn bản pháp luật, từ cao xuống thấp
+LEGAL_LEVELS = ["chuong", "muc", "dieu", "khoan", "diem"]
+LEGAL_HEADING = re.compile(
+    r"^[ \t]*(?:"
+    r"(?P<chuong>(?:Chương|CHƯƠNG)[ \t]+(?:[IVXLCDM]+|\d+))\b"
+    r"|(?P<muc>(?:Mục|MỤC)[ \t]+\d+)\b"
+    r"|(?P<dieu>(?:Điều|ĐIỀU)[ \t]+\d+[a-z]?)\b"
+    r"|(?P<khoan>\d{1,3})\.[ \t]"
+    r"|(?P<diem>[a-zđ])\)[ \t]"
+    r")"
+)
+
 class Chunking:
     '''Initializes the class with specified maximum characters and overlap size for text splitting.
 
@@ -99,4 +112,125 @@ class Chunking:
             List of dictionaries containing 'content' and 'chunk_id' for each chunk
         """
         chunks = [chunk.strip() for chunk in text.split(separator) if chunk.strip()]
-        return [{'content': chunk, 'chunk_id': idx + 1} for idx, chunk in enumerate(chunks)]
\ No newline at end of file
+        return [{'content': chunk, 'chunk_id': idx + 1} for idx, chunk in enumerate(chunks)]
+
+
+class LegalStructureChunker:
+    '''Single-pass streaming chunker aware of Vietnamese legal structure (Chương / Mục / Điều / Khoản / Điểm).
+
+    Text is consumed line by line from an iterable of page texts, so a document never has
+    to be joined into one string. A new chunk starts at every Chương/Mục/Điều heading once
+    the current chunk holds at least min_characters, and when the chunk is full (lines are
+    cut at the last space that fits within max_characters). The overlap is the tail of the
+    previous chunk taken by offset, so nothing is split twice.
+
+    Offsets refer to the page texts concatenated with a newline after each page; every
+    chunk's content is exactly that text sliced by [start, end).
+
+    Args:
+        max_characters (int, optional): Maximum characters of a chunk, excluding overlap. Defaults to 1000.
+        overlap_size (int, optional): Characters of the previous chunk prepended to each chunk. Defaults to 50.
+        min_characters (int, optional): Minimum size before a heading forces a new chunk. Defaults to 500.
+    '''
+    def __init__(self, max_characters=1000, overlap_size=50, min_characters=500):
+        self.max_characters = max_characters
+        self.overlap_size = overlap_size
+        self.min_characters = min_characters
+
+    def chunk_pages(self, pages):
+        """Chunk an iterable of page texts.
+
+        Yields:
+            dict: A chunk with the following keys:
+                - 'content' (str): The text of the chunk, including the overlap.
+                - 'chunk_id' (int): The ID of the chunk, starting from 1.
+                - 'start', 'end' (int): Character offsets of the content in the document.
+                - 'page' (int): Page (starting from 1) where the chunk body starts.
+                - 'path' (str): Structural position, e.g. 'Chương II > Điều 5 > Khoản 2'.
+        """
+        path = {}
+        parts, body_start, body_len = [], None, 0
+        chunk_path, chunk_page = "", 1
+        prev_body = ""
+        chunk_id = 0
+        pos = 0
+
+        def emit():
+            nonlocal parts, body_start, body_len, prev_body, chunk_id
+            body = "".join(parts)
+            overlap = self._tail(prev_body) if prev_body else ""
+            content = overlap + body
+            start = body_start - len(overlap)
+            parts, body_start, body_len = [], None, 0
+            stripped = content.strip()
+            if not stripped:
+                return None
+            prev_body = body
+            start += len(content) - len(content.lstrip())
+            chunk_id += 1
+            return {
+                'content': stripped,
+                'chunk_id': chunk_id,
+                'start': start,
+                'end': start + len(stripped),
+                'page': chunk_page,
+                'path': chunk_path,
+            }
+
+        for page_no, page in enumerate(pages, start=1):
+            for line in (page + "\n").splitlines(keepends=True):
+                match = LEGAL_HEADING.match(line)
+                level = match.lastgroup if match else None
+                if level in ("chuong", "muc", "dieu") and parts and body_len >= self.min_characters:
+                    chunk = emit()
+                    if chunk:
+                        yield chunk
+                if level:
+                    path[level] = " ".join(match.group(level).split())
+                    for lower in LEGAL_LEVELS[LEGAL_LEVELS.index(level) + 1:]:
+                        path.pop(lower, None)
+                    if level in ("khoan", "diem"):
+                        path[level] = ("Khoản " if level == "khoan" else "Điểm ") + path[level]
+                    if body_start is not None and not chunk_path:
+                        chunk_path = " > ".join(path[lvl] for lvl in LEGAL_LEVELS if lvl in path)
+                while line:
+                    if body_start is None:
+                        body_start = pos
+                        chunk_page = page_no
+                        chunk_path = " > ".join(path[lvl] for lvl in LEGAL_LEVELS if lvl in path)
+                    piece = line
+                    room = self.max_characters - body_len
+                    if len(line) > room:
+                        # Lấp đầy chunk hiện tại đến ranh giới từ gần nhất rồi cắt
+                        cut = line.rfind(" ", 0, room) + 1
+                        if cut == 0:
+                            # Không có khoảng trắng: sang chunk mới, hoặc cắt cứng nếu chunk đang rỗng
+                            cut = room if body_len == 0 else 0
+                        piece = line[:cut]
+                    parts.append(piece)
+                    body_len += len(piece)
+                    pos += len(piece)
+                    line = line[len(piece):]
+                    if line:
+                        chunk = emit()
+                        if chunk:
+                            yield chunk
+
+        chunk = emit() if parts else None
+        if chunk:
+            yield chunk
+
+    def split_document(self, document_text):
+        """Chunk a single string; same output as chunk_pages([document_text])."""
+        return list(self.chunk_pages([document_text]))
+
+    def _tail(self, body):
+        """Last overlap_size characters of body, starting at a word boundary when possible."""
+        if self.overlap_size <= 0:
+            return ""
+        tail = body[-self.overlap_size:]
+        if len(tail) < len(body) and not body[-self.overlap_size - 1].isspace():
+            space = re.search(r"\s", tail)
+            if space:
+                tail = tail[space.end():]
+        return tail
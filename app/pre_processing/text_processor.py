@@ -1,29 +1,38 @@
 from bs4 import BeautifulSoup
 import re
-import html
+from concurrent.futures import ProcessPoolExecutor
 from unicodedata import normalize
 
+RE_D3K2 = re.compile(r"(d3\s*k2)|(k2\s*d3)")
+RE_NUMBER_CHAR = re.compile(r'(\d)([A-Za-z]+)(\d?)')
+RE_MULTI_PLUS = re.compile(r"\++")
+RE_MULTI_SPACE = re.compile(r"\s+")
+RE_SPECIAL_CHARS = re.compile(r'[^\w\s%+.,]')
+RE_EMOJI = re.compile(u'([\U00002600-\U000027BF])|([\U0001f300-\U0001f64F])|([\U0001f680-\U0001f6FF])')
+VIETNAMESE_LOWER = '0123456789abcdefghijklmnopqrstuvwxyzàáâãèéêìíòóôõùúýăđĩũơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ0123456789!"#$%&''()*+,-./:;<=>?@[\]^_`{|}~ '
+RE_JOIN_LINE = re.compile(r'\n(?=[' + VIETNAMESE_LOWER + '])')
+
 def add_space_between_number_and_char(input_string):
     # Use regular expression to match a number followed by a character and insert a space between them
-    if re.search("(d3\s*k2)|(k2\s*d3)", input_string): 
-        result = re.sub("(d3\s*k2)|(k2\s*d3)", "d3 k2", input_string)
+    if RE_D3K2.search(input_string): 
+        result = RE_D3K2.sub("d3 k2", input_string)
     else:
-        result = re.sub(r'(\d)([A-Za-z]+)(\d?)', r'\1 \2 \3', input_string)
+        result = RE_NUMBER_CHAR.sub(r'\1 \2 \3', input_string)
     
     return result
 
 def sub_multi_plus(input_string):
-    result = re.sub("\++", "+", input_string)
+    result = RE_MULTI_PLUS.sub("+", input_string)
     return result
 
 def sub_multi_space(input_string):
-    result = re.sub("\s+", " ", input_string)
+    result = RE_MULTI_SPACE.sub(" ", input_string)
     return result
 
 def remove_special_chars(input_string):
     # Use regular expression to remove special characters except %, ., and +
-    result = re.sub(r'[^\w\s%+.,]', ' ', input_string)
-    result = re.sub("\s+", " ", result)
+    result = RE_SPECIAL_CHARS.sub(' ', input_string)
+    result = RE_MULTI_SPACE.sub(" ", result)
     
     return result
 
@@ -31,12 +40,18 @@ def remove_html_tags(text):
     if not isinstance(text, str):
         return text
     
-    soup = BeautifulSoup(text, 'html.parser')
-    stripped_text = soup.get_text(separator='\n')
+    if '<' in text or '&' in text:
+        soup = BeautifulSoup(text, 'html.parser')
+        stripped_text = soup.get_text(separator='\n')
+    elif text and not text.strip(' \n\t\x0c\r'):
+        # Như BeautifulSoup: chuỗi chỉ gồm khoảng trắng ASCII được thay bằng một ký tự
+        stripped_text = '\n' if '\n' in text else ' '
+    else:
+        # Không có thẻ hay entity: html.parser trả lại nguyên văn bản, bỏ qua bước parse
+        stripped_text = text
     # remove \xa0
-    vietnamese_lower = '0123456789abcdefghijklmnopqrstuvwxyzàáâãèéêìíòóôõùúýăđĩũơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ0123456789!"#$%&''()*+,-./:;<=>?@[\]^_`{|}~ '
     stripped_text = stripped_text.replace('\xa0', ' ')
-    formatted_text = re.sub(r'\n(?=[' + vietnamese_lower + '])', '', stripped_text)
+    formatted_text = RE_JOIN_LINE.sub('', stripped_text)
 
     # while formatted_text.find('\n\n') != -1:
     #     formatted_text = formatted_text.replace('\n\n', '\n')
@@ -44,16 +59,11 @@ def remove_html_tags(text):
     return formatted_text
 
 def decode_html_entities(text):
-    decoded_text = html.unescape(text)
-    decoded_text = decoded_text.replace('&nbsp;', ' ')
-    decoded_text = decoded_text.replace('\n', ' ')
-    
-    return decoded_text
+    # Entity đã được BeautifulSoup giải mã trong remove_html_tags, ở đây chỉ gộp khoảng trắng
+    return RE_MULTI_SPACE.sub(" ", text)
 
 
 def strip_emoji(text):
-    RE_EMOJI = re.compile(u'([\U00002600-\U000027BF])|([\U0001f300-\U0001f64F])|([\U0001f680-\U0001f6FF])')
-
     return RE_EMOJI.sub(r'', text)
 
 def remove_special_char_at_ends(text):
@@ -72,38 +82,48 @@ def normalize_searchterm(text):
 
 
 def normalize_text(text):
-    text = text.replace(" ", " ")
     return normalize("NFC", text).strip()
 
-def remove_html_tags(text):
-    if not isinstance(text, str):
-        return text
-    
-    soup = BeautifulSoup(text, 'html.parser')
-    stripped_text = soup.get_text(separator='\n')
-    # remove \xa0
-    vietnamese_lower = '0123456789abcdefghijklmnopqrstuvwxyzàáâãèéêìíòóôõùúýăđĩũơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ0123456789!"#$%&''()*+,-./:;<=>?@[\]^_`{|}~ '
-    stripped_text = stripped_text.replace('\xa0', ' ')
-    formatted_text = re.sub(r'\n(?=[' + vietnamese_lower + '])', '', stripped_text)
-
-    # while formatted_text.find('\n\n') != -1:
-    #     formatted_text = formatted_text.replace('\n\n', '\n')
-    
-    return formatted_text
-
-def decode_html_entities(text):
-    decoded_text = html.unescape(text)
-    decoded_text = decoded_text.replace('&nbsp;', ' ')
-    decoded_text = re.sub("\s+", " ", text)
-    
-    return decoded_text
-
 def ensure_ends_with_dot(s):
     if not s.endswith('.'): 
         s += '.'       
     return s
 
+
+class _CleanTable(dict):
+    '''str.translate table fusing strip_emoji and the replacement in remove_special_chars.
+
+    Emoji map to None (deleted), other characters outside [\\w\\s%+.,] to a space and the rest
+    to themselves. Entries are computed with the same regexes on first use and cached.
+    '''
+    def __missing__(self, code):
+        char = chr(code)
+        if RE_EMOJI.match(char):
+            value = None
+        elif RE_SPECIAL_CHARS.match(char):
+            value = ' '
+        else:
+            value = code
+        self[code] = value
+        return value
+
+CLEAN_TABLE = _CleanTable()
+
+def _strip_emoji_and_special_chars(text):
+    """strip_emoji + remove_special_chars + sub_multi_plus + sub_multi_space in one translate and two regex passes."""
+    text = RE_MULTI_SPACE.sub(" ", text.translate(CLEAN_TABLE))
+    if '++' in text:
+        text = RE_MULTI_PLUS.sub("+", text)
+    return text
+
 class TextProcessor():
+    '''Text normalization for search terms and document text.
+
+    All regexes are compiled once at import. clean_text and process_shortDescription give
+    exactly the output of the step-by-step module functions, but strip emoji, replace special
+    characters and collapse whitespace in a single str.translate pass, and only parse HTML
+    when the text contains '<' or '&'.
+    '''
     def __init__(self) -> None:
         """Initialize the PreProcessor."""
         pass
@@ -118,12 +138,11 @@ class TextProcessor():
             str: The processed search term.
         """
         text = normalize_searchterm(query)
-        text = strip_emoji(text)
-        text = remove_special_chars(text)
+        # strip_emoji + remove_special_chars
+        text = RE_MULTI_SPACE.sub(" ", text.translate(CLEAN_TABLE))
         # text = add_space_between_number_and_char(text)
         text = remove_special_char_at_ends(text)
         text = sub_multi_plus(text)
-        text = sub_multi_space(text)
         text = text.strip().lower()
     
         return text
@@ -133,11 +152,7 @@ class TextProcessor():
             return ""
         text = normalize_text(text)
         text = remove_html_tags(text)
-        text = decode_html_entities(text)
-        text = strip_emoji(text)
-        text = remove_special_chars(text)
-        text = sub_multi_plus(text)
-        text = sub_multi_space(text)
+        text = _strip_emoji_and_special_chars(text)
 
         return text.strip()
 
@@ -146,14 +161,27 @@ class TextProcessor():
             return ""
         text = normalize_text(text)
         text = remove_html_tags(text)
-        text = decode_html_entities(text)
-        text = strip_emoji(text)
-        text = remove_special_chars(text)
-        text = sub_multi_plus(text)
-        text = sub_multi_space(text)
+        text = _strip_emoji_and_special_chars(text)
         text = ensure_ends_with_dot(text)
 
         return text.strip()
+
+    def clean_texts(self, texts, workers=None, chunksize=256):
+        """clean_text for many texts, optionally spread over a process pool.
+
+        Args:
+            texts (iterable of str): The texts to clean.
+            workers (int, optional): Number of processes. None or 1 cleans in this process,
+                which is faster unless there are many thousands of texts.
+            chunksize (int, optional): Texts sent to a worker at a time. Defaults to 256.
+
+        Returns:
+            list of str: The cleaned texts, in input order.
+        """
+        if not workers or workers <= 1:
+            return [self.clean_text(text) for text in texts]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_clean_text, texts, chunksize=chunksize))
     
     # def process_vaccineName(self, df):
     #     df = df.str.replace(r"[ -]", "_", regex=True)
@@ -162,4 +190,11 @@ class TextProcessor():
     def process_vaccineName(self, text):
         # If the input is a single string, apply the regex replacement
         processed_text = re.sub(r"[ -]", "_", text)
-        return processed_text
\ No newline at end of file
+        return processed_text
+
+
+def _clean_text(text):
+    # Hàm cấp module để ProcessPoolExecutor pickle được
+    return _processor.clean_text(text)
+
+_processor = TextProcessor()
@@ -1,6 +1,159 @@
 import re
 
+import numpy as np
+
+VIETNAMESE_CHARS = 'àáảãạăằắẳẵặâầấẩẫậđèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵ'
+RE_WORD = re.compile(r'\b\w+\b')
+RE_SENTENCE_END = re.compile(r'[.!?]+')
+RE_VIETNAMESE_CHAR = re.compile(f'[{VIETNAMESE_CHARS}]')
+RE_NUMBER = re.compile(r'\d+')
+RE_SPECIAL_CHAR = re.compile(f'[^\\w\\s{VIETNAMESE_CHARS}.,!?]')
+RE_COMPLETE_SENTENCE = re.compile(r'[.!?][\'"]?\s*$')
+
+FRT_SOURCES = ['vac', 'lc', 'ttdt']
+LIVE_CHAT_SOURCES = ['chat']
+
+WEIGHTS = {
+    'length_score': 0.2,
+    'punctuation': 0.1,
+    'vietnamese_char_ratio': 0.15,
+    'numeric_ratio': 0.1,
+    'special_char_ratio': 0.1,
+    'sentence_completeness': 0.1,
+    'source_quality': 0.25
+}
+
+# Cờ cho từng ký tự BMP, tính một lần bằng chính các regex ở trên
+_WORD, _VIETNAMESE, _DIGIT, _SPECIAL, _SENTENCE_END = 1, 2, 4, 8, 16
+_flag_table = None
+
+
+def _char_flags(chars: str) -> np.ndarray:
+    flags = np.zeros(len(chars), dtype=np.uint8)
+    for flag, pattern in ((_WORD, r'\w'), (_VIETNAMESE, RE_VIETNAMESE_CHAR.pattern), (_DIGIT, r'\d'),
+                          (_SPECIAL, RE_SPECIAL_CHAR.pattern), (_SENTENCE_END, r'[.!?]')):
+        positions = [m.start() for m in re.finditer(pattern, chars)]
+        flags[positions] |= flag
+    return flags
+
+
+def _flags(codes: np.ndarray) -> np.ndarray:
+    global _flag_table
+    if _flag_table is None:
+        _flag_table = _char_flags(''.join(map(chr, range(0x10000))))
+    flags = _flag_table[np.minimum(codes, 0xFFFF)]
+    astral = codes > 0xFFFF
+    if astral.any():
+        unique, inverse = np.unique(codes[astral], return_inverse=True)
+        flags[astral] = _char_flags(''.join(map(chr, unique)))[inverse]
+    return flags
+
+
+def _code_points(texts: list) -> tuple:
+    """Code points of the texts joined with a '\\n' separator, and the start offset of each text."""
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    joined = '\n'.join(texts).encode('utf-32-le', 'surrogatepass')
+    return np.frombuffer(joined, dtype=np.uint32), starts, lengths
+
+
+def _counts(mask: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    # Số phần tử True của mask trong mỗi text, qua tổng tích luỹ
+    totals = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    return totals[starts + lengths] - totals[starts]
+
+
+def _run_starts(flags: np.ndarray, flag: int) -> np.ndarray:
+    """Mask of positions that start a maximal run of characters having flag."""
+    has = (flags & flag) != 0
+    starts = has.copy()
+    starts[1:] &= ~has[:-1]
+    return starts
+
+
+def score_texts(chunks, data_source: str = None) -> np.ndarray:
+    """Score many chunks at once; same result as VietnameseTextScorer().score for each chunk.
+
+    Every feature is computed for all chunks in one pass over their joined code points,
+    using per-character class flags instead of six regex scans per chunk. The function is
+    stateless, so it can be called from any number of threads.
+
+    Args:
+        chunks (iterable of str): The Vietnamese text chunks to be scored.
+        data_source (str, optional): The source of the data (e.g., 'vac', 'lc', 'chat', etc.)
+
+    Returns:
+        numpy.ndarray: float64 quality scores between 0 (poor) and 1 (excellent), one per chunk.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return np.zeros(0)
+
+    codes, starts, lengths = _code_points(chunks)
+    flags = _flags(codes)
+    # Đếm từ và ký tự tiếng Việt trên chữ thường như bản gốc (lower() có thể đổi độ dài)
+    lowered = [chunk.lower() for chunk in chunks]
+    lower_codes, lower_starts, lower_lengths = _code_points(lowered)
+    lower_flags = _flags(lower_codes)
+
+    word_count = _counts(_run_starts(lower_flags, _WORD), lower_starts, lower_lengths).astype(np.float64)
+    sentence_endings = _counts(_run_starts(flags, _SENTENCE_END), starts, lengths)
+    vietnamese_chars = _counts((lower_flags & _VIETNAMESE) != 0, lower_starts, lower_lengths)
+    digits = _counts((flags & _DIGIT) != 0, starts, lengths)
+    special_chars = _counts((flags & _SPECIAL) != 0, starts, lengths)
+    char_count = lengths.astype(np.float64)
+    safe_chars = np.maximum(char_count, 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 1. Length score (normalized between 0-1, ideal 50-200 words)
+        length_score = np.where(word_count <= 50, word_count / 50,
+                                np.where(word_count >= 200, np.maximum(0, 1 - (word_count - 200) / 400), 1.0))
+        # 2. Punctuation score (ideal 10-25 words per sentence)
+        avg_words = word_count / np.maximum(sentence_endings, 1)
+        punctuation = np.where((avg_words >= 10) & (avg_words <= 25), 1.0,
+                               1 - np.minimum(1, np.abs(avg_words - 17.5) / 17.5))
+        punctuation = np.where(sentence_endings > 0, punctuation, 0.0)
+    # 3-5. Vietnamese character ratio, numeric and special character penalties
+    vietnamese_ratio = np.minimum(1.0, vietnamese_chars / safe_chars * 10)
+    numeric_ratio = 1.0 - np.minimum(1.0, digits / safe_chars * 5)
+    special_ratio = 1.0 - np.minimum(1.0, special_chars / safe_chars * 10)
+    # 6. Sentence completeness
+    completeness = np.fromiter((1.0 if RE_COMPLETE_SENTENCE.search(chunk) else 0.3 for chunk in chunks),
+                               dtype=np.float64, count=len(chunks))
+    # 7. Source quality
+    source_quality = _source_quality(data_source)
+
+    features = {
+        'length_score': length_score,
+        'punctuation': punctuation,
+        'vietnamese_char_ratio': vietnamese_ratio,
+        'numeric_ratio': numeric_ratio,
+        'special_char_ratio': special_ratio,
+        'sentence_completeness': completeness,
+        'source_quality': source_quality,
+    }
+    final_score = 0
+    for feature, weight in WEIGHTS.items():
+        final_score = final_score + features[feature] * weight
+    final_score = np.clip(final_score, 0.0, 1.0)
+    empty = np.fromiter((not chunk.strip() for chunk in chunks), dtype=bool, count=len(chunks))
+    return np.where(empty, 0.0, final_score)
+
+
+def _source_quality(data_source):
+    if data_source in FRT_SOURCES:
+        return 1
+    elif data_source in LIVE_CHAT_SOURCES:
+        return 0.3
+    return 0.5
+
 class VietnameseTextScorer:
+    '''Heuristic quality score of Vietnamese text chunks.
+
+    score() keeps the features of the last scored chunk in self.scores for inspection;
+    score_batch() is stateless and vectorized (see score_texts).
+    '''
     def __init__(self):
         self.scores = {
             'length_score': 0,
@@ -25,77 +178,62 @@ class VietnameseTextScorer:
         """
         if not chunk.strip():
             return 0.0
+        # Tính trên dict riêng rồi mới gán, để các thread dùng chung instance không ghi đè lẫn nhau
+        scores = dict.fromkeys(self.scores, 0)
 
         # Basic text statistics
-        words = re.findall(r'\b\w+\b', chunk.lower())
+        words = RE_WORD.findall(chunk.lower())
         word_count = len(words)
         char_count = len(chunk)
-        unique_words = set(words)
 
         # 1. Length score (normalized between 0-1, ideal 50-200 words)
         ideal_min, ideal_max = 50, 200
         if word_count <= ideal_min:
-            self.scores['length_score'] = word_count / ideal_min
+            scores['length_score'] = word_count / ideal_min
         elif word_count >= ideal_max:
-            self.scores['length_score'] = max(0, 1 - (word_count - ideal_max) / (ideal_max * 2))
+            scores['length_score'] = max(0, 1 - (word_count - ideal_max) / (ideal_max * 2))
         else:
-            self.scores['length_score'] = 1.0
+            scores['length_score'] = 1.0
 
         # 2. Punctuation score
-        sentence_endings = len(re.findall(r'[.!?]+', chunk))
+        sentence_endings = len(RE_SENTENCE_END.findall(chunk))
         if sentence_endings > 0:
             avg_words_per_sentence = word_count / sentence_endings
             # Ideal 10-25 words per sentence for Vietnamese
             if 10 <= avg_words_per_sentence <= 25:
-                self.scores['punctuation'] = 1.0
+                scores['punctuation'] = 1.0
             else:
-                self.scores['punctuation'] = 1 - min(1, abs(avg_words_per_sentence - 17.5) / 17.5)
+                scores['punctuation'] = 1 - min(1, abs(avg_words_per_sentence - 17.5) / 17.5)
 
         # 3. Vietnamese character ratio (excluding common Latin)
-        vietnamese_chars = re.findall(r'[àáảãạăằắẳẵặâầấẩẫậđèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵ]', chunk.lower())
-        if char_count > 0:
-            self.scores['vietnamese_char_ratio'] = min(1.0, len(vietnamese_chars) / char_count * 10)
+        vietnamese_chars = RE_VIETNAMESE_CHAR.findall(chunk.lower())
+        scores['vietnamese_char_ratio'] = min(1.0, len(vietnamese_chars) / char_count * 10)
 
         # 4. Numeric ratio penalty
-        numbers = re.findall(r'\d+', chunk)
-        if char_count > 0:
-            numeric_ratio = sum(len(num) for num in numbers) / char_count
-            self.scores['numeric_ratio'] = 1.0 - min(1.0, numeric_ratio * 5)  # Penalize high numeric content
+        numbers = RE_NUMBER.findall(chunk)
+        numeric_ratio = sum(len(num) for num in numbers) / char_count
+        scores['numeric_ratio'] = 1.0 - min(1.0, numeric_ratio * 5)  # Penalize high numeric content
 
         # 5. Special character ratio penalty
-        special_chars = re.findall(r'[^\w\sàáảãạăằắẳẵặâầấẩẫậđèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵ.,!?]', chunk)
-        if char_count > 0:
-            special_char_ratio = len(special_chars) / char_count
-            self.scores['special_char_ratio'] = 1.0 - min(1.0, special_char_ratio * 10)
+        special_chars = RE_SPECIAL_CHAR.findall(chunk)
+        special_char_ratio = len(special_chars) / char_count
+        scores['special_char_ratio'] = 1.0 - min(1.0, special_char_ratio * 10)
 
         # 6. Sentence completeness (checks if chunk ends with sentence terminator)
-        if re.search(r'[.!?][\'"]?\s*$', chunk):
-            self.scores['sentence_completeness'] = 1.0
+        if RE_COMPLETE_SENTENCE.search(chunk):
+            scores['sentence_completeness'] = 1.0
         else:
-            self.scores['sentence_completeness'] = 0.3  # Partial penalty
+            scores['sentence_completeness'] = 0.3  # Partial penalty
 
         # 7. Score data source (FRT: [VAC, LC, TTDT], Livechat, Public)
-        frt_source = ['vac', 'lc', 'ttdt']
-        live_chat_source = ['chat']
-
-        if data_source in frt_source:
-            self.scores['source_quality'] = 1
-        elif data_source in live_chat_source:
-            self.scores['source_quality'] = 0.3
-        else:
-            self.scores['source_quality'] = 0.5
+        scores['source_quality'] = _source_quality(data_source)
 
         # Calculate weighted final score
-        weights = {
-            'length_score': 0.2,
-            'punctuation': 0.1,
-            'vietnamese_char_ratio': 0.15,
-            'numeric_ratio': 0.1,
-            'special_char_ratio': 0.1,
-            'sentence_completeness': 0.1,
-            'source_quality': 0.25
-        }
-
-        final_score = sum(self.scores[feature] * weights[feature] for feature in weights)
+        final_score = sum(scores[feature] * WEIGHTS[feature] for feature in WEIGHTS)
         final_score = min(1.0, max(0.0, final_score))
-        return float(final_score)
\ No newline at end of file
+        self.scores = scores
+        return float(final_score)
+
+    def score_batch(self, chunks, data_source=None):
+        """Score many chunks at once; see score_texts."""
+        return score_texts(chunks, data_source)
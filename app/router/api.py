@@ -1,15 +1,24 @@
 import os
+import json
 import logging
 import tempfile
-from fastapi import APIRouter, HTTPException
+from datetime import date
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from fastapi import UploadFile, File
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 
 from app.src.data_processing import pdf_to_images, process_and_chunk
-from app.src.rag import rag_query
-from app.src.embedding import insert_embedding, get_collection
-from app.src.chatbot import ask_chatbot
+from app.src.rag import rag_query, encode_many, retrieve_metadata_batch
+from app.src.embedding import insert_embedding, reindex_document, delete_document, get_collection, collection_status
+from app.src.chatbot import ask_chatbot, stream_chatbot, LLMNotConfiguredError
+from app.src.cache import cache_stats
+from app.src.metrics import render_metrics
+from app.src.jobs import ingest_queue, QueueFullError
+from app.src.executor import query_executor, ExecutorBusyError, QueryTimeoutError
+from app.src.bulk_ingest import bulk_ingest, parse_manifest
+from app.src.schemas import UploadRequest, BatchQueryRequest
+from app.src.config import get_setting
 
 from pymilvus import connections, Collection
 import shutil
@@ -18,61 +27,213 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-class UploadRequest(BaseModel):
-    url: str
-    doc_type: str = None  # e.g., luật, nghị định, thông tư, ...
-    code: str = None      # mã ký hiệu
-    issue_date: str = None  # ngày ban hành (YYYY-MM-DD)
-    effective_date: str = None  # ngày hiệu lực (YYYY-MM-DD)
 
+def _ingest_document(request: UploadRequest, progress_callback=None) -> dict:
+    result = insert_embedding(
+        url=request.url,
+        doc_type=request.doc_type,
+        code=request.code,
+        issue_date=request.issue_date,
+        effective_date=request.effective_date,
+        progress_callback=progress_callback,
+        doc_id=request.doc_id
+    )
+    return {
+        "doc_id": result["doc_id"],
+        "doc_hash": result["doc_hash"],
+        "duplicate_document": result["duplicate_document"],
+        "new_chunks": result["new_chunks"],
+        "reused_chunks": result["reused_chunks"],
+        "deduplicated_chunks": result["deduplicated_chunks"],
+        "low_quality_chunks": result["low_quality_chunks"]
+    }
 
+def _reindex_document(doc_id: str, request: UploadRequest, progress_callback=None) -> dict:
+    result = reindex_document(
+        doc_id,
+        url=request.url,
+        doc_type=request.doc_type,
+        code=request.code,
+        issue_date=request.issue_date,
+        effective_date=request.effective_date,
+        progress_callback=progress_callback
+    )
+    result.pop("primary_keys")
+    return result
 
-@router.post("/upload/")
+@router.post("/upload/", status_code=202)
 def upload_and_store(request: UploadRequest):
-    """Endpoint to receive a URL and metadata, embed the URL text, and store with metadata."""
+    """Endpoint to receive a URL and metadata and queue it for ingestion. Poll /jobs/{job_id} for the result."""
     col = get_collection()
     if not col:
         raise HTTPException(status_code=500, detail="Collection not initialized")
+    metadata = {
+        "url": request.url,
+        "doc_type": request.doc_type,
+        "code": request.code,
+        "issue_date": request.issue_date,
+        "effective_date": request.effective_date,
+        "doc_id": request.doc_id
+    }
     try:
-        record_id = insert_embedding(
-            url=request.url,
-            doc_type=request.doc_type,
-            code=request.code,
-            issue_date=request.issue_date,
-            effective_date=request.effective_date
-        )
-        return {
-            "status": "inserted",
-            "metadata": {
-                "url": request.url,
-                "doc_type": request.doc_type,
-                "code": request.code,
-                "issue_date": request.issue_date,
-                "effective_date": request.effective_date
-            }
-        }
-    except Exception as e:
-        logger.error(f"Error in upload_and_store: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        job = ingest_queue.submit(_ingest_document, metadata, request=request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "status": "queued",
+        "job_id": job.job_id,
+        "metadata": metadata
+    }
+
+@router.post("/upload/bulk", status_code=202)
+async def upload_bulk(request: Request):
+    """Queue a JSONL manifest (one UploadRequest per line) for bulk ingestion as a single job."""
+    col = get_collection()
+    if not col:
+        raise HTTPException(status_code=500, detail="Collection not initialized")
+    body = (await request.body()).decode("utf-8")
+    try:
+        records = parse_manifest(body.splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not records:
+        raise HTTPException(status_code=422, detail="Manifest is empty")
+    try:
+        job = ingest_queue.submit(bulk_ingest, {"documents": len(records)}, records=records)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "status": "queued",
+        "job_id": job.job_id,
+        "documents": len(records)
+    }
+
+@router.put("/documents/{doc_id:path}", status_code=202)
+def reindex(doc_id: str, request: UploadRequest):
+    """Queue a re-ingest of doc_id from a new version of the PDF; only changed chunks are embedded."""
+    col = get_collection()
+    if not col:
+        raise HTTPException(status_code=500, detail="Collection not initialized")
+    if request.doc_id and request.doc_id != doc_id:
+        raise HTTPException(status_code=422, detail="doc_id in the body does not match the URL")
+    metadata = {
+        "doc_id": doc_id,
+        "url": request.url,
+        "doc_type": request.doc_type,
+        "code": request.code,
+        "issue_date": request.issue_date,
+        "effective_date": request.effective_date
+    }
+    try:
+        job = ingest_queue.submit(_reindex_document, metadata, doc_id=doc_id, request=request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "status": "queued",
+        "job_id": job.job_id,
+        "metadata": metadata
+    }
+
+@router.delete("/documents/{doc_id:path}")
+def delete(doc_id: str):
+    """Delete every chunk of a document from the vector store and the BM25 index."""
+    col = get_collection()
+    if not col:
+        raise HTTPException(status_code=500, detail="Collection not initialized")
+    try:
+        deleted = delete_document(doc_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"doc_id": doc_id, "deleted_chunks": deleted}
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Stage, progress and per-stage timings of an ingestion job."""
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 @router.get("/query/")
-async def query_data(keyword: str):
+async def query_data(keyword: str, doc_type: str = None, code: str = None,
+                     effective_after: date = None, effective_before: date = None):
+    """Search documents, optionally filtered by doc_type, code and an inclusive effective date range."""
     col = get_collection()
     if not col:
         return JSONResponse(content={"error": "Collection chưa được khởi tạo."}, status_code=500)
-    
+    if effective_after and effective_before and effective_after > effective_before:
+        raise HTTPException(status_code=422, detail="effective_after is later than effective_before")
+
     try:
-        logger.debug(f"[QUERY] keyword: {keyword}")
-        logger.debug(f"[QUERY] Collection entities: {col.num_entities}")
-        if not col.has_index():
-            logger.warning("[QUERY] Collection chưa có index!")
-        answer = rag_query(keyword, col)
-        logger.debug(f"[QUERY] Kết quả: {answer}")
+        # encode + search chạy trên query_executor, không chặn event loop
+        answer = await query_executor.run(rag_query, keyword, col, doc_type, code,
+                                          effective_after=effective_after, effective_before=effective_before)
         return JSONResponse(content={"query": keyword, "answer": answer})
+    except ExecutorBusyError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503, headers={"Retry-After": "1"})
+    except QueryTimeoutError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=504)
     except Exception as e:
         logger.error(f"Error in query_data: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+MAX_BATCH_QUERIES = get_setting("query.max_batch_queries", 1000)
+
+def _query_groups(items: list) -> list:
+    # Gom các câu hỏi có cùng bộ lọc, giữ thứ tự xuất hiện đầu tiên
+    groups = {}
+    for i, item in enumerate(items):
+        groups.setdefault((item.doc_type, item.code), []).append(i)
+    return list(groups.items())
+
+@router.post("/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """Retrieve metadata for many queries in one call, streamed as NDJSON.
+
+    All queries are encoded in one batch, then queries sharing the same doc_type/code filter
+    are searched together with one multi-vector search. One line {"index", "query", "results"}
+    (or {"index", "query", "error"}) is written per query as soon as its filter group finishes,
+    so lines are not necessarily in request order.
+    """
+    col = get_collection()
+    if not col:
+        raise HTTPException(status_code=500, detail="Collection not initialized")
+    items = request.queries
+    if not items:
+        raise HTTPException(status_code=422, detail="queries is empty")
+    if len(items) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+
+    try:
+        embeddings = await query_executor.run(encode_many, [item.query for item in items])
+    except ExecutorBusyError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503, headers={"Retry-After": "1"})
+    except QueryTimeoutError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=504)
+    except Exception as e:
+        logger.error(f"Error in query_batch: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+    async def lines():
+        for (doc_type, code), indexes in _query_groups(items):
+            try:
+                results = await query_executor.run(
+                    retrieve_metadata_batch,
+                    [items[i].query for i in indexes],
+                    [embeddings[i] for i in indexes],
+                    [items[i].top_k for i in indexes],
+                    col, doc_type, code,
+                )
+                rows = [{"index": i, "query": items[i].query, "results": result} for i, result in zip(indexes, results)]
+            except Exception as e:
+                logger.error(f"Error in query_batch group {doc_type}/{code}: {e}")
+                rows = [{"index": i, "query": items[i].query, "error": str(e)} for i in indexes]
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -82,6 +243,59 @@ def chat(request: ChatRequest):
     try:
         response = ask_chatbot(request.message)
         return {"response": response}
+    except LLMNotConfiguredError as e:
+        logger.error("[CHAT ERROR] %s", e)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error("[CHAT ERROR] %s", e)
         raise HTTPException(status_code=500, detail="Chatbot gặp lỗi.")
+
+def _sse(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream the answer as Server-Sent Events: `data: {"delta": ...}` pieces, then `event: done`.
+
+    Errors after the stream has started are sent as `event: error`.
+    """
+    async def events():
+        try:
+            async for delta in stream_chatbot(request.message):
+                yield _sse({"delta": delta})
+            yield _sse({}, event="done")
+        except LLMNotConfiguredError as e:
+            logger.error("[CHAT STREAM ERROR] %s", e)
+            yield _sse({"error": str(e)}, event="error")
+        except Exception as e:
+            logger.error("[CHAT STREAM ERROR] %s", e)
+            yield _sse({"error": "Chatbot gặp lỗi."}, event="error")
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss/eviction counters of the query embedding and search result caches."""
+    return cache_stats()
+
+
+@router.get("/metrics")
+def metrics():
+    """Stage latency histograms and chunk/byte/token counters in Prometheus text format."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@router.get("/health")
+def health():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@router.get("/ready")
+def ready():
+    """Readiness: 200 once the collection is loaded, 503 while starting or after a failed startup."""
+    status = collection_status()
+    return JSONResponse(content=status, status_code=200 if status["status"] == "ready" else 503)
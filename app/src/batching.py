@@ -0,0 +1,94 @@
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import queue
+import threading
+import time
+import logging
+
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = Histogram(
+    "legal_qa_batch_size", "Items per micro-batch", ["batcher"], buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+class MicroBatcher:
+    '''Collect concurrent single-item calls into batches for one handler call.
+
+    submit() blocks the calling thread until its item has been processed, at most timeout
+    seconds. A worker thread takes the first waiting item, then keeps collecting until
+    max_batch_size items are gathered or max_wait_ms has passed since the first one, and
+    calls handler(items), which must return one result per item in the same order. If the
+    handler raises or returns the wrong number of results, every caller in the batch gets
+    the exception. Items whose caller timed out before their batch started are skipped.
+
+    Args:
+        handler (callable): Processes a list of items and returns a list of results.
+        max_batch_size (int): Maximum items per handler call.
+        max_wait_ms (float): Maximum time the first item of a batch waits for others.
+        workers (int, optional): Number of worker threads calling the handler concurrently.
+        name (str, optional): Name used for thread names and metrics.
+        timeout (float, optional): Seconds submit() waits for a result before raising TimeoutError. Defaults to 30.
+    '''
+    def __init__(self, handler, max_batch_size: int = 32, max_wait_ms: float = 2.0, workers: int = 1,
+                 name: str = "batcher", timeout: float = 30.0):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, item, timeout: float = None):
+        """Process one item as part of a batch and return its result.
+
+        Raises:
+            TimeoutError: No result within timeout seconds (default self.timeout), e.g. because
+                the handler hangs or the worker thread died.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        future = Future()
+        self._queue.put((item, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Item chưa được worker lấy thì bỏ khỏi batch sau
+            future.cancel()
+            raise TimeoutError(f"{self.name}: no result after {timeout}s")
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Lấy ngay các item đang chờ, chỉ đợi thêm khi còn thời gian
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            # Bỏ item mà bên gọi đã timeout (future đã bị huỷ)
+            batch = [(item, future) for item, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            BATCH_SIZE.labels(self.name).observe(len(batch))
+            try:
+                results = list(self.handler([item for item, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: handler returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                logger.exception(f"{self.name}: batch of {len(batch)} failed")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
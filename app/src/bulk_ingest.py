@@ -0,0 +1,303 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import argparse
+import json
+import os
+import threading
+import time
+import logging
+
+from app.src import embedding, metrics
+from app.src.cache import invalidate_search_results, answer_cache
+from app.src.config import get_setting
+from app.src.data_processing import download_pdf
+from app.src.lexical import lexical_index, load_lexical_index
+from app.src.schemas import UploadRequest
+
+logger = logging.getLogger(__name__)
+
+
+def parse_manifest(lines) -> list:
+    """Parse JSONL lines (one UploadRequest per line, blank lines ignored) into UploadRequest objects."""
+    records = []
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(UploadRequest(**json.loads(line)))
+        except Exception as e:
+            raise ValueError(f"Manifest line {line_no} is not a valid UploadRequest: {e}")
+    return records
+
+def load_manifest(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_manifest(f)
+
+
+class Checkpoint:
+    '''Append-only record of manifest URLs that have been fully ingested.
+
+    Args:
+        path (str, optional): JSONL file to read and append to; None keeps the checkpoint in memory only.
+    '''
+    def __init__(self, path: str = None):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if path and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self.done.add(json.loads(line)["url"])
+
+    def mark_done(self, url: str, **info):
+        with self._lock:
+            self.done.add(url)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"url": url, **info}, ensure_ascii=False) + "\n")
+
+
+class _PreparedDocument:
+    def __init__(self, record: UploadRequest, doc_hash: str = None, texts: list = None, duplicate: bool = False,
+                 error: str = None, low_quality: int = 0, partial: bool = False):
+        self.record = record
+        self.doc_hash = doc_hash
+        self.texts = texts or []
+        self.low_quality = low_quality
+        self.duplicate = duplicate
+        self.partial = partial
+        self.error = error
+
+
+def _prepare(record: UploadRequest) -> _PreparedDocument:
+    """Download, parse, chunk and quality-filter one document (runs on a worker thread).
+
+    A document that is already stored is a duplicate, unless it is stored under the doc_id of
+    this record with some of its chunks missing: a previous run died between inserting part
+    of its chunks and writing its checkpoint entry. Such a document is marked partial, and
+    bulk_ingest deletes the stored rows and ingests it again.
+    """
+    try:
+        with download_pdf(record.url) as pdf:
+            stored = embedding.get_collection().query({"doc_hash": pdf.content_hash}, output_fields=["chunk_hash", "doc_id"])
+            doc_id = record.doc_id or record.code or pdf.content_hash
+            if stored and any(row["doc_id"] != doc_id for row in stored):
+                return _PreparedDocument(record, pdf.content_hash, duplicate=True)
+            texts, low_quality = embedding.select_quality_chunks(embedding.extract_document_chunks(pdf))
+            if stored and {row["chunk_hash"] for row in stored} >= {embedding.chunk_hash(text) for text in texts}:
+                return _PreparedDocument(record, pdf.content_hash, duplicate=True)
+            return _PreparedDocument(record, pdf.content_hash, texts, low_quality=low_quality, partial=bool(stored))
+    except Exception as e:
+        logger.error(f"Failed to prepare {record.url}: {e}")
+        return _PreparedDocument(record, error=str(e))
+
+
+def _delete_partial(doc_id: str, doc: _PreparedDocument):
+    """Delete the chunks of doc left under doc_id by an interrupted run."""
+    rows = embedding.get_collection().query({"doc_id": doc_id, "doc_hash": doc.doc_hash}, output_fields=["id"])
+    embedding.delete_chunks([row["id"] for row in rows])
+    logger.warning(f"{doc.record.url}: removed {len(rows)} chunks left by an interrupted run, ingesting it again")
+
+
+def bulk_ingest(records: list, checkpoint_path: str = None, workers: int = None, batch_size: int = None,
+                insert_batch_size: int = None, progress_callback=None) -> dict:
+    """Ingest many documents with bounded download/parse concurrency and batched embedding/inserts.
+
+    Chunks from several documents are buffered and embedded together; each full buffer is
+    inserted right away in slices of milvus.insert_batch_size rows (gRPC messages to Milvus are
+    size-limited) and the store is flushed once at the end. A chunk
+    text shared by several documents is stored once per document but embedded only once, its
+    stored vector being reused when it is already in the store. A document
+    is recorded in the checkpoint once all its chunks have been inserted, so a rerun with the
+    same checkpoint skips it.
+
+    Args:
+        records (list of UploadRequest): Documents to ingest.
+        checkpoint_path (str, optional): JSONL checkpoint file used to resume an interrupted run.
+        workers (int, optional): Concurrent downloads/parses. Defaults to bulk.workers.
+        batch_size (int, optional): Chunks per model forward pass. Defaults to embedding.batch_size.
+        insert_batch_size (int, optional): Chunks buffered per embed+insert round. Defaults to bulk.insert_batch_size.
+        progress_callback (callable, optional): Called as progress_callback("bulk", fraction of documents done).
+
+    Returns:
+        dict: Counts, elapsed seconds, docs/sec and chunks/sec.
+    """
+    if embedding.get_collection() is None:
+        raise ValueError("Chưa tạo collection.")
+    workers = workers or get_setting("bulk.workers", 4)
+    batch_size = batch_size or embedding.EMBED_BATCH_SIZE
+    insert_batch_size = insert_batch_size or get_setting("bulk.insert_batch_size", 5000)
+
+    checkpoint = Checkpoint(checkpoint_path)
+    todo = [r for r in records if r.url not in checkpoint.done]
+    summary = {
+        "documents": len(records),
+        "resumed_skipped": len(records) - len(todo),
+        "ingested_documents": 0,
+        "duplicate_documents": 0,
+        "failed_documents": [],
+        "new_chunks": 0,
+        "reused_chunks": 0,
+        "deduplicated_chunks": 0,
+        "low_quality_chunks": 0,
+    }
+    start = time.perf_counter()
+
+    seen_docs, seen_ids = set(), set()
+    # Khoá doc_hash và doc_id của các văn bản nhận trong lần chạy này, giữ tới khi kết thúc để
+    # /upload/, PUT hay DELETE cùng văn bản / doc_id không chen vào giữa
+    claimed = []
+    buffer = []          # rows chờ embed + insert
+    pending = {}         # url -> số chunk của văn bản còn trong buffer
+
+    def claim(key: str) -> bool:
+        if not embedding.claim(key):
+            return False
+        claimed.append(key)
+        return True
+
+    def flush_buffer():
+        if not buffer:
+            return
+        # Mỗi chunk_hash chỉ embed một lần dù nhiều văn bản trong buffer cùng chứa nó
+        first = {}
+        for row in buffer:
+            stored_id = row.pop("_stored_id")
+            if row["chunk_hash"] not in first:
+                first[row["chunk_hash"]] = (row["text"], stored_id)
+            elif stored_id is not None:
+                first[row["chunk_hash"]] = (first[row["chunk_hash"]][0], stored_id)
+        unique, embedded = embedding.reuse_or_embed([text for text, _ in first.values()],
+                                                    [stored_id for _, stored_id in first.values()], batch_size)
+        position = {h: k for k, h in enumerate(first)}
+        vectors = unique[[position[row["chunk_hash"]] for row in buffer]]
+        embedding.bulk_insert(vectors, buffer, embedding.INSERT_BATCH_SIZE)
+        summary["new_chunks"] += embedded
+        summary["reused_chunks"] += len(buffer) - embedded
+        summary["deduplicated_chunks"] += len(buffer) - embedded
+        for row in buffer:
+            url = row.pop("_url")
+            pending[url] -= 1
+            if pending[url] == 0:
+                del pending[url]
+                checkpoint.mark_done(url)
+        buffer.clear()
+
+    processed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk") as pool:
+            queue = deque()
+            records_iter = iter(todo)
+            while True:
+                # Giới hạn số văn bản đang tải/parse để bộ nhớ không tăng theo kích thước manifest
+                while len(queue) < 2 * workers:
+                    record = next(records_iter, None)
+                    if record is None:
+                        break
+                    queue.append(pool.submit(_prepare, record))
+                if not queue:
+                    break
+                doc = queue.popleft().result()
+                processed += 1
+                record = doc.record
+                doc_id = record.doc_id or record.code or doc.doc_hash
+
+                if doc.error:
+                    summary["failed_documents"].append({"url": record.url, "error": doc.error})
+                elif doc.duplicate or doc.doc_hash in seen_docs:
+                    summary["duplicate_documents"] += 1
+                    checkpoint.mark_done(record.url, duplicate=True)
+                elif doc_id in seen_ids:
+                    # Chunk của văn bản trước có thể còn trong buffer nên document_hashes chưa thấy
+                    summary["failed_documents"].append({
+                        "url": record.url, "error": f"doc_id '{doc_id}' is used by an earlier line of the manifest"
+                    })
+                elif not claim(doc.doc_hash):
+                    summary["failed_documents"].append({
+                        "url": record.url, "error": "The same document is being ingested by another job"
+                    })
+                elif not claim(embedding.doc_key(doc_id)):
+                    summary["failed_documents"].append({
+                        "url": record.url, "error": "The document is being changed by another job"
+                    })
+                elif embedding.document_hashes(doc_id) - ({doc.doc_hash} if doc.partial else set()):
+                    summary["failed_documents"].append({
+                        "url": record.url,
+                        "error": "Another version of this document is stored; re-ingest it with PUT /documents/{doc_id}"
+                    })
+                else:
+                    if doc.partial:
+                        _delete_partial(doc_id, doc)
+                    seen_docs.add(doc.doc_hash)
+                    seen_ids.add(doc_id)
+                    texts, hashes, indexes, stored_ids = embedding.select_new_chunks(doc.texts)
+                    summary["ingested_documents"] += 1
+                    summary["deduplicated_chunks"] += len(doc.texts) - len(texts)
+                    summary["low_quality_chunks"] += doc.low_quality
+                    metadata = {
+                        "doc_type": record.doc_type or "",
+                        "code": record.code or "",
+                        "issue_date": record.issue_date or "",
+                        "effective_date": record.effective_date or "",
+                        "doc_id": doc_id
+                    }
+                    if texts:
+                        pending[record.url] = len(texts)
+                        buffer.extend({"text": text, **metadata, "doc_hash": doc.doc_hash, "chunk_hash": h, "chunk_index": i,
+                                       "_url": record.url, "_stored_id": stored_id}
+                                      for text, h, i, stored_id in zip(texts, hashes, indexes, stored_ids))
+                    else:
+                        checkpoint.mark_done(record.url)
+                    if len(buffer) >= insert_batch_size:
+                        flush_buffer()
+
+                if progress_callback is not None:
+                    progress_callback("bulk", processed / len(todo))
+
+        flush_buffer()
+        with metrics.stage("vector_flush"):
+            embedding.get_collection().flush()
+        lexical_index.save()
+        invalidate_search_results()
+        answer_cache.invalidate_documents(seen_docs)
+    finally:
+        for key in claimed:
+            embedding.release(key)
+
+    elapsed = time.perf_counter() - start
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["docs_per_sec"] = round(processed / elapsed, 3) if elapsed else 0.0
+    summary["chunks_per_sec"] = round(summary["new_chunks"] / elapsed, 3) if elapsed else 0.0
+    logger.info(
+        f"Bulk ingest: {processed} docs, {summary['new_chunks']} chunks in {elapsed:.1f}s "
+        f"({summary['docs_per_sec']} docs/sec, {summary['chunks_per_sec']} chunks/sec)"
+    )
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk ingest a JSONL manifest of UploadRequest records into the vector store.")
+    parser.add_argument("manifest", help="JSONL file, one {url, doc_type, code, issue_date, effective_date} per line")
+    parser.add_argument("--checkpoint", help="Checkpoint file for resuming (default: <manifest>.checkpoint)")
+    parser.add_argument("--workers", type=int, help="Concurrent downloads/parses")
+    parser.add_argument("--batch-size", type=int, help="Chunks per model forward pass")
+    parser.add_argument("--insert-batch-size", type=int, help="Chunks per embed+insert round")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=get_setting("logging.level", "INFO"))
+    embedding.init_collection(drop_existing=False)
+    load_lexical_index(embedding.get_collection())
+    summary = bulk_ingest(
+        load_manifest(args.manifest),
+        checkpoint_path=args.checkpoint or f"{args.manifest}.checkpoint",
+        workers=args.workers,
+        batch_size=args.batch_size,
+        insert_batch_size=args.insert_batch_size,
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+from collections import OrderedDict
+import threading
+import time
+import logging
+import numpy as np
+
+from app.src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class TTLCache:
+    '''Bounded, thread-safe LRU cache whose entries expire after a fixed TTL.
+
+    Args:
+        maxsize (int): Maximum number of entries kept; the least recently used entry is evicted first.
+        ttl (float): Lifetime of an entry in seconds.
+        name (str, optional): Name used in logs and stats.
+    '''
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SemanticCache:
+    '''Bounded, thread-safe LRU + TTL cache looked up by embedding similarity.
+
+    An entry matches a lookup when the cosine similarity between the two embeddings is at
+    least `threshold` and the lookup's context_key equals the one stored with the entry
+    (e.g. a fingerprint of the retrieved context). Entries remember the documents they
+    were built from so they can be dropped when one of those documents changes.
+
+    Args:
+        maxsize (int): Maximum number of entries kept; the least recently used entry is evicted first.
+        ttl (float): Lifetime of an entry in seconds.
+        threshold (float): Minimum cosine similarity for a hit.
+        name (str, optional): Name used in logs and stats.
+    '''
+    def __init__(self, maxsize: int, ttl: float, threshold: float, name: str = "semantic"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.name = name
+        # key -> (expires_at, unit vector, context_key, value, doc_hashes)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_key = 0
+        self._keys = []
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, key):
+        del self._data[key]
+        self._matrix = None
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        for key in [key for key, item in self._data.items() if item[0] < now]:
+            self._drop(key)
+            self.expirations += 1
+
+    def get(self, embedding, context_key, default=None):
+        """Return the value of the most similar live entry with the same context_key, or default."""
+        query = self._unit(embedding)
+        with self._lock:
+            self._purge_expired()
+            if self._data:
+                if self._matrix is None:
+                    self._keys = list(self._data)
+                    self._matrix = np.stack([self._data[key][1] for key in self._keys])
+                similarities = self._matrix @ query
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.threshold:
+                        break
+                    key = self._keys[i]
+                    _, _, stored_context, value, _ = self._data[key]
+                    if stored_context == context_key:
+                        self._data.move_to_end(key)
+                        self.hits += 1
+                        return value
+            self.misses += 1
+            return default
+
+    def set(self, embedding, context_key, value, doc_hashes=()):
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._data[key] = (time.monotonic() + self.ttl, self._unit(embedding), context_key, value, frozenset(doc_hashes))
+            self._matrix = None
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_documents(self, doc_hashes) -> int:
+        """Drop entries built from any of the given documents; returns how many were dropped."""
+        doc_hashes = set(doc_hashes)
+        with self._lock:
+            stale = [key for key, item in self._data.items() if item[4] & doc_hashes]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._matrix = None
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Embedding của câu truy vấn (đã chuẩn hoá) và kết quả search theo (query, doc_type, code, top_k)
+query_embedding_cache = TTLCache(
+    maxsize=get_setting("cache.query_embedding.maxsize", 2048),
+    ttl=get_setting("cache.query_embedding.ttl", 3600),
+    name="query_embedding",
+)
+search_result_cache = TTLCache(
+    maxsize=get_setting("cache.search_result.maxsize", 1024),
+    ttl=get_setting("cache.search_result.ttl", 300),
+    name="search_result",
+)
+# Câu trả lời của chatbot, dùng lại cho câu hỏi gần nghĩa có cùng ngữ cảnh truy xuất
+answer_cache = SemanticCache(
+    maxsize=get_setting("cache.answer.maxsize", 512),
+    ttl=get_setting("cache.answer.ttl", 3600),
+    threshold=get_setting("cache.answer.threshold", 0.95),
+    name="answer",
+)
+
+def invalidate_search_results():
+    """Drop all cached search hits, e.g. after new data is written to the collection."""
+    search_result_cache.clear()
+    logger.debug("Search result cache invalidated")
+
+def cache_stats() -> dict:
+    return {
+        "query_embedding": query_embedding_cache.stats(),
+        "search_result": search_result_cache.stats(),
+        "answer": answer_cache.stats(),
+    }
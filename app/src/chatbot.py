@@ -1,41 +1,205 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import hashlib
+import os
+import threading
+import time
+import httpx
+
+from app.src import metrics
+from app.src.cache import answer_cache
+from app.src.config import get_setting
+from app.src.context import build_context
 from app.src.embedding import get_collection
-from app.src.rag import retrieve_metadata_by_query
+from app.src.executor import query_executor
+from app.src.rag import retrieve_metadata_by_query, encode_query
+
+LLM_BASE_URL = get_setting("llm.base_url", "https://openrouter.ai/api/v1")
+LLM_MODEL = get_setting("llm.model", "deepseek/deepseek-r1-0528:free")
+SYSTEM_PROMPT = "Bạn là trợ lý hiểu luật pháp Việt Nam."
+EXTRA_HEADERS = {
+    "HTTP-Referer": "http://localhost:8000",
+    "X-Title": "LegalDoc Chatbot"
+}
+
+class LLMNotConfiguredError(RuntimeError):
+    """The environment variable named by llm.api_key_env is not set."""
+
+
+def _api_key_env() -> str:
+    return get_setting("llm.api_key_env", "OPENROUTER_API_KEY")
+
+def llm_configured() -> bool:
+    return bool(os.environ.get(_api_key_env()))
+
+def _api_key() -> str:
+    key = os.environ.get(_api_key_env())
+    if not key:
+        raise LLMNotConfiguredError(f"LLM API key is not set: export {_api_key_env()} (llm.api_key_env)")
+    return key
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        get_setting("llm.read_timeout", 120),
+        connect=get_setting("llm.connect_timeout", 10)
+    )
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key="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",
-)
+# Tạo lazily để app vẫn khởi động được (ingest, query) khi chưa cấu hình API key
+client = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_client_lock = threading.Lock()
+
+def get_client() -> OpenAI:
+    """Return the shared sync client.
+
+    Raises:
+        LLMNotConfiguredError: If the API key environment variable is not set.
+    """
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                client = OpenAI(
+                    base_url=LLM_BASE_URL,
+                    api_key=_api_key(),
+                    timeout=_timeout(),
+                    max_retries=get_setting("llm.max_retries", 2),
+                )
+    return client
+
+def get_async_client() -> AsyncOpenAI:
+    """Return the shared async client; its connection pool is reused across requests.
+
+    Raises:
+        LLMNotConfiguredError: If the API key environment variable is not set.
+    """
+    global _async_client
+    if _async_client is None:
+        with _async_client_lock:
+            if _async_client is None:
+                max_connections = get_setting("llm.max_connections", 20)
+                _async_client = AsyncOpenAI(
+                    base_url=LLM_BASE_URL,
+                    api_key=_api_key(),
+                    timeout=_timeout(),
+                    max_retries=get_setting("llm.max_retries", 2),
+                    http_client=httpx.AsyncClient(
+                        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+                    ),
+                )
+    return _async_client
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+def build_messages(prompt: str, docs: list) -> list:
+    with metrics.stage("context_build"):
+        context, stats = build_context(docs)
+        metrics.CONTEXT_TOKENS_SAVED.inc(max(0, stats["legacy_tokens"] - stats["tokens"]))
+
+        final_prompt = f"""Dưới đây là các thông tin văn bản pháp luật. Trả lời câu hỏi người dùng dựa trên dữ liệu:
+
+{context}
+
+Câu hỏi: {prompt}
+"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": final_prompt}
+    ]
+
+def _record_usage(usage):
+    if usage is not None:
+        metrics.TOKENS.labels("prompt").inc(usage.prompt_tokens or 0)
+        metrics.TOKENS.labels("completion").inc(usage.completion_tokens or 0)
+
+def _context_key(docs: list) -> str:
+    return hashlib.sha256("\x1f".join(doc["text"] or "" for doc in docs).encode("utf-8")).hexdigest()
+
+def _retrieve(prompt: str, col) -> tuple:
+    """Retrieve the context for a question and look up a cached answer for it.
+
+    Returns:
+        tuple: (docs, query embedding, context key, cached answer or None)
+    """
+    docs = retrieve_metadata_by_query(prompt, col)
+    query_embedding = encode_query(prompt)
+    context_key = _context_key(docs)
+    return docs, query_embedding, context_key, answer_cache.get(query_embedding, context_key)
+
+def _cache_answer(query_embedding, context_key: str, docs: list, answer: str):
+    answer_cache.set(query_embedding, context_key, answer, [doc["doc_hash"] for doc in docs if doc.get("doc_hash")])
 
 def ask_chatbot(prompt: str) -> str:
     col = get_collection()
     if not col:
         return "Không có dữ liệu để truy vấn"
 
-    docs = retrieve_metadata_by_query(prompt, col)
+    docs, query_embedding, context_key, cached = _retrieve(prompt, col)
+    if cached is not None:
+        return cached
+    messages = build_messages(prompt, docs)
 
-    context = "\n\n".join([
-        f"Văn bản: {doc['doc_type']}\nMã số: {doc['code']}\nNgày ban hành: {doc['issue_date']}\nNgày hiệu lực: {doc['effective_date']}\nNội dung:\n{doc['text']}"
-        for doc in docs
-    ])
+    with metrics.stage("llm"):
+        completion = get_client().chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            extra_headers=EXTRA_HEADERS
+        )
+    _record_usage(completion.usage)
 
-    final_prompt = f"""Dưới đây là các thông tin văn bản pháp luật. Trả lời câu hỏi người dùng dựa trên dữ liệu:
+    answer = completion.choices[0].message.content
+    _cache_answer(query_embedding, context_key, docs, answer)
+    return answer
 
-{context}
+async def stream_chatbot(prompt: str):
+    """Answer a question, yielding the answer text in pieces as the LLM produces them.
 
-Câu hỏi: {prompt}
-"""
+    Retrieval runs on the bounded query executor and the LLM is called with the shared async client,
+    so the event loop is never blocked.
 
-    completion = client.chat.completions.create(
-        model="deepseek/deepseek-r1-0528:free",
-        messages=[
-            {"role": "system", "content": "Bạn là trợ lý hiểu luật pháp Việt Nam."},
-            {"role": "user", "content": final_prompt}
-        ],
-        extra_headers={
-            "HTTP-Referer": "http://localhost:8000",
-            "X-Title": "LegalDoc Chatbot"
-        }
-    )
+    Yields:
+        str: Non-empty pieces of the answer, in order.
+    """
+    col = get_collection()
+    if not col:
+        yield "Không có dữ liệu để truy vấn"
+        return
+
+    docs, query_embedding, context_key, cached = await query_executor.run(_retrieve, prompt, col)
+    if cached is not None:
+        yield cached
+        return
+    messages = build_messages(prompt, docs)
 
-    return completion.choices[0].message.content
+    start = time.perf_counter()
+    first = True
+    pieces = []
+    try:
+        stream = await get_async_client().chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            extra_headers=EXTRA_HEADERS,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            _record_usage(getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first:
+                    metrics.observe("llm_first_token", time.perf_counter() - start)
+                    first = False
+                pieces.append(delta)
+                yield delta
+        _cache_answer(query_embedding, context_key, docs, "".join(pieces))
+    except Exception:
+        metrics.STAGE_ERRORS.labels("llm").inc()
+        raise
+    finally:
+        metrics.observe("llm", time.perf_counter() - start)
@@ -0,0 +1,43 @@
+import os
+import threading
+import logging
+import yaml
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONFIG_PATH = os.getenv("LEGAL_QA_CONFIG", os.path.join(ROOT_DIR, "config", "config.yaml"))
+
+_config = None
+_lock = threading.Lock()
+
+def get_config() -> dict:
+    """Load config/config.yaml once and return it as a dict (empty if the file is missing or blank)."""
+    global _config
+    if _config is None:
+        with _lock:
+            if _config is None:
+                try:
+                    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                        _config = yaml.safe_load(f) or {}
+                except FileNotFoundError:
+                    logger.warning(f"Config file not found at {CONFIG_PATH}, using defaults")
+                    _config = {}
+    return _config
+
+def get_setting(key: str, default=None):
+    """Read a dotted key such as 'embedding.model_name' from the config.
+
+    Args:
+        key (str): Dotted path into the config.
+        default (optional): Value returned when the key is missing or null.
+
+    Returns:
+        The configured value, or default.
+    """
+    value = get_config()
+    for part in key.split("."):
+        if not isinstance(value, dict) or value.get(part) is None:
+            return default
+        value = value[part]
+    return value
@@ -0,0 +1,130 @@
+import re
+
+from app.src.config import get_setting
+
+MAX_CONTEXT_TOKENS = get_setting("context.max_tokens", 2000)
+MIN_OVERLAP = get_setting("context.min_overlap_characters", 20)
+SEGMENT_SEPARATOR = "\n[...]\n"
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM token count: one token per word or punctuation mark.
+
+    The chat model sits behind an API whose tokenizer is not available locally; words and
+    punctuation are a stable stand-in for budgeting and for comparing prompt sizes.
+    """
+    return len(_TOKEN.findall(text or ""))
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    for i, match in enumerate(_TOKEN.finditer(text)):
+        if i == max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def _merge(left: str, right: str, min_overlap: int):
+    """left + right if right starts with a suffix of left of at least min_overlap characters, else None."""
+    probe = right[:max(min_overlap, 1)]
+    # Vị trí xuất hiện sớm nhất cho overlap dài nhất
+    pos = left.find(probe)
+    while pos != -1:
+        tail = left[pos:]
+        if right.startswith(tail):
+            return left + right[len(tail):]
+        pos = left.find(probe, pos + 1)
+    return None
+
+
+def _header(doc: dict) -> str:
+    return (f"Văn bản: {doc['doc_type']}\nMã số: {doc['code']}\nNgày ban hành: {doc['issue_date']}\n"
+            f"Ngày hiệu lực: {doc['effective_date']}\nNội dung:\n")
+
+
+def legacy_context(docs: list) -> str:
+    """Context as built before budgeting: every chunk as its own block, in retrieval order."""
+    return "\n\n".join(_header(doc) + (doc["text"] or "") for doc in docs)
+
+
+def build_context(docs: list, max_tokens: int = None, min_overlap: int = None) -> tuple:
+    """Assemble retrieved chunks into a deduplicated context that fits a token budget.
+
+    Chunks of the same document (same doc_id, else doc_hash or code) are merged when
+    one ends with the start of the other, as consecutive chunks do through the chunker
+    overlap, and dropped when their text is already contained in a kept span. Each document
+    is rendered once with its metadata followed by its spans. Spans are packed in relevance
+    order (docs are expected best first) until max_tokens; a span that does not fit is
+    skipped, except the most relevant one, which is truncated so the context is never empty.
+
+    Args:
+        docs (list of dict): Retrieved chunks with text, doc_type, code, issue_date, effective_date.
+        max_tokens (int, optional): Token budget of the context. Defaults to context.max_tokens.
+        min_overlap (int, optional): Minimum shared characters to merge two chunks.
+
+    Returns:
+        tuple: (context string, stats dict with chunks, spans, merged, duplicates,
+            skipped, tokens and legacy_tokens)
+    """
+    max_tokens = MAX_CONTEXT_TOKENS if max_tokens is None else max_tokens
+    min_overlap = MIN_OVERLAP if min_overlap is None else min_overlap
+    stats = {"chunks": len(docs), "spans": 0, "merged": 0, "duplicates": 0, "skipped": 0}
+
+    # Mỗi văn bản: metadata của chunk đầu tiên + các span [rank, text]
+    groups = {}
+    for rank, doc in enumerate(docs):
+        text = (doc.get("text") or "").strip()
+        key = doc.get("doc_id") or doc.get("doc_hash") or doc.get("code") or f"#{rank}"
+        group = groups.setdefault(key, {"doc": doc, "spans": []})
+        spans = group["spans"]
+        if any(text in span[1] for span in spans):
+            stats["duplicates"] += 1
+            continue
+        spans.append([rank, text])
+        # Gộp lặp lại vì một chunk mới có thể nối hai span sẵn có
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(spans)):
+                for j in range(len(spans)):
+                    if i == j:
+                        continue
+                    a, b = spans[i], spans[j]
+                    if b[1] in a[1]:
+                        text = a[1]
+                    else:
+                        text = _merge(a[1], b[1], min_overlap)
+                    if text is not None:
+                        a[0], a[1] = min(a[0], b[0]), text
+                        del spans[j]
+                        stats["merged"] += 1
+                        merged = True
+                        break
+                if merged:
+                    break
+
+    spans = sorted((rank, key, text) for key, group in groups.items() for rank, text in group["spans"])
+    stats["spans"] = len(spans)
+    selected = {}
+    used = 0
+    for rank, key, text in spans:
+        overhead = count_tokens(SEGMENT_SEPARATOR if key in selected else _header(groups[key]["doc"]))
+        cost = overhead + count_tokens(text)
+        if used + cost > max_tokens:
+            if selected:
+                stats["skipped"] += 1
+                continue
+            text = _truncate(text, max_tokens - overhead)
+            cost = overhead + count_tokens(text)
+        selected.setdefault(key, []).append(text)
+        used += cost
+
+    context = "\n\n".join(
+        _header(groups[key]["doc"]) + SEGMENT_SEPARATOR.join(texts) for key, texts in selected.items()
+    )
+    stats["tokens"] = count_tokens(context)
+    stats["legacy_tokens"] = count_tokens(legacy_context(docs))
+    return context, stats
@@ -4,27 +4,45 @@ from PIL import Image
 import pytesseract
 import logging
 import fitz
-import requests
 from io import BytesIO
 
-from app.pre_processing.chunking import Chunking
+from app.pre_processing.chunking import LegalStructureChunker
+from app.src.config import get_setting
+from app.src import metrics
+from app.src.downloader import get_downloader, CachedDocument
+from app.src.ocr import ocr_pdf
 
 logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf_url(url: str) -> str:
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise ValueError("Không tải được file PDF.")
+def download_pdf(url: str) -> CachedDocument:
+    with metrics.stage("download") as counts:
+        pdf = get_downloader().fetch(url)
+        counts["bytes"] = 0 if pdf.from_cache else pdf.size
+    return pdf
 
-    pdf_bytes = BytesIO(response.content)
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    
+def _extract_text(doc) -> str:
     text = ""
     for page in doc:
         text += page.get_text()
     doc.close()
     return text.strip()
 
+def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
+    return _extract_text(fitz.open(stream=BytesIO(pdf_bytes), filetype="pdf"))
+
+def extract_text_from_pdf_file(pdf_path: str) -> str:
+    return _extract_text(fitz.open(pdf_path, filetype="pdf"))
+
+def iter_pdf_page_texts(pdf_path: str):
+    """Yield the text of each page in turn without holding the whole document in memory."""
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        for page in doc:
+            yield page.get_text()
+
+def extract_text_from_pdf_url(url: str) -> str:
+    with download_pdf(url) as pdf:
+        return extract_text_from_pdf_file(pdf.path)
+
 def pdf_to_images(pdf_path, output_dir):
     logger.debug(f"Processing PDF at {pdf_path}")
     if not os.path.isfile(pdf_path):
@@ -96,12 +114,31 @@ def process_and_chunk(image_dir, output_text_dir, output_chunk_dir, max_words=10
                 f.write(chunk)
     return chunks
 
-def chunk_pdf_text(url):
-    text = extract_text_from_pdf_url(url)
-    chunker = Chunking(max_characters=1000, overlap_size=50)
-    chunks = chunker.split_document_with_order_overlap(text)
-    
-    for c in chunks:
-        print(f"[Chunk {c['chunk_id']}] {c['content'][:100]}...")
-    
+def ocr_and_chunk(pdf_path, max_words=100, overlap_sentences=1, max_workers=None):
+    """OCR a scanned PDF in memory and chunk each page's text.
+
+    Unlike pdf_to_images + process_and_chunk, pages are rendered and OCRed in a process
+    pool without writing images, texts or chunks to disk.
+
+    Returns:
+        dict: page number (starting from 1) -> list of chunks, in page order.
+    """
+    chunks = {}
+    for page_number, text in ocr_pdf(pdf_path, max_workers=max_workers):
+        chunks[page_number] = chunk_by_sentences(text, max_words, overlap_sentences)
     return chunks
+
+def chunk_pages(pages):
+    """Stream chunks (see LegalStructureChunker.chunk_pages) from an iterable of page texts."""
+    chunker = LegalStructureChunker(
+        max_characters=get_setting("chunking.max_characters", 1000),
+        overlap_size=get_setting("chunking.overlap_size", 50),
+        min_characters=get_setting("chunking.min_characters", 500)
+    )
+    yield from chunker.chunk_pages(pages)
+
+def chunk_text(text):
+    return list(chunk_pages([text]))
+
+def chunk_pdf_text(url):
+    return chunk_text(extract_text_from_pdf_url(url))
@@ -0,0 +1,233 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.src.config import get_setting, ROOT_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class CachedDocument:
+    '''A downloaded document stored in the on-disk cache.
+
+    The file is pinned in the cache until close() is called (or the with block exits), so
+    eviction triggered by other downloads cannot delete it while it is still being read.
+
+    Attributes:
+        url (str): The source URL.
+        path (str): Path of the cached file.
+        content_hash (str): SHA-256 of the file content.
+        size (int): Size in bytes.
+        from_cache (bool): True if the server answered 304 and no body was transferred.
+    '''
+    def __init__(self, url: str, path: str, content_hash: str, size: int, from_cache: bool,
+                 downloader: "PdfDownloader" = None):
+        self.url = url
+        self.path = path
+        self.content_hash = content_hash
+        self.size = size
+        self.from_cache = from_cache
+        self._downloader = downloader
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def close(self):
+        """Unpin the file; it may be evicted afterwards. Calling it again does nothing."""
+        downloader, self._downloader = self._downloader, None
+        if downloader is not None:
+            downloader.unpin(self.content_hash)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PdfDownloader:
+    '''Downloads documents over a pooled HTTP session into a bounded on-disk cache.
+
+    Files are streamed to disk and stored by content hash; an index maps each URL to
+    its content hash and the ETag/Last-Modified validators of the last response, which
+    are sent back as If-None-Match/If-Modified-Since so unchanged documents cost a 304.
+    Files of documents returned by fetch() and not yet closed are pinned and never evicted;
+    if pinned files keep the cache over its size, eviction runs again when the last pin is released.
+
+    Args:
+        cache_dir (str): Directory holding the index and cached files.
+        max_cache_bytes (int): Total size of cached files; least recently used files are evicted beyond it.
+        timeout (tuple or float): requests timeout (connect, read) in seconds.
+        pool_size (int): Number of pooled connections per host.
+        retries (int): Retries on connection errors and 502/503/504 responses.
+        chunk_size (int): Size of streamed read chunks in bytes.
+    '''
+    def __init__(self, cache_dir: str, max_cache_bytes: int = 2 * 1024 ** 3, timeout=(10, 120),
+                 pool_size: int = 10, retries: int = 3, chunk_size: int = 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.max_cache_bytes = max_cache_bytes
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self._pins = Counter()       # content_hash -> số CachedDocument chưa close
+        self._over_limit = False
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.blob_dir, f"{content_hash}.pdf")
+
+    def fetch(self, url: str) -> CachedDocument:
+        """Return the document at url, downloading it only if the cached copy is missing or stale.
+
+        The returned document is pinned; close it (or use it as a context manager) once its file has been read.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            # Ghim bản đang có để nó không bị evict trong lúc chờ 304
+            if entry:
+                self._pins[entry["content_hash"]] += 1
+        try:
+            return self._fetch(url, entry)
+        finally:
+            if entry:
+                self.unpin(entry["content_hash"])
+
+    def _fetch(self, url: str, entry: dict) -> CachedDocument:
+        headers = {}
+        if entry and os.path.isfile(self._blob_path(entry["content_hash"])):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        else:
+            entry = None
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304 and entry:
+                path = self._blob_path(entry["content_hash"])
+                os.utime(path)
+                with self._lock:
+                    self._pins[entry["content_hash"]] += 1
+                logger.debug(f"Not modified, using cached copy of {url}")
+                return CachedDocument(url, path, entry["content_hash"], entry["size"], from_cache=True, downloader=self)
+            if response.status_code != 200:
+                raise ValueError("Không tải được file PDF.")
+            content_hash, size, path = self._store(response)
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+
+        with self._lock:
+            self._index[url] = {"content_hash": content_hash, "size": size, **validators}
+            self._evict()
+            self._save_index()
+        logger.debug(f"Downloaded {url} ({size} bytes, sha256={content_hash[:12]})")
+        return CachedDocument(url, path, content_hash, size, from_cache=False, downloader=self)
+
+    def unpin(self, content_hash: str):
+        """Release one pin on a cached file (see CachedDocument.close)."""
+        with self._lock:
+            self._pins[content_hash] -= 1
+            if self._pins[content_hash] > 0:
+                return
+            del self._pins[content_hash]
+            if self._over_limit:
+                self._evict()
+                self._save_index()
+
+    def _store(self, response) -> tuple:
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for block in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(block)
+                    sha256.update(block)
+                    size += len(block)
+            content_hash = sha256.hexdigest()
+            path = self._blob_path(content_hash)
+            # Cùng nội dung (vd. từ một mirror) thì chỉ giữ một bản; ghim ngay khi file xuất hiện
+            # để _evict của luồng khác không xoá nó trước khi fetch trả về
+            with self._lock:
+                os.replace(tmp_path, path)
+                self._pins[content_hash] += 1
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return content_hash, size, path
+
+    def _evict(self):
+        # Gọi khi đang giữ self._lock
+        blobs = []
+        for name in os.listdir(self.blob_dir):
+            path = os.path.join(self.blob_dir, name)
+            stat = os.stat(path)
+            blobs.append((stat.st_mtime, stat.st_size, name[:-len(".pdf")], path))
+        total = sum(size for _, size, _, _ in blobs)
+        removed = set()
+        for _, size, content_hash, path in sorted(blobs):
+            if total <= self.max_cache_bytes:
+                break
+            if content_hash in self._pins:
+                continue
+            os.remove(path)
+            removed.add(content_hash)
+            total -= size
+        self._over_limit = total > self.max_cache_bytes
+        if removed:
+            self._index = {url: e for url, e in self._index.items() if e["content_hash"] not in removed}
+            logger.debug(f"Evicted {len(removed)} cached files")
+
+
+_downloader = None
+_downloader_lock = threading.Lock()
+
+def get_downloader() -> PdfDownloader:
+    """Return the process-wide downloader configured from the download section of config/config.yaml."""
+    global _downloader
+    if _downloader is None:
+        with _downloader_lock:
+            if _downloader is None:
+                cache_dir = get_setting("download.cache_dir", "data/pdf_cache")
+                _downloader = PdfDownloader(
+                    cache_dir=os.path.join(ROOT_DIR, cache_dir),
+                    max_cache_bytes=get_setting("download.max_cache_mb", 2048) * 1024 * 1024,
+                    timeout=(get_setting("download.connect_timeout", 10), get_setting("download.read_timeout", 120)),
+                    pool_size=get_setting("download.pool_size", 10),
+                    retries=get_setting("download.retries", 3),
+                )
+    return _downloader
@@ -1,127 +1,519 @@
-from sentence_transformers import SentenceTransformer
-from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility
 import logging
-import pprint
+import time
+import hashlib
+import threading
+import unicodedata
+import numpy as np
 
-from app.src.data_processing import chunk_pdf_text
+from app.pre_processing.trust_score import score_texts
+from app.src import metrics
+from app.src.cache import invalidate_search_results, answer_cache
+from app.src.config import get_setting
+from app.src.data_processing import download_pdf, iter_pdf_page_texts, chunk_pages
+from app.src.lexical import lexical_index
+from app.src.model_provider import get_embedding_model, get_embedding_dimension
+from app.src.ocr import ocr_pdf
+from app.src.vector_store import VectorStore, create_vector_store, METADATA_FIELDS, SCHEMA_VERSION
 
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG)
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# VectorStore đang dùng (Milvus hoặc NumPy, theo vector_store.backend)
 collection = None
+collection_error = None
 
-def _init_milvus_collection(drop_existing: bool = False):
-    try:
-        connections.connect("default", host="localhost", port="19530")
-        logger.debug("Connected to Milvus at localhost:19530")
-    except Exception as e:
-        logger.error(f"Failed to connect to Milvus: {e}")
-        raise
+# Số chunk encode trong một lần forward và số bản ghi tối đa trong một lần insert vào vector store
+EMBED_BATCH_SIZE = get_setting("embedding.batch_size", 64)
+INSERT_BATCH_SIZE = get_setting("milvus.insert_batch_size", 1000)
+EMBEDDING_DIM = get_setting("embedding.dim", 384)
+# Số hash tối đa trong một biểu thức `in [...]` khi kiểm tra trùng lặp
+HASH_QUERY_BATCH_SIZE = 1000
+# Chunk có điểm chất lượng dưới ngưỡng bị bỏ trước khi embed (0 = tắt)
+QUALITY_MIN_SCORE = get_setting("ingest.quality_gate.min_score", 0.35)
+QUALITY_DATA_SOURCE = get_setting("ingest.quality_gate.data_source")
 
-    if drop_existing and utility.has_collection("legal_docs"):
-        utility.drop_collection("legal_docs")
-        logger.debug("Dropped existing collection 'legal_docs'")
-
-    meta_fields = [
-        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=8192),
-        FieldSchema(name="doc_type", dtype=DataType.VARCHAR, max_length=64),
-        FieldSchema(name="code", dtype=DataType.VARCHAR, max_length=64),
-        FieldSchema(name="issue_date", dtype=DataType.VARCHAR, max_length=32),
-        FieldSchema(name="effective_date", dtype=DataType.VARCHAR, max_length=32)
-    ]
-
-    if not utility.has_collection("legal_docs"):
-        fields = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384),
-            *meta_fields
-        ]
-        schema = CollectionSchema(fields, description="Text embeddings with metadata")
-        col = Collection(name="legal_docs", schema=schema)
-        logger.debug("Created new collection 'legal_docs'")
-    else:
-        col = Collection(name="legal_docs")
-        logger.debug("Loaded existing collection 'legal_docs'")
-
-    if not col.has_index():
+# doc_hash và doc_key(doc_id) của các văn bản đang được ingest / cập nhật / xoá, tránh hai job
+# cùng lúc lưu trùng một văn bản hoặc lưu hai phiên bản của cùng một doc_id
+_ingesting = set()
+_ingesting_lock = threading.Lock()
+
+def init_collection(drop_existing: bool = False):
+    """Open the configured vector store, reusing existing data unless drop_existing is set."""
+    global collection, collection_error
+    if collection is None:
         try:
-            index_params = {
-                "metric_type": "L2",
-                "index_type": "IVF_FLAT",
-                "params": {"nlist": 128}
-            }
-            col.create_index(field_name="embedding", index_params=index_params)
-            logger.debug("Created index for 'embedding' field")
+            collection = create_vector_store(drop_existing=drop_existing)
+            collection_error = None
         except Exception as e:
-            logger.error(f"Failed to create index: {e}")
+            collection_error = str(e)
             raise
 
-    try:
-        col.load()
-        logger.debug("Collection loaded")
-    except Exception as e:
-        logger.error(f"Failed to load collection: {e}")
-        raise
-
-    return col
-
-def init_collection():
-    global collection
-    if collection is None:
-        collection = _init_milvus_collection(drop_existing=True)
+def collection_status() -> dict:
+    """Readiness of the collection: 'ready', 'failed' (with error) or 'starting'."""
+    if collection is not None:
+        return {"status": "ready", "backend": collection.name, "schema_version": SCHEMA_VERSION}
+    if collection_error is not None:
+        return {"status": "failed", "error": collection_error}
+    return {"status": "starting"}
 
 def embed_text(text: str) -> list:
-    embedding = model.encode(text).tolist()
+    embedding = get_embedding_model().encode(text).tolist()
     logger.debug(f"Generated embedding for text (length: {len(embedding)})")
     return embedding
 
+def _report(progress_callback, stage: str, progress: float = None):
+    if progress_callback is not None:
+        progress_callback(stage, progress)
+
+def embed_texts(texts: list, batch_size: int = EMBED_BATCH_SIZE, progress_callback=None) -> np.ndarray:
+    """Encode many texts in batches.
+
+    Args:
+        texts (list of str): The texts to encode.
+        batch_size (int, optional): Number of texts per forward pass. Defaults to EMBED_BATCH_SIZE.
+        progress_callback (callable, optional): Called as progress_callback("embed", fraction) after each batch.
+
+    Returns:
+        np.ndarray: A C-contiguous float32 matrix of shape (len(texts), dim), dim being the
+        model's embedding size (embedding.dim only sizes the vector store).
+    """
+    if not texts:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    model = get_embedding_model()
+    vectors = np.empty((len(texts), get_embedding_dimension(model)), dtype=np.float32)
+    for start in range(0, len(texts), batch_size):
+        end = min(start + batch_size, len(texts))
+        with metrics.stage("embed") as counts:
+            vectors[start:end] = model.encode(texts[start:end], batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+            counts["chunks"] = end - start
+        _report(progress_callback, "embed", end / len(texts))
+    return vectors
+
+def bulk_insert(vectors: np.ndarray, rows: list, insert_batch_size: int = INSERT_BATCH_SIZE, progress_callback=None) -> list:
+    """Insert vectors and their metadata rows into the vector store in slices of at most insert_batch_size rows."""
+    primary_keys = []
+    total = len(rows)
+    for start in range(0, total, insert_batch_size):
+        end = min(start + insert_batch_size, total)
+        batch = rows[start:end]
+        with metrics.stage("vector_insert") as counts:
+            ids = collection.insert(vectors[start:end], batch)
+            counts["chunks"] = len(ids)
+        primary_keys.extend(ids)
+        # Cập nhật BM25 index ngay khi có primary key
+        lexical_index.add_many(ids, *([row[field] for row in batch] for field in ("text", "doc_type", "code")))
+        _report(progress_callback, "insert", end / total)
+    return primary_keys
+
+def chunk_hash(text: str) -> str:
+    """SHA-256 of a chunk's text after Unicode NFC and whitespace normalization."""
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def document_exists(doc_hash: str) -> bool:
+    hits = collection.query({"doc_hash": doc_hash}, output_fields=["id"], limit=1)
+    return len(hits) > 0
+
+def document_hashes(doc_id: str) -> set:
+    """doc_hash values stored under doc_id (empty if the document is not stored)."""
+    return {row["doc_hash"] for row in collection.query({"doc_id": doc_id}, output_fields=["doc_hash"])}
+
+def claim(key: str) -> bool:
+    """Mark a document (doc_hash or doc_key) as being changed; False if another job holds it."""
+    with _ingesting_lock:
+        if key in _ingesting:
+            return False
+        _ingesting.add(key)
+        return True
+
+def release(key: str):
+    with _ingesting_lock:
+        _ingesting.discard(key)
+
+def doc_key(doc_id: str) -> str:
+    """Key under which jobs changing doc_id are serialized (see claim)."""
+    return f"doc_id:{doc_id}"
+
+def existing_chunk_ids(hashes: list) -> dict:
+    """Map each of hashes that is already stored in the collection to the id of one stored copy."""
+    found = {}
+    unique = list(dict.fromkeys(hashes))
+    for start in range(0, len(unique), HASH_QUERY_BATCH_SIZE):
+        batch = unique[start:start + HASH_QUERY_BATCH_SIZE]
+        hits = collection.query({"chunk_hash": batch}, output_fields=["chunk_hash"])
+        for hit in hits:
+            found.setdefault(hit["chunk_hash"], hit["id"])
+    return found
+
+def reuse_or_embed(texts: list, stored_ids: list, batch_size: int = EMBED_BATCH_SIZE, progress_callback=None) -> tuple:
+    """Vectors for texts, copied from the stored row stored_ids[i] when there is one, embedded otherwise.
+
+    A stored row deleted in the meantime (e.g. its document was deleted) is embedded instead.
+
+    Returns:
+        tuple: (float32 matrix of shape (len(texts), dim), number of embedded texts)
+    """
+    stored = collection.get_vectors([i for i in stored_ids if i is not None])
+    vectors = np.empty((len(texts), collection.dim), dtype=np.float32)
+    todo = []
+    for k, stored_id in enumerate(stored_ids):
+        if stored_id in stored:
+            vectors[k] = stored[stored_id]
+        else:
+            todo.append(k)
+    if todo:
+        vectors[todo] = embed_texts([texts[k] for k in todo], batch_size=batch_size, progress_callback=progress_callback)
+    if len(todo) < len(texts):
+        metrics.CHUNKS.labels("vector_reused").inc(len(texts) - len(todo))
+    return vectors, len(todo)
+
 def insert_embedding(
     url: str,
     doc_type: str = None,
     code: str = None,
     issue_date: str = None,
-    effective_date: str = None
-) -> list:
+    effective_date: str = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    insert_batch_size: int = INSERT_BATCH_SIZE,
+    progress_callback=None,
+    doc_id: str = None
+) -> dict:
+    """Download, parse, chunk and embed a PDF, then store the new chunks in the vector store.
+
+    Documents whose content hash is already stored are skipped. Chunks whose text is already
+    stored for another document are stored again with this document's metadata but reuse the
+    stored vector instead of being embedded again. doc_id defaults
+    to code, or to the content hash when there is no code; a different version of a stored
+    doc_id must be replaced with reindex_document instead.
+
+    progress_callback, if given, is called as progress_callback(stage, fraction) when
+    the pipeline enters a stage (download, parse, ocr, dedup, embed, insert, flush) and as
+    embedding/insert batches complete.
+
+    Chunks scoring below ingest.quality_gate.min_score are dropped before deduplication.
+
+    Returns:
+        dict: doc_id, doc_hash, primary_keys of inserted chunks, new_chunks (embedded),
+        reused_chunks (stored with a reused vector), deduplicated_chunks (not embedded),
+        low_quality_chunks and duplicate_document (True if the whole document was already stored).
+    """
     global collection
     if collection is None:
         raise ValueError("Chưa tạo collection.")
 
-    chunks = chunk_pdf_text(url)
-    
-    # logger.debug("Nội dung đầy đủ của chunks:\n%s", pprint.pformat(chunks, indent=2, width=120))
-    
-
-
-    
-
-    insert_data = []
-    for i, chunk in enumerate(chunks):
-        content = chunk.get("content", "")
-        logger.debug(f"Chunk {i+1} length: {len(content)}")
-        logger.debug(f"Nội dung text (length={len(content)}):\n{content[:500]}...")
-        vector = embed_text(content)
-        insert_data.append({
-            "embedding": vector,
-            "text": content,
-            "doc_type": doc_type or "",
-            "code": code or "",
-            "issue_date": issue_date or "",
-            "effective_date": effective_date or ""
-        })
+    _report(progress_callback, "download")
+    # File PDF được giữ trong cache cho tới khi job kết thúc
+    with download_pdf(url) as pdf:
+        doc_id = doc_id or code or pdf.content_hash
+        result = {
+            "doc_id": doc_id,
+            "doc_hash": pdf.content_hash,
+            "primary_keys": [],
+            "new_chunks": 0,
+            "reused_chunks": 0,
+            "deduplicated_chunks": 0,
+            "low_quality_chunks": 0,
+            "duplicate_document": False
+        }
+
+        if not claim(pdf.content_hash):
+            logger.info(f"Văn bản {url} đang được ingest bởi job khác, bỏ qua")
+            result["duplicate_document"] = True
+            return result
+        if not claim(doc_key(doc_id)):
+            release(pdf.content_hash)
+            raise RuntimeError(f"Văn bản '{doc_id}' đang được ingest bởi job khác")
+
+        try:
+            if document_exists(pdf.content_hash):
+                logger.info(f"Văn bản {url} đã tồn tại (doc_hash={pdf.content_hash[:12]}), bỏ qua")
+                result["duplicate_document"] = True
+                return result
+            if document_hashes(doc_id):
+                raise ValueError(f"Văn bản '{doc_id}' đã có phiên bản khác, dùng PUT /documents/{doc_id} để cập nhật")
+            metadata = {
+                "doc_type": doc_type or "",
+                "code": code or "",
+                "issue_date": issue_date or "",
+                "effective_date": effective_date or "",
+                "doc_id": doc_id
+            }
+            return _store_document(pdf, metadata, result, batch_size, insert_batch_size, progress_callback)
+        finally:
+            release(doc_key(doc_id))
+            release(pdf.content_hash)
+
+def extract_document_chunks(pdf, progress_callback=None) -> list:
+    """Parse a downloaded PDF (with OCR fallback for scans) and return its chunk texts.
+
+    Pages are streamed from the PDF straight into the chunker.
+    """
+    _report(progress_callback, "parse")
+    chunks = _chunk_timed("extract", iter_pdf_page_texts(pdf.path))
+    if not chunks and get_setting("ocr.fallback", True):
+        # PDF scan không có lớp text
+        _report(progress_callback, "ocr")
+        chunks = _chunk_timed("ocr", (text for _, text in ocr_pdf(pdf.path)))
+    return chunks
+
+def _chunk_timed(source_stage: str, pages) -> list:
+    """Chunk a stream of page texts, recording page extraction and chunking time as separate stages."""
+    pages = metrics.TimedIterator(pages)
+    chunks = metrics.TimedIterator(chunk_pages(pages))
+    texts = [chunk["content"] for chunk in chunks]
+    metrics.observe(source_stage, pages.seconds)
+    metrics.observe("chunk", chunks.seconds - pages.seconds, chunks=len(texts))
+    return texts
+
+def select_quality_chunks(texts: list, min_score: float = None) -> tuple:
+    """Drop chunks scoring below min_score (OCR garbage, number tables, page headers) before embedding.
+
+    Args:
+        texts (list of str): Chunk texts.
+        min_score (float, optional): Threshold. Defaults to ingest.quality_gate.min_score; 0 keeps everything.
+
+    Returns:
+        tuple: (kept texts, number of dropped chunks)
+    """
+    min_score = QUALITY_MIN_SCORE if min_score is None else min_score
+    if not texts or not min_score:
+        return texts, 0
+    with metrics.stage("quality_gate") as counts:
+        scores = score_texts(texts, QUALITY_DATA_SOURCE)
+        counts["chunks"] = len(texts)
+    kept = [text for text, score in zip(texts, scores) if score >= min_score]
+    dropped = len(texts) - len(kept)
+    if dropped:
+        metrics.CHUNKS.labels("quality_dropped").inc(dropped)
+        logger.debug(f"Bỏ {dropped}/{len(texts)} chunk có điểm chất lượng < {min_score}")
+    return kept, dropped
+
+def select_new_chunks(texts: list) -> tuple:
+    """Pick the chunks of one document to store, dropping repeats of a text earlier in the document.
+
+    Texts already stored for another document are kept, with the id of a stored copy so that
+    its vector can be reused (see reuse_or_embed): the row of this document must exist for
+    its doc_type/code filters and must survive deleting the other document.
+
+    Returns:
+        tuple: (texts, their chunk hashes, their positions in texts, stored ids or None)
+    """
+    hashes = [chunk_hash(text) for text in texts]
+    known = existing_chunk_ids(hashes)
+    seen = set()
+    new_texts, new_hashes, indexes, stored_ids = [], [], [], []
+    for i, (text, h) in enumerate(zip(texts, hashes)):
+        if h in seen:
+            continue
+        seen.add(h)
+        new_texts.append(text)
+        new_hashes.append(h)
+        indexes.append(i)
+        stored_ids.append(known.get(h))
+    return new_texts, new_hashes, indexes, stored_ids
+
+def _store_document(pdf, metadata: dict, result: dict, batch_size: int, insert_batch_size: int,
+                    progress_callback=None) -> dict:
+    chunks = extract_document_chunks(pdf, progress_callback)
+    chunks, result["low_quality_chunks"] = select_quality_chunks(chunks)
+
+    _report(progress_callback, "dedup")
+    texts, hashes, indexes, stored_ids = select_new_chunks(chunks)
+    if not texts:
+        logger.warning(f"Không có chunk nào để lưu cho {pdf.url}")
+        return result
+
+    _report(progress_callback, "embed", 0.0)
+    start = time.perf_counter()
+    vectors, embedded = reuse_or_embed(texts, stored_ids, batch_size, progress_callback)
+    elapsed = time.perf_counter() - start
+    result["new_chunks"] = embedded
+    result["reused_chunks"] = len(texts) - embedded
+    result["deduplicated_chunks"] = len(chunks) - embedded
+    logger.info(f"Embedded {embedded} chunks in {elapsed:.2f}s ({embedded / max(elapsed, 1e-9):.1f} chunks/sec), "
+                f"reused {result['reused_chunks']} stored vectors")
+
+    rows = [{"text": text, **metadata, "doc_hash": pdf.content_hash, "chunk_hash": h, "chunk_index": i}
+            for text, h, i in zip(texts, hashes, indexes)]
 
     try:
-        result = collection.insert(insert_data)
-        collection.flush()
-        logger.debug(f"Nội dung text (length={len(content)}):\n{content[:500]}...") 
-        logger.debug(f"Đã lưu {len(insert_data[0])} chunk vào Milvus, primary keys: {result.primary_keys}")
-        return result.primary_keys
+        _report(progress_callback, "insert", 0.0)
+        result["primary_keys"] = bulk_insert(vectors, rows, insert_batch_size, progress_callback)
+        _report(progress_callback, "flush")
+        with metrics.stage("vector_flush"):
+            collection.flush()
+        lexical_index.save_if_due()
+        invalidate_search_results()
+        # Câu trả lời đã cache có thể trích văn bản cũ cùng nội dung (ingest lại sau khi xoá)
+        answer_cache.invalidate_documents([pdf.content_hash])
+        logger.debug(f"Đã lưu {len(rows)} chunk vào vector store ({result['deduplicated_chunks']} chunk không phải embed lại)")
+        return result
     except Exception as e:
-        logger.exception("Lỗi khi insert vào Milvus")
+        logger.exception("Lỗi khi insert vào vector store")
         raise
 
 
-def get_collection():
+def delete_chunks(ids: list):
+    """Delete chunks by id from the vector store and the BM25 index (no flush; see _finish_document_change)."""
+    if ids:
+        collection.delete({"id": list(ids)})
+        for i in ids:
+            lexical_index.remove(i)
+
+def _finish_document_change(doc_hashes):
+    with metrics.stage("vector_flush"):
+        collection.flush()
+    lexical_index.save_if_due()
+    invalidate_search_results()
+    answer_cache.invalidate_documents(doc_hashes)
+
+def delete_document(doc_id: str) -> int:
+    """Delete every chunk of doc_id from the vector store and the BM25 index.
+
+    Returns:
+        int: Number of deleted chunks (0 if the document is not stored).
+    """
+    if collection is None:
+        raise ValueError("Chưa tạo collection.")
+    key = doc_key(doc_id)
+    if not claim(key):
+        raise RuntimeError(f"Văn bản '{doc_id}' đang được ingest bởi job khác")
+    try:
+        rows = collection.query({"doc_id": doc_id}, output_fields=["doc_hash"])
+        if not rows:
+            return 0
+        delete_chunks([row["id"] for row in rows])
+        _finish_document_change({row["doc_hash"] for row in rows})
+        logger.info(f"Đã xoá {len(rows)} chunk của văn bản '{doc_id}'")
+        return len(rows)
+    finally:
+        release(key)
+
+def reindex_document(
+    doc_id: str,
+    url: str,
+    doc_type: str = None,
+    code: str = None,
+    issue_date: str = None,
+    effective_date: str = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    insert_batch_size: int = INSERT_BATCH_SIZE,
+    progress_callback=None
+) -> dict:
+    """Replace the stored version of doc_id with the PDF at url (or store it if it is new).
+
+    Only chunks whose text changed are embedded; see replace_document_chunks.
+    """
+    if collection is None:
+        raise ValueError("Chưa tạo collection.")
+    key = doc_key(doc_id)
+    if not claim(key):
+        raise RuntimeError(f"Văn bản '{doc_id}' đang được ingest bởi job khác")
+    try:
+        _report(progress_callback, "download")
+        with download_pdf(url) as pdf:
+            chunks = extract_document_chunks(pdf, progress_callback)
+            chunks, low_quality = select_quality_chunks(chunks)
+            metadata = {
+                "doc_type": doc_type or "",
+                "code": code or "",
+                "issue_date": issue_date or "",
+                "effective_date": effective_date or ""
+            }
+            result = replace_document_chunks(doc_id, pdf.content_hash, chunks, metadata, batch_size,
+                                             insert_batch_size, progress_callback)
+            result["low_quality_chunks"] = low_quality
+            return result
+    finally:
+        release(key)
+
+def replace_document_chunks(doc_id: str, doc_hash: str, texts: list, metadata: dict,
+                            batch_size: int = EMBED_BATCH_SIZE, insert_batch_size: int = INSERT_BATCH_SIZE,
+                            progress_callback=None) -> dict:
+    """Make the stored chunks of doc_id equal to texts, embedding only the chunks that changed.
+
+    Stored chunks are matched to the new ones by chunk_hash. Matched chunks keep their vector
+    and are never embedded again, so an amendment costs embedding work proportional to the
+    edit, not to the document. Their metadata, chunk_index and doc_hash are updated in place,
+    so every chunk carries the content hash of the current version and document_exists()
+    no longer reports the replaced version as stored. New chunk texts
+    are inserted, reusing the vector when the same text is stored for another document and
+    embedding them otherwise; chunks no longer in the document are deleted last, so searches
+    never see it half empty.
+
+    Args:
+        doc_id (str): Document identifier.
+        doc_hash (str): Content hash of the new version.
+        texts (list of str): Chunk texts of the new version, in document order.
+        metadata (dict): doc_type, code, issue_date and effective_date of the new version.
+
+    Returns:
+        dict: doc_id, doc_hash, unchanged_chunks (same position and metadata; their doc_hash is
+        still updated), updated_chunks (re-positioned or new metadata), new_chunks (embedded), reused_chunks (inserted with a reused vector),
+        deleted_chunks, deduplicated_chunks (repeated in the document or reused) and
+        primary_keys of the inserted chunks.
+    """
+    fields = ["chunk_hash", "chunk_index", "doc_hash", "doc_type", "code", "issue_date", "effective_date"]
+    stored = collection.query({"doc_id": doc_id}, output_fields=fields)
+    target = {**metadata, "doc_id": doc_id}
+    result = {"doc_id": doc_id, "doc_hash": doc_hash, "unchanged_chunks": 0, "updated_chunks": 0, "new_chunks": 0,
+              "reused_chunks": 0, "deleted_chunks": 0, "deduplicated_chunks": 0, "primary_keys": []}
+
+    # Vị trí đầu tiên của mỗi chunk trong phiên bản mới
+    positions = {}
+    for i, text in enumerate(texts):
+        positions.setdefault(chunk_hash(text), i)
+    kept, stale = {}, []
+    for row in stored:
+        if row["chunk_hash"] in positions and row["chunk_hash"] not in kept:
+            kept[row["chunk_hash"]] = row
+        else:
+            stale.append(row)
+
+    _report(progress_callback, "dedup")
+    added = [(h, i) for h, i in positions.items() if h not in kept]
+    elsewhere = existing_chunk_ids([h for h, _ in added])
+
+    if added:
+        _report(progress_callback, "embed", 0.0)
+        vectors, embedded = reuse_or_embed([texts[i] for _, i in added], [elsewhere.get(h) for h, _ in added],
+                                           batch_size, progress_callback)
+        rows = [{"text": texts[i], **target, "doc_hash": doc_hash, "chunk_hash": h, "chunk_index": i} for h, i in added]
+        _report(progress_callback, "insert", 0.0)
+        result["primary_keys"] = bulk_insert(vectors, rows, insert_batch_size, progress_callback)
+        result["new_chunks"] = embedded
+        result["reused_chunks"] = len(rows) - embedded
+    result["deduplicated_chunks"] = len(texts) - len(positions) + result["reused_chunks"]
+
+    changed = {
+        h for h, row in kept.items()
+        if row["chunk_index"] != positions[h] or any(row[field] != metadata[field] for field in metadata)
+    }
+    # Chunk chỉ khác doc_hash cũng được ghi lại (chỉ metadata, không embed) để hash của phiên
+    # bản cũ không còn trong store
+    rewritten = [row for h, row in kept.items() if h in changed or row["doc_hash"] != doc_hash]
+    if rewritten:
+        updates = [{**metadata, "doc_hash": doc_hash, "chunk_index": positions[row["chunk_hash"]]} for row in rewritten]
+        new_ids = collection.update([row["id"] for row in rewritten], updates)
+        for row, new_id, update in zip(rewritten, new_ids, updates):
+            if new_id != row["id"] or (row["doc_type"], row["code"]) != (update["doc_type"], update["code"]):
+                lexical_index.remove(row["id"])
+                lexical_index.add(new_id, texts[update["chunk_index"]], update["doc_type"], update["code"])
+    result["updated_chunks"] = len(changed)
+    result["unchanged_chunks"] = len(kept) - len(changed)
+
+    if stale:
+        delete_chunks([row["id"] for row in stale])
+    result["deleted_chunks"] = len(stale)
+
+    _report(progress_callback, "flush")
+    _finish_document_change({row["doc_hash"] for row in stored} | {doc_hash})
+    logger.info(
+        f"Cập nhật văn bản '{doc_id}': {result['new_chunks']} chunk mới, {result['updated_chunks']} cập nhật, "
+        f"{result['unchanged_chunks']} giữ nguyên, {result['deleted_chunks']} xoá"
+    )
+    return result
+
+def get_collection() -> VectorStore:
     global collection
     return collection
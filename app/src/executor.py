@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import threading
+import logging
+
+from prometheus_client import Counter, Gauge
+
+from app.src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+QUERY_IN_FLIGHT = Gauge("legal_qa_query_in_flight", "Query-path calls submitted to the executor and not yet finished")
+QUERY_REJECTED = Counter("legal_qa_query_rejected_total", "Query-path calls rejected or timed out", ["reason"])
+
+
+class ExecutorBusyError(Exception):
+    pass
+
+
+class QueryTimeoutError(Exception):
+    pass
+
+
+class QueryExecutor:
+    '''Bounded thread pool for the blocking parts of the query path (encode, vector search).
+
+    Async endpoints await run() instead of calling encode/search on the event loop. At most
+    max_pending calls may be submitted and unfinished at once; beyond that run() raises
+    ExecutorBusyError straight away so the caller can answer 503 instead of queueing without
+    bound. A call that takes longer than its timeout raises QueryTimeoutError; its thread
+    still finishes the work and keeps its slot until then, so timeouts cannot overload the pool.
+
+    Args:
+        max_workers (int): Number of worker threads.
+        max_pending (int): Maximum number of submitted, unfinished calls (running + queued).
+        timeout (float): Default per-call timeout in seconds.
+    '''
+    def __init__(self, max_workers: int = 4, max_pending: int = 64, timeout: float = 10.0):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _release(self, _future):
+        self._slots.release()
+        QUERY_IN_FLIGHT.dec()
+
+    async def run(self, fn, *args, timeout: float = None, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and await its result.
+
+        The caller's contextvars (e.g. the per-request timing breakdown) are visible to fn.
+        """
+        if not self._slots.acquire(blocking=False):
+            QUERY_REJECTED.labels("busy").inc()
+            raise ExecutorBusyError(f"Query executor is busy ({self.max_pending} calls in flight)")
+        QUERY_IN_FLIGHT.inc()
+        context = contextvars.copy_context()
+        try:
+            future = self._executor.submit(context.run, fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            QUERY_REJECTED.labels("timeout").inc()
+            raise QueryTimeoutError(f"Query did not finish within {timeout or self.timeout}s")
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+query_executor = QueryExecutor(
+    max_workers=get_setting("query.workers", 4),
+    max_pending=get_setting("query.max_pending", 64),
+    timeout=get_setting("query.timeout", 10),
+)
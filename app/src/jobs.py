@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import uuid
+import logging
+
+from app.src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class IngestJob:
+    '''State of one background ingestion job.
+
+    The job moves through pipeline stages reported by the worker via update();
+    the time spent in each stage is recorded in `timings` (seconds).
+    '''
+    def __init__(self, job_id: str, params: dict):
+        self.job_id = job_id
+        self.params = params
+        self.status = QUEUED
+        self.stage = None
+        self.progress = None
+        self.timings = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._stage_started = None
+        self._lock = threading.Lock()
+
+    def _close_stage(self, now: float):
+        if self.stage is not None and self._stage_started is not None:
+            self.timings[self.stage] = self.timings.get(self.stage, 0.0) + (now - self._stage_started)
+
+    def update(self, stage: str, progress: float = None):
+        """Progress callback passed to the ingestion pipeline."""
+        with self._lock:
+            now = time.monotonic()
+            if stage != self.stage:
+                self._close_stage(now)
+                self.stage = stage
+                self._stage_started = now
+            self.progress = progress
+
+    def start(self):
+        with self._lock:
+            self.status = RUNNING
+            self.started_at = time.time()
+
+    def finish(self, result=None, error: str = None):
+        with self._lock:
+            self._close_stage(time.monotonic())
+            self._stage_started = None
+            self.status = FAILED if error else SUCCEEDED
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "timings": {stage: round(seconds, 4) for stage, seconds in self.timings.items()},
+                "params": self.params,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobQueue:
+    '''Runs ingestion jobs on a bounded pool of background workers.
+
+    Args:
+        max_workers (int): Number of jobs processed concurrently.
+        max_pending (int): Maximum number of queued (not yet started) jobs; submit() raises QueueFullError beyond that.
+        max_retained (int): Number of jobs kept for status lookups; the oldest finished jobs are forgotten first.
+    '''
+    def __init__(self, max_workers: int = 2, max_pending: int = 100, max_retained: int = 1000):
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, params: dict, **kwargs) -> IngestJob:
+        """Queue fn(**kwargs, progress_callback=job.update) and return the job right away."""
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"Ingestion queue is full ({pending} jobs pending)")
+            job = IngestJob(uuid.uuid4().hex, params)
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, kwargs)
+        return job
+
+    def get(self, job_id: str) -> IngestJob:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_retained:
+                break
+            if self._jobs[job_id].done:
+                del self._jobs[job_id]
+
+    def _run(self, job: IngestJob, fn, kwargs: dict):
+        job.start()
+        try:
+            result = fn(**kwargs, progress_callback=job.update)
+            job.finish(result=result)
+            logger.info(f"Ingest job {job.job_id} finished: {job.timings}")
+        except Exception as e:
+            logger.exception(f"Ingest job {job.job_id} failed")
+            job.finish(error=str(e))
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+ingest_queue = JobQueue(
+    max_workers=get_setting("ingest.workers", 2),
+    max_pending=get_setting("ingest.max_pending", 100),
+    max_retained=get_setting("ingest.max_retained_jobs", 1000),
+)
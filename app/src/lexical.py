@@ -0,0 +1,296 @@
+from collections import defaultdict, Counter
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import logging
+
+from app.pre_processing.text_processor import TextProcessor
+from app.src.config import get_setting, ROOT_DIR
+
+logger = logging.getLogger(__name__)
+
+text_processor = TextProcessor()
+
+# Số hiệu văn bản, vd. 123/2020/NĐ-CP, 01/2021/TT-BTP, 45/2019/QH14
+RE_DOC_CODE = re.compile(r"\b\d+(?:/\d{4})?/[A-Za-zĐđ0-9]+(?:-[A-Za-zĐđ0-9]+)*", re.UNICODE)
+
+
+def tokenize(text: str) -> list:
+    """Vietnamese-aware tokenization for BM25.
+
+    Document codes (123/2020/NĐ-CP) are kept as single tokens. The text is then normalized
+    with TextProcessor.process_searchterm and split into syllables; adjacent syllable
+    bigrams are added because most Vietnamese words span two syllables ("xử phạt" ->
+    "xử_phạt"), which also keeps references such as "Điều 12" together ("điều_12").
+    """
+    if not text:
+        return []
+    tokens = [m.group(0).lower() for m in RE_DOC_CODE.finditer(text)]
+    syllables = text_processor.process_searchterm(text).split()
+    tokens += syllables
+    tokens += [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+    return tokens
+
+
+class BM25Index:
+    '''Incremental in-memory BM25 inverted index over chunk texts.
+
+    Documents are keyed by the vector store id of the chunk and carry the
+    doc_type/code fields so lexical search can apply the same filters as vector search.
+    The saved file records the fingerprint of the store it was built from and its chunk
+    count, so load() can refuse a file that no longer matches the store.
+
+    The index lives in process memory: with several API worker processes each one holds its
+    own copy, kept in step with the store by sync_lexical_index().
+
+    Args:
+        k1 (float, optional): Term frequency saturation. Defaults to 1.5.
+        b (float, optional): Length normalization. Defaults to 0.75.
+        path (str, optional): File used by save()/load().
+        save_every (int, optional): Changed chunks after which save_if_due() saves. Defaults to 5000.
+        save_interval (float, optional): Seconds after which save_if_due() saves pending changes. Defaults to 60.
+        sync_interval (float, optional): Minimum seconds between two checks of sync_lexical_index(). Defaults to 10.
+    '''
+    def __init__(self, k1: float = 1.5, b: float = 0.75, path: str = None, save_every: int = 5000,
+                 save_interval: float = 60.0, sync_interval: float = 10.0):
+        self.k1 = k1
+        self.b = b
+        self.path = path
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.sync_interval = sync_interval
+        self._last_sync = time.monotonic()
+        self.store_fingerprint = None       # VectorStore.fingerprint() của store mà index phản ánh
+        self._unsaved = 0                   # số chunk thêm / xoá từ lần save gần nhất
+        self._last_save = time.monotonic()
+        self.postings = defaultdict(dict)   # term -> {doc_id: tf}
+        self.doc_len = {}                   # doc_id -> số token
+        self.doc_terms = {}                 # doc_id -> các term, để xoá nhanh
+        self.doc_fields = {}                # doc_id -> (doc_type, code)
+        self.total_len = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, doc_id: int, text: str, doc_type: str = "", code: str = ""):
+        tokens = tokenize(text)
+        with self._lock:
+            if doc_id in self.doc_len:
+                self._remove(doc_id)
+            counts = Counter(tokens)
+            for term, tf in counts.items():
+                self.postings[term][doc_id] = tf
+            self.doc_terms[doc_id] = list(counts)
+            self.doc_len[doc_id] = len(tokens)
+            self.doc_fields[doc_id] = (doc_type or "", code or "")
+            self.total_len += len(tokens)
+            self._unsaved += 1
+
+    def add_many(self, doc_ids: list, texts: list, doc_types: list, codes: list):
+        for doc_id, text, doc_type, code in zip(doc_ids, texts, doc_types, codes):
+            self.add(doc_id, text, doc_type, code)
+
+    def remove(self, doc_id: int):
+        with self._lock:
+            if doc_id in self.doc_len:
+                self._remove(doc_id)
+                self._unsaved += 1
+
+    def clear(self):
+        with self._lock:
+            self.postings = defaultdict(dict)
+            self.doc_len = {}
+            self.doc_terms = {}
+            self.doc_fields = {}
+            self.total_len = 0
+            self._unsaved = 0
+
+    def _remove(self, doc_id: int):
+        for term in self.doc_terms.pop(doc_id, ()):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id)
+        self.doc_fields.pop(doc_id, None)
+
+    def search(self, query: str, top_k: int = 10, doc_type: str = None, code: str = None) -> list:
+        """Return up to top_k (doc_id, score) pairs, best first, optionally filtered by doc_type/code."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.doc_len)
+            if n == 0:
+                return []
+            avg_len = self.total_len / n
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            if doc_type or code:
+                scores = {
+                    doc_id: score for doc_id, score in scores.items()
+                    if (not doc_type or self.doc_fields[doc_id][0] == doc_type)
+                    and (not code or self.doc_fields[doc_id][1] == code)
+                }
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def save(self, path: str = None):
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            state = {
+                "fingerprint": {"store": self.store_fingerprint, "count": len(self.doc_len)},
+                "index": (dict(self.postings), self.doc_len, self.doc_terms, self.doc_fields, self.total_len),
+            }
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._unsaved = 0
+            self._last_save = time.monotonic()
+        os.replace(tmp_path, path)
+
+    def save_if_due(self, force: bool = False) -> bool:
+        """Save once save_every chunks changed or save_interval seconds passed with unsaved changes.
+
+        Pickling the whole index takes time proportional to the corpus, so ingest, reindex and
+        delete call this after each document instead of save(); changes still unsaved when the
+        process dies make the chunk count differ from the store's, and load_lexical_index
+        rebuilds the index on the next start. force saves any unsaved change (used at shutdown).
+        """
+        with self._lock:
+            due = self._unsaved >= self.save_every or (force and self._unsaved > 0) or (
+                self._unsaved > 0 and time.monotonic() - self._last_save >= self.save_interval)
+        if due:
+            self.save()
+        return due
+
+    def load(self, path: str = None, fingerprint: dict = None) -> bool:
+        """Load a saved index; returns False if there is none or, when fingerprint is given, it does not match.
+
+        Args:
+            path (str, optional): Defaults to self.path.
+            fingerprint (dict, optional): {"store": VectorStore.fingerprint(), "count": VectorStore.count()}.
+        """
+        path = path or self.path
+        if not path or not os.path.isfile(path):
+            return False
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        # File cũ (trước khi có fingerprint) là tuple, coi như không khớp
+        saved = state.get("fingerprint") if isinstance(state, dict) else None
+        if saved is None or (fingerprint is not None and saved != fingerprint):
+            logger.warning(f"BM25 index at {path} was saved for {saved}, the store is {fingerprint}; ignoring it")
+            return False
+        postings, doc_len, doc_terms, doc_fields, total_len = state["index"]
+        with self._lock:
+            self.postings = defaultdict(dict, postings)
+            self.doc_len = doc_len
+            self.doc_terms = doc_terms
+            self.doc_fields = doc_fields
+            self.total_len = total_len
+            self.store_fingerprint = saved["store"]
+            self._unsaved = 0
+            self._last_save = time.monotonic()
+        logger.info(f"Loaded BM25 index with {len(doc_len)} chunks from {path}")
+        return True
+
+    def sync_due(self) -> bool:
+        """True at most once every sync_interval seconds."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_sync < self.sync_interval:
+                return False
+            self._last_sync = now
+            return True
+
+    def replace_with(self, other: "BM25Index"):
+        """Take over the contents of another index in one step, so searches never see a half-built index."""
+        with other._lock:
+            state = (other.postings, other.doc_len, other.doc_terms, other.doc_fields, other.total_len,
+                     other.store_fingerprint)
+        with self._lock:
+            (self.postings, self.doc_len, self.doc_terms, self.doc_fields, self.total_len,
+             self.store_fingerprint) = state
+            self._unsaved = 0
+            self._last_save = time.monotonic()
+
+    def rebuild_from_collection(self, collection, batch_size: int = 1000):
+        """Rebuild the index from the text stored in a VectorStore."""
+        count = 0
+        for rows in collection.iterate(["text", "doc_type", "code"], batch_size=batch_size):
+            for row in rows:
+                self.add(row["id"], row["text"], row["doc_type"], row["code"])
+            count += len(rows)
+        logger.info(f"Rebuilt BM25 index from collection ({count} chunks)")
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """Fuse several ranked id lists with RRF; returns (id, score) pairs, best first."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+lexical_index = BM25Index(
+    k1=get_setting("retrieval.bm25_k1", 1.5),
+    b=get_setting("retrieval.bm25_b", 0.75),
+    path=os.path.join(ROOT_DIR, get_setting("retrieval.bm25_path", "data/bm25_index.pkl")),
+    save_every=get_setting("retrieval.bm25_save_every", 5000),
+    save_interval=get_setting("retrieval.bm25_save_interval", 60),
+    sync_interval=get_setting("retrieval.bm25_sync_interval", 10),
+)
+
+def load_lexical_index(collection, index: BM25Index = None):
+    """Load the persisted BM25 index, or rebuild it from the collection if none was saved for it.
+
+    A saved index is only used if it was saved for this store (same fingerprint, so not before
+    a drop_existing, a migration or a switch to another store) with the same number of chunks.
+    """
+    if index is None:
+        index = lexical_index
+    fingerprint = {"store": collection.fingerprint(), "count": collection.count()}
+    if index.load(fingerprint=fingerprint):
+        return
+    index.clear()
+    index.store_fingerprint = fingerprint["store"]
+    if fingerprint["count"] > 0:
+        index.rebuild_from_collection(collection)
+    index.save()
+
+def sync_lexical_index(collection, index: BM25Index = None) -> bool:
+    """Reload the BM25 index if the store changed behind its back; returns True if it was reloaded.
+
+    Every uvicorn worker process has its own index and only updates it for the ingests it ran
+    itself, so chunks added or deleted by another worker (or by the bulk ingest CLI) are
+    invisible to it. At most once every sync_interval seconds the store fingerprint and chunk
+    count are compared with the index; on a mismatch a fresh index is loaded from the saved
+    file (if it was saved for the current store) or rebuilt from the collection, then swapped
+    in. Changes that leave the count unchanged (a reindex in another worker) are only picked
+    up with the next change in count.
+    """
+    if index is None:
+        index = lexical_index
+    if not index.sync_due():
+        return False
+    if index.store_fingerprint == collection.fingerprint() and len(index) == collection.count():
+        return False
+    logger.info(f"BM25 index ({len(index)} chunks) no longer matches the store, reloading it")
+    fresh = BM25Index(k1=index.k1, b=index.b, path=index.path)
+    load_lexical_index(collection, fresh)
+    index.replace_with(fresh)
+    return True
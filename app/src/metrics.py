@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+from app.src.config import get_setting
+
+# Bật để trả về thời gian từng bước của request trong header Server-Timing
+DEBUG_TIMING_HEADERS = get_setting("metrics.debug_timing_headers", False)
+
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGE_SECONDS = Histogram(
+    "legal_qa_stage_seconds", "Time spent in a pipeline stage", ["stage"], buckets=_BUCKETS
+)
+STAGE_ERRORS = Counter("legal_qa_stage_errors_total", "Pipeline stage failures", ["stage"])
+CHUNKS = Counter("legal_qa_chunks_total", "Chunks processed by a pipeline stage", ["stage"])
+BYTES = Counter("legal_qa_bytes_total", "Bytes downloaded or characters extracted by a pipeline stage", ["stage"])
+TOKENS = Counter("legal_qa_llm_tokens_total", "LLM tokens reported by the API", ["kind"])
+CONTEXT_TOKENS_SAVED = Counter(
+    "legal_qa_context_tokens_saved_total", "Estimated prompt tokens removed by merging, deduplicating and budgeting chunks"
+)
+HTTP_SECONDS = Histogram(
+    "legal_qa_http_request_seconds", "HTTP request latency", ["method", "route", "status"], buckets=_BUCKETS
+)
+
+# Thời gian từng bước của request hiện tại (stage -> giây), None khi không đo
+_request_timings = ContextVar("request_timings", default=None)
+
+
+def observe(stage: str, seconds: float, chunks: int = None, nbytes: int = None):
+    """Record one run of a stage, and add it to the current request's breakdown if one is active."""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    if chunks:
+        CHUNKS.labels(stage).inc(chunks)
+    if nbytes:
+        BYTES.labels(stage).inc(nbytes)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as a stage; failures are counted in legal_qa_stage_errors_total.
+
+    Yields:
+        dict: Set "chunks" / "bytes" in it to count what the stage processed.
+    """
+    counts = {}
+    start = time.perf_counter()
+    try:
+        yield counts
+    except Exception:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, counts.get("chunks"), counts.get("bytes"))
+
+
+class TimedIterator:
+    '''Wrap an iterator and accumulate the time spent producing its items.
+
+    Used for streaming stages (page extraction, OCR, chunking) whose work is interleaved
+    with the consumer, so the consumer's time is not counted.
+    '''
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+        self.items = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.items += 1
+        return item
+
+
+def start_request_timings() -> dict:
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: dict) -> str:
+    """Format a stage breakdown as a Server-Timing header value (durations in ms)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def render_metrics() -> tuple:
+    """Current metrics in Prometheus text format, with their content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
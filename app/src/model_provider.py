@@ -0,0 +1,34 @@
+from sentence_transformers import SentenceTransformer
+import threading
+import logging
+
+from app.src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+_model = None
+_lock = threading.Lock()
+
+def get_embedding_model() -> SentenceTransformer:
+    """Return the process-wide embedding model, loading it on first use.
+
+    The model name is read from `embedding.model_name` in config/config.yaml.
+    Loading is guarded by a lock so concurrent first calls only load one copy.
+    """
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                model_name = get_setting("embedding.model_name", DEFAULT_MODEL_NAME)
+                logger.info(f"Loading embedding model '{model_name}'")
+                _model = SentenceTransformer(model_name, device=get_setting("embedding.device"))
+    return _model
+
+def get_embedding_dimension(model=None) -> int:
+    """Size of the vectors produced by model (default: the process-wide embedding model)."""
+    model = model or get_embedding_model()
+    # sentence-transformers 5 đổi tên get_sentence_embedding_dimension thành get_embedding_dimension
+    getter = getattr(model, "get_embedding_dimension", None) or model.get_sentence_embedding_dimension
+    return getter()
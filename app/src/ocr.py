@@ -0,0 +1,94 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from PIL import Image
+import multiprocessing
+import pytesseract
+import logging
+import time
+import sys
+import os
+import fitz
+
+from app.src.config import get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DPI = get_setting("ocr.dpi", 300)
+DEFAULT_LANG = get_setting("ocr.lang", "vie")
+DEFAULT_TESSERACT_CONFIG = get_setting("ocr.tesseract_config", "--psm 6")
+
+# Mỗi process worker mở file PDF một lần và giữ lại cho các trang tiếp theo
+_worker_doc = None
+# OCR chạy trong server đa luồng (ingest queue, query executor); fork một process có nhiều
+# thread có thể sao chép lock đang bị giữ và làm worker treo, nên worker được spawn
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+def _init_worker(pdf_path: str):
+    global _worker_doc
+    _worker_doc = fitz.open(pdf_path)
+
+def render_page(doc, page_number: int, dpi: int = DEFAULT_DPI) -> Image.Image:
+    """Render one page (0-based) to an in-memory RGB image."""
+    pix = doc[page_number].get_pixmap(dpi=dpi, alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+def _ocr_page(page_number: int, dpi: int, lang: str, config: str) -> tuple:
+    image = render_page(_worker_doc, page_number, dpi)
+    text = pytesseract.image_to_string(image, lang=lang, config=config)
+    return page_number, text
+
+def ocr_pdf(pdf_path: str, dpi: int = DEFAULT_DPI, lang: str = DEFAULT_LANG, config: str = DEFAULT_TESSERACT_CONFIG,
+            max_workers: int = None, max_in_flight: int = None):
+    """OCR a scanned PDF page by page in a process pool.
+
+    Pages are rendered lazily inside the workers and never written to disk. At most
+    max_in_flight pages are queued at once, so memory stays bounded regardless of page count.
+
+    Args:
+        pdf_path (str): Path of the PDF file.
+        dpi (int, optional): Render resolution. Defaults to 300.
+        lang (str, optional): Tesseract language. Defaults to 'vie'.
+        config (str, optional): Extra Tesseract options. Defaults to '--psm 6'.
+        max_workers (int, optional): Number of OCR processes. Defaults to the available cores.
+        max_in_flight (int, optional): Pages submitted but not yet consumed. Defaults to 2 * max_workers.
+
+    Yields:
+        tuple: (page_number, text) in page order, page_number starting from 1.
+    """
+    if not os.path.isfile(pdf_path):
+        raise Exception(f"{pdf_path} is not a valid file")
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    max_workers = max_workers or get_setting("ocr.workers") or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * max_workers
+    logger.debug(f"OCR {pdf_path}: {page_count} pages, {max_workers} workers")
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=_MP_CONTEXT, initializer=_init_worker,
+                             initargs=(pdf_path,)) as pool:
+        pending = deque()
+        next_page = 0
+        try:
+            while next_page < page_count or pending:
+                while next_page < page_count and len(pending) < max_in_flight:
+                    pending.append(pool.submit(_ocr_page, next_page, dpi, lang, config))
+                    next_page += 1
+                page_number, text = pending.popleft().result()
+                yield page_number + 1, text
+        finally:
+            # Trang lỗi hoặc bên gọi dừng sớm: bỏ các trang chưa chạy thay vì chờ OCR xong
+            for future in pending:
+                future.cancel()
+
+def ocr_pdf_text(pdf_path: str, **kwargs) -> str:
+    """OCR a whole PDF and return the page texts joined in page order."""
+    return "\n".join(text for _, text in ocr_pdf(pdf_path, **kwargs)).strip()
+
+
+if __name__ == "__main__":
+    # python -m app.src.ocr sample_scan.pdf [workers]
+    path = sys.argv[1]
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    start = time.perf_counter()
+    pages = sum(1 for _ in ocr_pdf(path, max_workers=workers))
+    elapsed = time.perf_counter() - start
+    print(f"{pages} pages in {elapsed:.2f}s ({pages / elapsed:.2f} pages/sec)")
@@ -1,80 +1,269 @@
-from sentence_transformers import SentenceTransformer
-from pymilvus import Collection
 import logging
+import threading
+
+from app.pre_processing.text_processor import TextProcessor
+from app.src import metrics
+from app.src.batching import MicroBatcher
+from app.src.cache import invalidate_search_results, query_embedding_cache, search_result_cache
+from app.src.config import get_setting
+from app.src.lexical import lexical_index, reciprocal_rank_fusion, sync_lexical_index
+from app.src.model_provider import get_embedding_model
+from app.src.vector_store import VectorStore, date_to_int
 
 logger = logging.getLogger(__name__)
 
-# Load model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+text_processor = TextProcessor()
+
+METADATA_FIELDS = ["doc_type", "code", "issue_date", "effective_date"]
+HYBRID_SEARCH = get_setting("retrieval.hybrid", True)
+# Số ứng viên lấy từ mỗi nhánh (vector, BM25) trước khi fuse
+HYBRID_CANDIDATES = get_setting("retrieval.candidates", 20)
+RRF_K = get_setting("retrieval.rrf_k", 60)
+# Gom encode/search của các request đồng thời thành một lần gọi model / một search nhiều vector
+BATCHING = get_setting("batching.enabled", True)
+
+_batchers = None
+_batchers_lock = threading.Lock()
+
+def _cache_key(query: str) -> str:
+    return text_processor.process_searchterm(query) or query
+
+def encode_queries(queries: list) -> list:
+    """Encode several queries in one model call; returns one embedding (list of float) per query."""
+    with metrics.stage("query_embed_batch"):
+        vectors = get_embedding_model().encode(queries, batch_size=len(queries), convert_to_numpy=True, show_progress_bar=False)
+    return [vector.tolist() for vector in vectors]
+
+def _filter_key(filters) -> tuple:
+    return tuple(sorted((field, tuple(sorted(value.items())) if isinstance(value, dict)
+                         else tuple(value) if isinstance(value, (list, tuple, set)) else value)
+                        for field, value in (filters or {}).items()))
+
+def search_many(requests: list) -> list:
+    """Run many vector searches with one multi-vector search per (store, filters, output_fields) group.
+
+    Args:
+        requests (list of tuple): (collection, query_embedding, filters, limit, output_fields) per search.
+
+    Returns:
+        list: The hits of each request, in request order.
+    """
+    groups = {}
+    for i, (collection, _, filters, _, output_fields) in enumerate(requests):
+        groups.setdefault((id(collection), _filter_key(filters), tuple(output_fields)), []).append(i)
+    results = [None] * len(requests)
+    for indices in groups.values():
+        collection, _, filters, _, output_fields = requests[indices[0]]
+        limit = max(requests[i][3] for i in indices)
+        with metrics.stage("vector_search_batch"):
+            hits = collection.search([requests[i][1] for i in indices], top_k=limit, filters=filters,
+                                     output_fields=list(output_fields))
+        for i, query_hits in zip(indices, hits):
+            results[i] = query_hits[:requests[i][3]]
+    return results
+
+def _get_batchers() -> tuple:
+    global _batchers
+    if _batchers is None:
+        with _batchers_lock:
+            if _batchers is None:
+                max_batch_size = get_setting("batching.max_batch_size", 32)
+                max_wait_ms = get_setting("batching.max_wait_ms", 2)
+                timeout = get_setting("batching.timeout", 30)
+                _batchers = (
+                    MicroBatcher(encode_queries, max_batch_size, max_wait_ms, name="query_encode", timeout=timeout),
+                    MicroBatcher(search_many, max_batch_size, max_wait_ms,
+                                 workers=get_setting("batching.search_workers", 2), name="vector_search",
+                                 timeout=timeout),
+                )
+    return _batchers
+
+def encode_query(query: str) -> list:
+    """Encode a query, reusing the cached embedding of its normalized form when available.
+
+    With batching enabled, concurrent cache misses are encoded together in one model call.
+    """
+    key = _cache_key(query)
+    query_embedding = query_embedding_cache.get(key)
+    if query_embedding is None:
+        with metrics.stage("query_embed"):
+            if BATCHING:
+                query_embedding = _get_batchers()[0].submit(query)
+            else:
+                query_embedding = encode_queries([query])[0]
+        query_embedding_cache.set(key, query_embedding)
+    return query_embedding
+
+def _filters(doc_type=None, code=None, effective_after=None, effective_before=None):
+    """Build the vector store filters; the effective dates are inclusive bounds (date or string).
 
-def retrieve_similar_metadata(query: str, collection: Collection, doc_type=None, code=None, top_k=3):
-    logger.debug(f"[RAG] Encoding query: {query}")
-    query_embedding = embedding_model.encode(query).tolist()
-    # Tạo filter biểu thức nếu có điều kiện lọc
-    filters = []
+    With a date bound, documents whose effective date is unknown are excluded.
+    """
+    # Tạo filter nếu có điều kiện lọc
+    filters = {}
     if doc_type:
-        filters.append(f"doc_type == '{doc_type}'")
+        filters["doc_type"] = doc_type
     if code:
-        filters.append(f"code == '{code}'")
-    filter_expr = " and ".join(filters) if filters else None
+        filters["code"] = code
+    if effective_after or effective_before:
+        # effective_ymd = 0 là không rõ ngày hiệu lực
+        effective = {"gte": max(date_to_int(effective_after), 1)}
+        if effective_before:
+            effective["lte"] = date_to_int(effective_before)
+        filters["effective_ymd"] = effective
+    return filters or None
 
-    search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
+def _vector_search(query_embedding: list, collection: VectorStore, filters, limit: int, output_fields: list) -> list:
+    request = (collection, query_embedding, filters, limit, output_fields)
+    with metrics.stage("vector_search"):
+        if BATCHING:
+            return _get_batchers()[1].submit(request)
+        return search_many([request])[0]
 
-    logger.debug(f"[RAG] Searching with filter: {filter_expr}")
-    results = collection.search(
-        data=[query_embedding],
-        anns_field="embedding",
-        param=search_params,
-        limit=top_k,
-        output_fields=["doc_type", "code", "issue_date", "effective_date"],
-        filter=filter_expr
-    )
+def search_chunks(query: str, collection: VectorStore, doc_type=None, code=None, top_k=3, output_fields=None,
+                  effective_after=None, effective_before=None) -> list:
+    """Return the top_k chunks for a query as dicts with id, score and output_fields.
 
-    logger.debug(f"[RAG] Found {len(results[0])} results")
+    With retrieval.hybrid enabled, vector and BM25 candidates are fused with reciprocal
+    rank fusion and `score` is the fused score (higher is better); otherwise it is the
+    vector store's metric score (distance for L2, similarity for IP/COSINE).
+    effective_after / effective_before restrict results to an effective date range (see _filters).
+    """
+    output_fields = output_fields or METADATA_FIELDS
+    query_embedding = encode_query(query)
+    filters = _filters(doc_type, code, effective_after, effective_before)
+    if not _hybrid(collection):
+        return _vector_search(query_embedding, collection, filters, top_k, output_fields)
 
+    vector_hits = _vector_search(query_embedding, collection, filters, max(top_k, HYBRID_CANDIDATES), output_fields)
+    return _fuse(query, vector_hits, collection, filters, top_k, output_fields)
+
+def _hybrid(collection: VectorStore) -> bool:
+    # Worker khác có thể đã ingest / xoá văn bản; nạp lại index BM25 và bỏ kết quả search đã cache
+    if HYBRID_SEARCH and sync_lexical_index(collection, lexical_index):
+        invalidate_search_results()
+    return HYBRID_SEARCH and len(lexical_index) > 0
+
+def _fuse(query: str, vector_hits: list, collection: VectorStore, filters, top_k: int, output_fields: list) -> list:
+    """Fuse vector hits with BM25 hits for the same query (RRF) and return the top_k."""
+    filters = filters or {}
+    n_candidates = max(top_k, HYBRID_CANDIDATES)
+    with metrics.stage("lexical_search"):
+        lexical_hits = lexical_index.search(query, n_candidates, doc_type=filters.get("doc_type"), code=filters.get("code"))
+        # Chỉ mục BM25 chỉ lọc được doc_type và code, các điều kiện còn lại lọc qua vector store
+        others = {field: value for field, value in filters.items() if field not in ("doc_type", "code")}
+        if others and lexical_hits:
+            allowed = {row["id"] for row in collection.query({"id": [doc_id for doc_id, _ in lexical_hits], **others}, ["id"])}
+            lexical_hits = [hit for hit in lexical_hits if hit[0] in allowed]
+    fused = reciprocal_rank_fusion(
+        [[hit["id"] for hit in vector_hits], [doc_id for doc_id, _ in lexical_hits]], k=RRF_K
+    )[:top_k]
+
+    by_id = {hit["id"]: hit for hit in vector_hits}
+    missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+    if missing:
+        for row in collection.query({"id": missing}, output_fields=output_fields):
+            by_id[row["id"]] = row
+    return [{**by_id[doc_id], "score": score} for doc_id, score in fused if doc_id in by_id]
+
+def retrieve_similar_metadata(query: str, collection: VectorStore, doc_type=None, code=None, top_k=3,
+                              effective_after=None, effective_before=None):
+    filters = _filters(doc_type, code, effective_after, effective_before)
+    cache_key = ("metadata", _cache_key(query), _filter_key(filters), top_k)
+    cached = search_result_cache.get(cache_key)
+    if cached is not None:
+        return [dict(item) for item in cached]
+
+    hits = search_chunks(query, collection, doc_type, code, top_k, METADATA_FIELDS, effective_after, effective_before)
+    output = _metadata_items(hits)
+    search_result_cache.set(cache_key, output)
+    return [dict(item) for item in output]
+
+def _metadata_items(hits: list) -> list:
     # Trả về metadata của các bản ghi gần nhất
     output = []
-    for hit in results[0]:
+    for hit in hits:
         item = {
-            "score": hit.distance,
-            "doc_type": hit.entity.get("doc_type"),
-            "code": hit.entity.get("code"),
-            "issue_date": hit.entity.get("issue_date"),
-            "effective_date": hit.entity.get("effective_date"),
+            "score": hit["score"],
+            "doc_type": hit.get("doc_type"),
+            "code": hit.get("code"),
+            "issue_date": hit.get("issue_date"),
+            "effective_date": hit.get("effective_date"),
         }
         output.append(item)
-
     return output
 
-def rag_query(query: str, collection: Collection, doc_type=None, code=None):
-    results = retrieve_similar_metadata(query, collection, doc_type, code)
+def encode_many(queries: list) -> list:
+    """Embeddings for many queries, encoding all cache misses in a single model call."""
+    keys = [_cache_key(query) for query in queries]
+    embeddings = [query_embedding_cache.get(key) for key in keys]
+    missing = {}
+    for query, key, embedding in zip(queries, keys, embeddings):
+        if embedding is None:
+            missing.setdefault(key, query)
+    if missing:
+        with metrics.stage("query_embed"):
+            encoded = dict(zip(missing, encode_queries(list(missing.values()))))
+        for key, embedding in encoded.items():
+            query_embedding_cache.set(key, embedding)
+        embeddings = [embedding if embedding is not None else encoded[key] for key, embedding in zip(keys, embeddings)]
+    return embeddings
+
+def retrieve_metadata_batch(queries: list, embeddings: list, top_ks: list, collection: VectorStore,
+                            doc_type=None, code=None) -> list:
+    """retrieve_similar_metadata for many queries sharing the same filters, with one multi-vector search.
+
+    Args:
+        queries (list of str): The queries.
+        embeddings (list): Their embeddings, e.g. from encode_many().
+        top_ks (list of int): Number of results for each query.
+
+    Returns:
+        list: The metadata results of each query, in order.
+    """
+    filters = _filters(doc_type, code)
+    cache_keys = [("metadata", _cache_key(query), _filter_key(filters), top_k) for query, top_k in zip(queries, top_ks)]
+    results = [search_result_cache.get(key) for key in cache_keys]
+    todo = [i for i, result in enumerate(results) if result is None]
+    if todo:
+        hybrid = _hybrid(collection)
+        limits = [max(top_ks[i], HYBRID_CANDIDATES) if hybrid else top_ks[i] for i in todo]
+        with metrics.stage("vector_search"):
+            all_hits = search_many([(collection, embeddings[i], filters, limit, METADATA_FIELDS) for i, limit in zip(todo, limits)])
+        for i, hits in zip(todo, all_hits):
+            if hybrid:
+                hits = _fuse(queries[i], hits, collection, filters, top_ks[i], METADATA_FIELDS)
+            results[i] = _metadata_items(hits)
+            search_result_cache.set(cache_keys[i], results[i])
+    return [[dict(item) for item in result] for result in results]
+
+def rag_query(query: str, collection: VectorStore, doc_type=None, code=None, effective_after=None, effective_before=None):
+    results = retrieve_similar_metadata(query, collection, doc_type, code,
+                                        effective_after=effective_after, effective_before=effective_before)
     if not results:
         return "Không tìm thấy văn bản phù hợp."
     return results
 
 def retrieve_metadata_by_query(query, collection, top_k=3):
-    embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-    query_embedding = embedding_model.encode([query])
-    
-    search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
-    results = collection.search(
-        data=query_embedding,
-        anns_field="embedding",
-        param=search_params,
-        limit=top_k,
-        output_fields=["doc_type", "code", "issue_date", "effective_date", "text"]
-    )
+    cache_key = ("context", _cache_key(query), None, None, top_k)
+    cached = search_result_cache.get(cache_key)
+    if cached is not None:
+        return [dict(doc) for doc in cached]
+
+    hits = search_chunks(query, collection, top_k=top_k, output_fields=METADATA_FIELDS + ["text", "doc_hash", "doc_id"])
     
     docs = []
-    for hit in results[0]:
-        entity = hit.entity
+    for hit in hits:
         docs.append({
-            "score": hit.score,
-            "doc_type": entity.get("doc_type"),
-            "code": entity.get("code"),
-            "issue_date": entity.get("issue_date"),
-            "effective_date": entity.get("effective_date"),
-            "text": entity.get("text")
+            "score": hit["score"],
+            "doc_type": hit.get("doc_type"),
+            "code": hit.get("code"),
+            "issue_date": hit.get("issue_date"),
+            "effective_date": hit.get("effective_date"),
+            "text": hit.get("text"),
+            "doc_hash": hit.get("doc_hash"),
+            "doc_id": hit.get("doc_id")
         })
 
-    return docs
+    search_result_cache.set(cache_key, docs)
+    return [dict(doc) for doc in docs]
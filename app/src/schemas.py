@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+
+
+class UploadRequest(BaseModel):
+    url: str
+    doc_type: str = None  # e.g., luật, nghị định, thông tư, ...
+    code: str = None      # mã ký hiệu
+    issue_date: str = None  # ngày ban hành (YYYY-MM-DD)
+    effective_date: str = None  # ngày hiệu lực (YYYY-MM-DD)
+    doc_id: str = None  # định danh văn bản qua các lần sửa đổi; mặc định là code, hoặc hash nội dung
+
+
+class QueryItem(BaseModel):
+    query: str
+    doc_type: str = None
+    code: str = None
+    top_k: int = Field(3, ge=1, le=100)
+
+
+class BatchQueryRequest(BaseModel):
+    queries: list[QueryItem]
@@ -0,0 +1,770 @@
+from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility
+import os
+import re
+import json
+import sqlite3
+import threading
+import logging
+import uuid
+from datetime import date, datetime
+import numpy as np
+
+from app.src.config import get_setting, ROOT_DIR
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự các field metadata, khớp với thứ tự field trong schema Milvus
+METADATA_FIELDS = ["text", "doc_type", "code", "issue_date", "effective_date", "doc_hash", "chunk_hash",
+                   "doc_id", "chunk_index", "issue_ymd", "effective_ymd"]
+# Field kiểu số nguyên, các field còn lại là chuỗi
+INTEGER_FIELDS = ("chunk_index", "issue_ymd", "effective_ymd")
+# Ngày dạng số YYYYMMDD (0 = không rõ), tính từ field ngày dạng chuỗi khi ghi để lọc được theo khoảng
+DATE_FIELDS = {"issue_ymd": "issue_date", "effective_ymd": "effective_date"}
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%Y%m%d")
+# Toán tử của filter khoảng, vd. {"effective_ymd": {"gte": 20200101, "lt": 20210101}}
+RANGE_OPERATORS = {"gte": ">=", "gt": ">", "lte": "<=", "lt": "<"}
+# Tăng khi thay đổi field trong schema; dữ liệu cũ sẽ được migrate khi khởi động
+SCHEMA_VERSION = 3
+# Index vô hướng của Milvus trên các field hay dùng để lọc (doc_type là partition key)
+SCALAR_INDEXES = {"code": "INVERTED", "doc_id": "INVERTED", "issue_ymd": "STL_SORT", "effective_ymd": "STL_SORT"}
+
+METRICS = ("L2", "IP", "COSINE")
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "IVF_SQ8", "IVF_PQ", "HNSW")
+# Tham số mặc định khi config không ghi rõ
+DEFAULT_INDEX_PARAMS = {
+    "FLAT": {},
+    "IVF_FLAT": {"nlist": 128},
+    "IVF_SQ8": {"nlist": 128},
+    "IVF_PQ": {"nlist": 128, "m": 8, "nbits": 8},
+    "HNSW": {"M": 16, "efConstruction": 200},
+}
+DEFAULT_SEARCH_PARAMS = {
+    "FLAT": {},
+    "IVF_FLAT": {"nprobe": 10},
+    "IVF_SQ8": {"nprobe": 10},
+    "IVF_PQ": {"nprobe": 10},
+    "HNSW": {"ef": 64},
+}
+
+
+def higher_is_better(metric: str) -> bool:
+    """True for similarity metrics (IP, COSINE), False for distances (L2)."""
+    return metric.upper() != "L2"
+
+
+def index_config(index_type: str = None, metric: str = None, params: dict = None, search_params: dict = None) -> tuple:
+    """Build Milvus (index_params, search_params) dicts.
+
+    Unset arguments come from vector_store.metric, milvus.index.type, milvus.index.params
+    and milvus.index.search_params in config/config.yaml.
+
+    Returns:
+        tuple: (index_params for create_index, search_params for search)
+    """
+    index_type = (index_type or get_setting("milvus.index.type", "IVF_FLAT")).upper()
+    metric = (metric or get_setting("vector_store.metric", "L2")).upper()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type '{index_type}', expected one of {INDEX_TYPES}")
+    if metric not in METRICS:
+        raise ValueError(f"Unsupported metric '{metric}', expected one of {METRICS}")
+    if params is None:
+        params = get_setting("milvus.index.params", None) or DEFAULT_INDEX_PARAMS[index_type]
+    if search_params is None:
+        search_params = get_setting("milvus.index.search_params", None) or DEFAULT_SEARCH_PARAMS[index_type]
+    return (
+        {"index_type": index_type, "metric_type": metric, "params": dict(params)},
+        {"metric_type": metric, "params": dict(search_params)},
+    )
+
+
+class VectorStore:
+    '''Storage for chunk embeddings and their metadata.
+
+    Rows are dicts with the METADATA_FIELDS keys; every stored row gets an integer "id".
+    doc_id identifies the source document across versions (defaults to doc_hash) and
+    chunk_index is the position of the chunk in it (defaults to -1). issue_ymd and
+    effective_ymd are always computed from issue_date and effective_date (see date_to_int).
+    Filters are dicts mapping a field (or "id") to a value (equality), to a
+    list/tuple/set of values (membership) or to a dict of RANGE_OPERATORS bounds
+    (range); all conditions must hold.
+    '''
+    name = "vector_store"
+
+    def insert(self, vectors: np.ndarray, rows: list) -> list:
+        """Store vectors (n x dim) with their metadata rows and return the new ids."""
+        raise NotImplementedError
+
+    def search(self, vectors, top_k: int, filters: dict = None, output_fields: list = None) -> list:
+        """Nearest-neighbour search for each query vector.
+
+        Returns:
+            list of list of dict: For each query, up to top_k hits best first, each with
+            "id", "score" (the metric distance/similarity) and the requested output_fields.
+        """
+        raise NotImplementedError
+
+    def query(self, filters: dict, output_fields: list, limit: int = None) -> list:
+        """Return rows (with "id" and output_fields) matching filters."""
+        raise NotImplementedError
+
+    def delete(self, filters: dict) -> int:
+        """Delete rows matching filters and return how many were deleted."""
+        raise NotImplementedError
+
+    def update(self, ids: list, rows: list) -> list:
+        """Set the metadata fields given in rows[i] on row ids[i], keeping the vectors.
+
+        Returns:
+            list: The ids of the updated rows, in order. Backends that cannot update in
+            place re-insert the rows, so the ids may change.
+        """
+        raise NotImplementedError
+
+    def get_vectors(self, ids: list) -> dict:
+        """Return {id: vector} for the given ids; ids that are not stored are left out."""
+        raise NotImplementedError
+
+    def flush(self):
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def fingerprint(self) -> str:
+        """Identity of the stored rows; changes when the store is dropped, recreated or migrated."""
+        raise NotImplementedError
+
+    def iterate(self, output_fields: list, batch_size: int = 1000):
+        """Yield all rows in batches (lists of dicts with "id" and output_fields)."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def _check_fields(fields) -> list:
+    for field in fields:
+        if field != "id" and field not in METADATA_FIELDS:
+            raise ValueError(f"Unknown field '{field}'")
+    return list(fields)
+
+
+def date_to_int(value) -> int:
+    """Convert a date to a sortable YYYYMMDD integer.
+
+    Accepts date/datetime objects, YYYYMMDD integers and strings in one of DATE_FORMATS
+    ("2020-12-03", "03/12/2020", "20201203"). Empty values give 0 (unknown date).
+
+    Raises:
+        ValueError: If the value is not a valid date.
+    """
+    if value is None or value == "":
+        return 0
+    if isinstance(value, date):
+        return value.year * 10000 + value.month * 100 + value.day
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return parsed.year * 10000 + parsed.month * 100 + parsed.day
+    raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD or DD/MM/YYYY")
+
+
+def _stored_date(value) -> int:
+    # Ngày sai định dạng được lưu là 0 (không rõ) thay vì chặn việc ingest
+    try:
+        return date_to_int(value)
+    except ValueError:
+        logger.debug(f"Unparseable date '{value}', stored as unknown")
+        return 0
+
+
+def _date_values(row: dict) -> dict:
+    """The *_ymd values derived from the date strings present in row."""
+    return {field: _stored_date(row[source]) for field, source in DATE_FIELDS.items() if source in row}
+
+
+def _row_values(row: dict) -> list:
+    return [
+        row.get("doc_id") or row["doc_hash"] if field == "doc_id"
+        else row.get("chunk_index", -1) if field == "chunk_index"
+        else _stored_date(row.get(DATE_FIELDS[field])) if field in DATE_FIELDS
+        else row[field]
+        for field in METADATA_FIELDS
+    ]
+
+
+def _columns(vectors: np.ndarray, rows: list) -> list:
+    # Dữ liệu insert theo cột: vector rồi từng field metadata theo thứ tự schema
+    values = [_row_values(row) for row in rows]
+    return [vectors] + [[row[i] for row in values] for i in range(len(METADATA_FIELDS))]
+
+
+def _range_bounds(value: dict) -> list:
+    for op in value:
+        if op not in RANGE_OPERATORS:
+            raise ValueError(f"Unknown range operator '{op}', expected one of {tuple(RANGE_OPERATORS)}")
+    return [(op, RANGE_OPERATORS[op], bound) for op, bound in value.items()]
+
+
+def milvus_filter(filters: dict) -> tuple:
+    """Build a Milvus filter template and its parameters from a filter dict.
+
+    Values are passed separately as expr_params instead of being quoted into the
+    expression, e.g. {"code": "a", "id": [1, 2]} gives
+    ("code == {code} and id in {id}", {"code": "a", "id": [1, 2]}).
+
+    Returns:
+        tuple: (expression or None, params dict)
+    """
+    parts, params = [], {}
+    for field in _check_fields(filters or {}):
+        value = filters[field]
+        if isinstance(value, dict):
+            for op, operator, bound in _range_bounds(value):
+                parts.append(f"{field} {operator} {{{field}_{op}}}")
+                params[f"{field}_{op}"] = bound
+        elif isinstance(value, (list, tuple, set)):
+            parts.append(f"{field} in {{{field}}}")
+            params[field] = list(value)
+        else:
+            parts.append(f"{field} == {{{field}}}")
+            params[field] = value
+    return (" and ".join(parts) if parts else None), params
+
+
+class MilvusVectorStore(VectorStore):
+    '''VectorStore backed by a pymilvus Collection.
+
+    The collection is reused across restarts. Its description stores the schema version;
+    a collection built with an older schema is renamed to '<name>_v<old>' and a new one is
+    created. The vector index is rebuilt only when its parameters change.
+
+    doc_type is the partition key, spread over num_partitions partitions, so a search
+    filtered by doc_type only scans the partition holding it. code, doc_id and the
+    *_ymd dates have scalar indexes (SCALAR_INDEXES) and filters are sent as templates
+    with expr_params (see milvus_filter).
+
+    index_params and search_params default to index_config(), i.e. config/config.yaml;
+    num_partitions defaults to milvus.num_partitions.
+    '''
+    name = "milvus"
+
+    def __init__(self, host: str = "localhost", port: str = "19530", collection_name: str = "legal_docs",
+                 dim: int = 384, drop_existing: bool = False, index_params: dict = None, search_params: dict = None,
+                 num_partitions: int = None):
+        self.collection_name = collection_name
+        self.dim = dim
+        self.num_partitions = num_partitions or get_setting("milvus.num_partitions", 16)
+        default_index, default_search = index_config()
+        self.index_params = index_params or default_index
+        self.search_params = search_params or default_search
+        self.metric = self.index_params["metric_type"]
+        try:
+            connections.connect("default", host=host, port=port)
+            logger.debug(f"Connected to Milvus at {host}:{port}")
+        except Exception as e:
+            logger.error(f"Failed to connect to Milvus: {e}")
+            raise
+        self.collection = self._init_collection(drop_existing)
+
+    def _schema_version(self, col: Collection) -> int:
+        match = re.search(r"schema v(\d+)", col.description or "")
+        return int(match.group(1)) if match else 0
+
+    def _index_matches(self, index) -> bool:
+        params = dict(index.params)
+        build_params = params.get("params", {})
+        if isinstance(build_params, str):
+            build_params = json.loads(build_params)
+        return (params.get("index_type") == self.index_params["index_type"]
+                and params.get("metric_type") == self.index_params["metric_type"]
+                and {k: str(v) for k, v in build_params.items()} == {k: str(v) for k, v in self.index_params["params"].items()})
+
+    def _migrate(self, old_version: int):
+        """Move a collection built with an older schema out of the way.
+
+        The old collection is kept as '<name>_v<old_version>'. From v1 on every new field
+        can be derived from the stored ones, so the backup name is returned for
+        _copy_rows(); older collections must be re-ingested from the source PDFs.
+
+        Returns:
+            str: The backup collection to copy rows from, or None.
+        """
+        backup = f"{self.collection_name}_v{old_version}"
+        if utility.has_collection(backup):
+            utility.drop_collection(backup)
+        utility.rename_collection(self.collection_name, backup)
+        if 1 <= old_version < SCHEMA_VERSION:
+            logger.warning(f"Schema changed (v{old_version} -> v{SCHEMA_VERSION}): renamed '{self.collection_name}' to '{backup}', copying its rows")
+            return backup
+        logger.warning(f"Schema changed (v{old_version} -> v{SCHEMA_VERSION}): renamed '{self.collection_name}' to '{backup}', documents must be re-ingested")
+        return None
+
+    def _copy_rows(self, source: str, col: Collection, batch_size: int = 1000) -> int:
+        old = Collection(name=source)
+        old.load()
+        fields = [field.name for field in old.schema.fields if field.name in METADATA_FIELDS]
+        iterator = old.query_iterator(batch_size=batch_size, output_fields=["embedding"] + fields)
+        copied = 0
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                vectors = np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+                col.insert(_columns(vectors, rows))
+                copied += len(rows)
+        finally:
+            iterator.close()
+            old.release()
+        col.flush()
+        return copied
+
+    def _ensure_indexes(self, col: Collection):
+        existing = {index.field_name: index for index in col.indexes}
+        wanted = {"embedding": self.index_params,
+                  **{field: {"index_type": index_type} for field, index_type in SCALAR_INDEXES.items()}}
+        stale = "embedding" in existing and not self._index_matches(existing["embedding"])
+        missing = [field for field in wanted if field not in existing or (field == "embedding" and stale)]
+        if not missing:
+            return
+        # Milvus không cho tạo/xoá index khi collection đang được load
+        col.release()
+        if stale:
+            # Chỉ build lại index khi cấu hình index thay đổi
+            logger.warning("Index parameters changed, rebuilding index on 'embedding'")
+            col.drop_index(index_name=existing["embedding"].index_name)
+        for field in missing:
+            try:
+                col.create_index(field_name=field, index_params=wanted[field], index_name=field)
+                logger.debug(f"Created {wanted[field]['index_type']} index for '{field}' field")
+            except Exception as e:
+                logger.error(f"Failed to create index on '{field}': {e}")
+                raise
+
+    def _init_collection(self, drop_existing: bool) -> Collection:
+        name = self.collection_name
+        if drop_existing and utility.has_collection(name):
+            utility.drop_collection(name)
+            logger.debug(f"Dropped existing collection '{name}'")
+
+        meta_fields = [
+            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=8192),
+            FieldSchema(name="doc_type", dtype=DataType.VARCHAR, max_length=64, is_partition_key=True),
+            FieldSchema(name="code", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="issue_date", dtype=DataType.VARCHAR, max_length=32),
+            FieldSchema(name="effective_date", dtype=DataType.VARCHAR, max_length=32),
+            FieldSchema(name="doc_hash", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="chunk_hash", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=128),
+            FieldSchema(name="chunk_index", dtype=DataType.INT64),
+            FieldSchema(name="issue_ymd", dtype=DataType.INT64),
+            FieldSchema(name="effective_ymd", dtype=DataType.INT64)
+        ]
+
+        backup = None
+        if utility.has_collection(name):
+            old_version = self._schema_version(Collection(name=name))
+            if old_version != SCHEMA_VERSION:
+                backup = self._migrate(old_version)
+
+        if not utility.has_collection(name):
+            fields = [
+                FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim),
+                *meta_fields
+            ]
+            schema = CollectionSchema(fields, description=f"Text embeddings with metadata (schema v{SCHEMA_VERSION})")
+            col = Collection(name=name, schema=schema, num_partitions=self.num_partitions)
+            logger.debug(f"Created new collection '{name}' ({self.num_partitions} partitions by doc_type)")
+        else:
+            col = Collection(name=name)
+            logger.debug(f"Reusing existing collection '{name}' (schema v{SCHEMA_VERSION})")
+
+        self._ensure_indexes(col)
+        try:
+            col.load()
+            logger.debug("Collection loaded")
+        except Exception as e:
+            logger.error(f"Failed to load collection: {e}")
+            raise
+        if backup:
+            copied = self._copy_rows(backup, col)
+            logger.warning(f"Copied {copied} rows from '{backup}' into '{name}'")
+        return col
+
+    def insert(self, vectors: np.ndarray, rows: list) -> list:
+        return list(self.collection.insert(_columns(vectors, rows)).primary_keys)
+
+    def search(self, vectors, top_k: int, filters: dict = None, output_fields: list = None) -> list:
+        output_fields = _check_fields(output_fields or [])
+        expr, params = milvus_filter(filters)
+        results = self.collection.search(
+            data=[list(map(float, v)) for v in vectors],
+            anns_field="embedding",
+            param=self.search_params,
+            limit=top_k,
+            output_fields=output_fields,
+            expr=expr,
+            expr_params=params
+        )
+        return [
+            [{"id": hit.id, "score": hit.distance, **{field: hit.entity.get(field) for field in output_fields}} for hit in hits]
+            for hits in results
+        ]
+
+    def query(self, filters: dict, output_fields: list, limit: int = None) -> list:
+        kwargs = {"limit": limit} if limit else {}
+        fields = _check_fields(output_fields)
+        expr, params = milvus_filter(filters)
+        rows = self.collection.query(expr=expr, expr_params=params, output_fields=fields, **kwargs)
+        return [{"id": row["id"], **{field: row.get(field) for field in fields}} for row in rows]
+
+    def delete(self, filters: dict) -> int:
+        ids = [row["id"] for row in self.query(filters, ["id"])]
+        if ids:
+            self.collection.delete(expr="id in {ids}", expr_params={"ids": ids})
+        return len(ids)
+
+    def get_vectors(self, ids: list) -> dict:
+        if not ids:
+            return {}
+        rows = self.collection.query(expr="id in {ids}", expr_params={"ids": list(ids)}, output_fields=["embedding"])
+        return {row["id"]: np.asarray(row["embedding"], dtype=np.float32) for row in rows}
+
+    def update(self, ids: list, rows: list) -> list:
+        # Milvus không cập nhật từng field được: đọc lại vector, xoá rồi insert bản ghi mới
+        if not ids:
+            return []
+        stored = {
+            row["id"]: row for row in
+            self.collection.query(expr="id in {ids}", expr_params={"ids": list(ids)},
+                                  output_fields=["embedding"] + METADATA_FIELDS)
+        }
+        missing = [i for i in ids if i not in stored]
+        if missing:
+            raise KeyError(f"Rows not found: {missing}")
+        vectors = np.asarray([stored[i]["embedding"] for i in ids], dtype=np.float32)
+        merged = [{**{field: stored[i][field] for field in METADATA_FIELDS}, **row} for i, row in zip(ids, rows)]
+        self.collection.delete(expr="id in {ids}", expr_params={"ids": list(ids)})
+        return self.insert(vectors, merged)
+
+    def flush(self):
+        self.collection.flush()
+
+    def count(self) -> int:
+        # num_entities còn tính cả bản ghi đã xoá cho tới khi compaction
+        return self.collection.query(expr="", output_fields=["count(*)"])[0]["count(*)"]
+
+    def fingerprint(self) -> str:
+        # collection_id đổi khi collection bị drop hoặc tạo lại lúc migrate
+        return f"milvus:{self.collection.describe()['collection_id']}:v{SCHEMA_VERSION}"
+
+    def iterate(self, output_fields: list, batch_size: int = 1000):
+        iterator = self.collection.query_iterator(batch_size=batch_size, output_fields=_check_fields(output_fields))
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                yield rows
+        finally:
+            iterator.close()
+
+
+class NumpyVectorStore(VectorStore):
+    '''In-process VectorStore with exact vectorized search.
+
+    Vectors live in a memory-mapped float32 file (`vectors.f32`) that grows by doubling;
+    metadata lives in SQLite (`metadata.sqlite`), where the integer id is also the row of
+    the vector. Opening a store only maps the file and opens the database, so cold start
+    takes milliseconds. Search is exact, against all live rows or only the rows matching
+    the filters, and reports the same scores as Milvus for the metric: squared L2 distance,
+    inner product or cosine similarity. Filters run in SQLite, on indexed columns for
+    doc_type, code, doc_id and the *_ymd dates.
+
+    Args:
+        path (str): Directory holding the store files.
+        dim (int): Embedding dimension.
+        drop_existing (bool, optional): Start from an empty store.
+        metric (str, optional): "L2", "IP" or "COSINE". Defaults to L2.
+    '''
+    name = "numpy"
+
+    def __init__(self, path: str, dim: int = 384, drop_existing: bool = False, metric: str = "L2"):
+        self.path = path
+        self.dim = dim
+        self.metric = metric.upper()
+        if self.metric not in METRICS:
+            raise ValueError(f"Unsupported metric '{metric}', expected one of {METRICS}")
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        db_path = os.path.join(path, "metadata.sqlite")
+        if drop_existing:
+            for file_path in (self.vectors_path, db_path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        columns = ", ".join(f"{field} {self._column_type(field)}" for field in METADATA_FIELDS)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, {columns})")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._check_schema()
+        if self._get_meta("store_id") is None:
+            self._set_meta("store_id", uuid.uuid4().hex)
+        for field in ("doc_type", "code", "doc_hash", "chunk_hash", "doc_id", "issue_ymd", "effective_ymd"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_{field} ON chunks ({field})")
+        self._db.commit()
+
+        self._size = int(self._get_meta("size", 0))
+        self._capacity = 0
+        self._matrix = None
+        self._alive = None
+        self._open_matrix(max(self._size, 1024))
+
+    def _get_meta(self, key: str, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @staticmethod
+    def _column_type(field: str) -> str:
+        return "INTEGER" if field in INTEGER_FIELDS else "TEXT"
+
+    def _migrate(self, version: int):
+        if version < 2:
+            # v1 -> v2: thêm doc_id (mặc định là doc_hash) và chunk_index (-1 = không rõ)
+            self._db.execute("ALTER TABLE chunks ADD COLUMN doc_id TEXT")
+            self._db.execute("ALTER TABLE chunks ADD COLUMN chunk_index INTEGER")
+            self._db.execute("UPDATE chunks SET doc_id = doc_hash, chunk_index = -1")
+        if version < 3:
+            # v2 -> v3: thêm ngày dạng số YYYYMMDD, tính từ issue_date / effective_date
+            self._db.execute("ALTER TABLE chunks ADD COLUMN issue_ymd INTEGER")
+            self._db.execute("ALTER TABLE chunks ADD COLUMN effective_ymd INTEGER")
+            rows = self._db.execute("SELECT id, issue_date, effective_date FROM chunks").fetchall()
+            self._db.executemany("UPDATE chunks SET issue_ymd = ?, effective_ymd = ? WHERE id = ?",
+                                 [(_stored_date(issue), _stored_date(effective), i) for i, issue, effective in rows])
+        self._set_meta("schema_version", SCHEMA_VERSION)
+        self._db.commit()
+        logger.warning(f"Migrated NumPy store at {self.path} from schema v{version} to v{SCHEMA_VERSION}")
+
+    def _check_schema(self):
+        version = self._get_meta("schema_version")
+        if version is not None and int(version) < SCHEMA_VERSION:
+            self._migrate(int(version))
+            version = SCHEMA_VERSION
+        if version is not None and int(version) != SCHEMA_VERSION:
+            raise RuntimeError(f"NumPy store at {self.path} uses schema v{version}, expected v{SCHEMA_VERSION}; re-ingest into a new path")
+        if version is None:
+            self._set_meta("schema_version", SCHEMA_VERSION)
+            self._set_meta("dim", self.dim)
+            self._db.commit()
+        elif int(self._get_meta("dim")) != self.dim:
+            raise RuntimeError(f"NumPy store at {self.path} has dim {self._get_meta('dim')}, expected {self.dim}")
+
+    def _open_matrix(self, capacity: int):
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+        nbytes = capacity * self.dim * 4
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        self._capacity = capacity
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _alive_mask(self) -> np.ndarray:
+        # Tính lazily ở lần search đầu tiên để mở store không phải đọc toàn bộ metadata
+        if self._alive is None or len(self._alive) < self._size:
+            alive = np.zeros(self._size, dtype=bool)
+            ids = np.fromiter((row[0] for row in self._db.execute("SELECT id FROM chunks")), dtype=np.int64)
+            alive[ids] = True
+            self._alive = alive
+        return self._alive
+
+    def _where(self, filters: dict) -> tuple:
+        clauses, params = [], []
+        for field in _check_fields(filters or {}):
+            value = filters[field]
+            if isinstance(value, dict):
+                for _, operator, bound in _range_bounds(value):
+                    clauses.append(f"{field} {operator} ?")
+                    params.append(bound)
+            elif isinstance(value, (list, tuple, set)):
+                value = list(value)
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{field} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{field} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def insert(self, vectors: np.ndarray, rows: list) -> list:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(rows), self.dim)
+        with self._lock:
+            start = self._size
+            end = start + len(rows)
+            if end > self._capacity:
+                self._open_matrix(max(end, 2 * self._capacity))
+            self._matrix[start:end] = vectors
+            ids = list(range(start, end))
+            placeholders = ", ".join("?" * (len(METADATA_FIELDS) + 1))
+            self._db.executemany(
+                f"INSERT INTO chunks (id, {', '.join(METADATA_FIELDS)}) VALUES ({placeholders})",
+                [(i, *_row_values(row)) for i, row in zip(ids, rows)]
+            )
+            self._size = end
+            self._set_meta("size", end)
+            self._db.commit()
+            if self._alive is not None:
+                self._alive = np.concatenate([self._alive, np.ones(len(rows), dtype=bool)])
+        return ids
+
+    def search(self, vectors, top_k: int, filters: dict = None, output_fields: list = None) -> list:
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            if filters:
+                where, params = self._where(filters)
+                # ORDER BY id: SQLite trả id theo thứ tự của index dùng để lọc, còn phép so sánh
+                # len(candidates) với len(matrix) bên dưới cần candidates tăng dần
+                candidates = np.fromiter((row[0] for row in self._db.execute(f"SELECT id FROM chunks{where} ORDER BY id", params)), dtype=np.int64)
+            else:
+                candidates = np.flatnonzero(self._alive_mask())
+            matrix = self._matrix[:self._size]
+        if len(candidates) == 0:
+            return [[] for _ in queries]
+
+        data = matrix[candidates] if len(candidates) < len(matrix) else np.asarray(matrix)
+        scores = self._scores(queries, data)
+        # Sắp xếp tăng dần theo "cost": distance với L2, -similarity với IP/COSINE
+        costs = -scores if higher_is_better(self.metric) else scores
+        k = min(top_k, len(candidates))
+        top = np.argpartition(costs, k - 1, axis=1)[:, :k]
+        results = []
+        for qi, row in enumerate(top):
+            order = row[np.argsort(costs[qi, row])]
+            ids = candidates[order].tolist()
+            fields = self._fetch(ids, output_fields or [])
+            results.append([
+                {"id": i, "score": float(scores[qi, j]), **fields.get(i, {})}
+                for i, j in zip(ids, order)
+            ])
+        return results
+
+    def _scores(self, queries: np.ndarray, data: np.ndarray) -> np.ndarray:
+        dots = queries @ data.T
+        if self.metric == "IP":
+            return dots
+        data_sq = np.einsum("ij,ij->i", data, data)
+        query_sq = np.einsum("ij,ij->i", queries, queries)
+        if self.metric == "COSINE":
+            return dots / np.maximum(np.sqrt(query_sq)[:, None] * np.sqrt(data_sq)[None, :], 1e-12)
+        # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2
+        return np.maximum(query_sq[:, None] - 2.0 * dots + data_sq[None, :], 0.0)
+
+    def _fetch(self, ids: list, output_fields: list) -> dict:
+        fields = [f for f in _check_fields(output_fields) if f != "id"]
+        if not ids or not fields:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, {', '.join(fields)} FROM chunks WHERE id IN ({', '.join('?' * len(ids))})", ids
+            ).fetchall()
+        return {row[0]: dict(zip(fields, row[1:])) for row in rows}
+
+    def query(self, filters: dict, output_fields: list, limit: int = None) -> list:
+        fields = [f for f in _check_fields(output_fields) if f != "id"]
+        where, params = self._where(filters)
+        sql = f"SELECT {', '.join(['id'] + fields)} FROM chunks{where} ORDER BY id"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [{"id": row[0], **dict(zip(fields, row[1:]))} for row in rows]
+
+    def delete(self, filters: dict) -> int:
+        where, params = self._where(filters)
+        with self._lock:
+            ids = [row[0] for row in self._db.execute(f"SELECT id FROM chunks{where}", params)]
+            if ids:
+                self._db.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+                self._db.commit()
+                if self._alive is not None:
+                    self._alive[ids] = False
+        return len(ids)
+
+    def update(self, ids: list, rows: list) -> list:
+        with self._lock:
+            for i, row in zip(ids, rows):
+                row = {**row, **_date_values(row)}
+                fields = _check_fields(row)
+                if fields:
+                    self._db.execute(f"UPDATE chunks SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                                     [row[field] for field in fields] + [i])
+            self._db.commit()
+        return list(ids)
+
+    def get_vectors(self, ids: list) -> dict:
+        with self._lock:
+            alive = self._alive_mask()
+            return {i: np.array(self._matrix[i]) for i in ids if 0 <= i < self._size and alive[i]}
+
+    def flush(self):
+        with self._lock:
+            self._matrix.flush()
+            self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def fingerprint(self) -> str:
+        # store_id được tạo mới cùng file metadata, tức là sau drop_existing
+        with self._lock:
+            return f"numpy:{self._get_meta('store_id')}:v{SCHEMA_VERSION}"
+
+    def iterate(self, output_fields: list, batch_size: int = 1000):
+        fields = [f for f in _check_fields(output_fields) if f != "id"]
+        last_id = -1
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT {', '.join(['id'] + fields)} FROM chunks WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield [{"id": row[0], **dict(zip(fields, row[1:]))} for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._db.close()
+
+
+def create_vector_store(drop_existing: bool = False) -> VectorStore:
+    """Create the backend selected by vector_store.backend in config/config.yaml ('milvus' or 'numpy')."""
+    backend = get_setting("vector_store.backend", "milvus")
+    dim = get_setting("embedding.dim", 384)
+    metric = get_setting("vector_store.metric", "L2")
+    if backend == "milvus":
+        return MilvusVectorStore(
+            host=get_setting("milvus.host", "localhost"),
+            port=str(get_setting("milvus.port", "19530")),
+            collection_name=get_setting("milvus.collection", "legal_docs"),
+            dim=dim,
+            drop_existing=drop_existing,
+        )
+    if backend == "numpy":
+        path = os.path.join(ROOT_DIR, get_setting("vector_store.path", "data/vector_store"))
+        return NumpyVectorStore(path, dim=dim, drop_existing=drop_existing, metric=metric)
+    raise ValueError(f"Unknown vector_store.backend '{backend}'")
@@ -0,0 +1,109 @@
+"""Throughput and latency of query encode/search with and without micro-batching.
+
+Each concurrency level runs that many client threads, each issuing --requests calls, first
+with rag.BATCHING off (one encode / one single-vector search per call) and then on.
+
+    search  rag._vector_search against an in-process NumpyVectorStore of --corpus vectors
+    encode  rag.encode_query with the query embedding cache disabled (needs the model)
+
+    python -m benchmarks.bench_batching --concurrency 1,4,16,64 --corpus 100000
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app.src import rag
+from app.src.cache import query_embedding_cache
+from app.src.vector_store import NumpyVectorStore
+from benchmarks.bench_chunking import SENTENCES
+
+
+def run_level(fn, concurrency: int, requests: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def client(seed):
+        barrier.wait()
+        local = []
+        for i in range(requests):
+            start = time.perf_counter()
+            fn(seed * requests + i)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "throughput_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 3),
+        "latency_ms_p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+def search_op(corpus: int, dim: int):
+    store = NumpyVectorStore(tempfile.mkdtemp(prefix="bench-batching-"), dim=dim, metric="COSINE")
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((corpus, dim)).astype(np.float32)
+    rows = [{"text": "", "doc_type": "luật" if i % 2 else "nghị định", "code": "", "issue_date": "",
+             "effective_date": "", "doc_hash": "", "chunk_hash": str(i)} for i in range(corpus)]
+    store.insert(vectors, rows)
+    queries = rng.standard_normal((1024, dim)).astype(np.float32).tolist()
+
+    def op(i):
+        rag._vector_search(queries[i % len(queries)], store, None, 5, ["doc_type"])
+    op(0)  # nạp memmap vào page cache ngoài phần đo
+    return op
+
+
+def encode_op():
+    query_embedding_cache.maxsize = 0  # luôn encode, không dùng cache
+
+    def op(i):
+        rag.encode_query(f"{SENTENCES[i % len(SENTENCES)]} #{i}")
+    op(0)  # load model ngoài phần đo
+    return op
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=50, help="Calls per client thread")
+    parser.add_argument("--corpus", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--ops", default="search,encode")
+    args = parser.parse_args(argv)
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    report = {"max_batch_size": rag.get_setting("batching.max_batch_size", 32),
+              "max_wait_ms": rag.get_setting("batching.max_wait_ms", 2), "results": {}}
+    for name in args.ops.split(","):
+        try:
+            op = search_op(args.corpus, args.dim) if name == "search" else encode_op()
+        except Exception as e:
+            report["results"][name] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        report["results"][name] = {}
+        for batching in (False, True):
+            rag.BATCHING = batching
+            mode = "batched" if batching else "unbatched"
+            report["results"][name][mode] = [run_level(op, c, args.requests) for c in levels]
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
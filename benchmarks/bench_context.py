@@ -0,0 +1,81 @@
+"""Prompt tokens of the chat context before and after merging/budgeting (app.src.context).
+
+Builds a synthetic corpus of legal documents chunked with the configured LegalStructureChunker,
+retrieves --top-k chunks per question with BM25 (every other question filtered by document
+code, as when the user names the decree), and compares the legacy context (one block per
+chunk) with build_context(). Reports tokens saved per request and in total.
+
+    python -m benchmarks.bench_context --documents 20 --questions 200 --top-k 5
+"""
+import argparse
+import json
+import random
+import statistics
+
+from app.pre_processing.chunking import LegalStructureChunker
+from app.src.config import get_setting
+from app.src.context import build_context
+from app.src.lexical import BM25Index
+from benchmarks.bench_chunking import synthetic_pages
+
+
+def corpus(n_documents: int, pages: int) -> tuple:
+    chunker = LegalStructureChunker(
+        max_characters=get_setting("chunking.max_characters", 1000),
+        overlap_size=get_setting("chunking.overlap_size", 50),
+        min_characters=get_setting("chunking.min_characters", 500)
+    )
+    index, chunks = BM25Index(), []
+    for d in range(n_documents):
+        meta = {"doc_type": "nghị định", "code": f"{d + 1}/2024/NĐ-CP", "issue_date": "2024-01-01",
+                "effective_date": "2024-03-01", "doc_hash": f"doc{d}"}
+        for chunk in chunker.chunk_pages(synthetic_pages(pages, seed=d)):
+            index.add(len(chunks), chunk["content"], meta["doc_type"], meta["code"])
+            chunks.append(dict(meta, text=chunk["content"]))
+    return index, chunks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=5, help="Pages per document")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=None, help="Defaults to context.max_tokens")
+    parser.add_argument("--per-request", action="store_true", help="Include every request in the output")
+    args = parser.parse_args(argv)
+
+    index, chunks = corpus(args.documents, args.pages)
+    rng = random.Random(0)
+    requests = []
+    for q in range(args.questions):
+        article = rng.randint(1, args.pages * 10)
+        question = f"Điều {article} quy định về nội dung số {article} như thế nào?"
+        # Một nửa câu hỏi lọc theo mã văn bản, nên các chunk trả về cùng một văn bản
+        code = f"{rng.randint(1, args.documents)}/2024/NĐ-CP" if q % 2 else None
+        docs = [chunks[doc_id] for doc_id, _ in index.search(question, top_k=args.top_k, code=code)]
+        _, stats = build_context(docs, max_tokens=args.max_tokens)
+        requests.append(dict(stats, question=question, code=code, saved=stats["legacy_tokens"] - stats["tokens"]))
+
+    legacy = sum(r["legacy_tokens"] for r in requests)
+    saved = [r["saved"] for r in requests]
+    report = {
+        "chunks": len(chunks),
+        "requests": len(requests),
+        "legacy_tokens_mean": round(legacy / len(requests), 1),
+        "tokens_mean": round(sum(r["tokens"] for r in requests) / len(requests), 1),
+        "saved_mean": round(statistics.mean(saved), 1),
+        "saved_p50": statistics.median(saved),
+        "saved_max": max(saved),
+        "saved_ratio": round(sum(saved) / legacy, 3) if legacy else 0.0,
+        "merged_mean": round(statistics.mean(r["merged"] for r in requests), 2),
+        "duplicates_mean": round(statistics.mean(r["duplicates"] for r in requests), 2),
+        "skipped_mean": round(statistics.mean(r["skipped"] for r in requests), 2),
+    }
+    if args.per_request:
+        report["per_request"] = requests
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Microbenchmark of TextProcessor.clean_text against the step-by-step module functions.
+
+The reference pipeline is the sequence of module-level functions clean_text used to call, one
+full pass each. Texts are synthetic chunk-sized legal paragraphs, plain (as extracted from PDFs)
+or with a little HTML markup.
+
+    python -m benchmarks.bench_text_processor --texts 20000
+"""
+import argparse
+import json
+import random
+import time
+
+from app.pre_processing import text_processor as tp
+from benchmarks.bench_chunking import SENTENCES
+
+
+def reference_clean_text(text):
+    if not text:
+        return ""
+    text = tp.normalize_text(text)
+    # Luôn parse HTML như trước khi có fast path
+    from bs4 import BeautifulSoup
+    text = BeautifulSoup(text, 'html.parser').get_text(separator='\n').replace('\xa0', ' ')
+    text = tp.RE_JOIN_LINE.sub('', text)
+    text = tp.decode_html_entities(text)
+    text = tp.strip_emoji(text)
+    text = tp.remove_special_chars(text)
+    text = tp.sub_multi_plus(text)
+    text = tp.sub_multi_space(text)
+    text = tp.ensure_ends_with_dot(text)
+    return text.strip()
+
+
+def texts(n: int, html: bool, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        body = "\n".join(rng.choice(SENTENCES) for _ in range(rng.randint(4, 9)))
+        body = f"Điều {i}. ({rng.choice('abc')}) {body} 😀"
+        out.append(f"<p>{body.replace(chr(10), '<br/>')} &amp; khác</p>" if html else body)
+    return out
+
+
+def timed(fn, items) -> tuple:
+    start = time.perf_counter()
+    result = fn(items)
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=0, help="Also time clean_texts with a process pool")
+    args = parser.parse_args(argv)
+
+    processor = tp.TextProcessor()
+    report = {}
+    for kind in ("plain", "html"):
+        items = texts(args.texts, kind == "html")
+        ref_seconds, expected = timed(lambda xs: [reference_clean_text(x) for x in xs], items)
+        new_seconds, result = timed(processor.clean_texts, items)
+        assert result == expected, "clean_text output differs from the reference pipeline"
+        row = {
+            "reference_us_per_text": round(ref_seconds / len(items) * 1e6, 1),
+            "clean_text_us_per_text": round(new_seconds / len(items) * 1e6, 1),
+            "speedup": round(ref_seconds / new_seconds, 2),
+        }
+        if args.workers > 1:
+            pool_seconds, result = timed(lambda xs: processor.clean_texts(xs, workers=args.workers), items)
+            assert result == expected
+            row[f"clean_texts_{args.workers}_workers_us_per_text"] = round(pool_seconds / len(items) * 1e6, 1)
+        report[kind] = row
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Recall and latency of vector-only vs hybrid (BM25 + vector) retrieval on a labeled query set.
+
+The labeled set is a JSONL file, one {"query": ..., "relevant_codes": [...]} per line. A query
+counts as a hit at k if any of the top-k chunks belongs to one of its relevant codes.
+
+    python -m benchmarks.hybrid_eval labeled_queries.jsonl --top-k 5
+"""
+import argparse
+import json
+import statistics
+import time
+
+from app.src import embedding, rag
+from app.src.cache import query_embedding_cache
+from app.src.lexical import load_lexical_index
+
+
+def evaluate(queries: list, collection, top_k: int, hybrid: bool) -> dict:
+    rag.HYBRID_SEARCH = hybrid
+    latencies, hits = [], 0
+    for item in queries:
+        rag.encode_query(item["query"])  # chỉ đo search, không đo encode
+        start = time.perf_counter()
+        results = rag.search_chunks(item["query"], collection, top_k=top_k, output_fields=["code"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        if any(hit.get("code") in item["relevant_codes"] for hit in results):
+            hits += 1
+    latencies.sort()
+    return {
+        "mode": "hybrid" if hybrid else "vector",
+        f"recall@{top_k}": round(hits / len(queries), 4),
+        "latency_ms_p50": round(statistics.median(latencies), 3),
+        "latency_ms_p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("labeled", help="JSONL file of {query, relevant_codes}")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with open(args.labeled, "r", encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+    embedding.init_collection()
+    collection = embedding.get_collection()
+    load_lexical_index(collection)
+
+    results = [evaluate(queries, collection, args.top_k, hybrid) for hybrid in (False, True)]
+    query_embedding_cache.clear()
+    overhead = results[1]["latency_ms_p50"] - results[0]["latency_ms_p50"]
+    print(json.dumps({"queries": len(queries), "results": results, "hybrid_overhead_ms_p50": round(overhead, 3)},
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Recall/latency/memory sweep over Milvus ANN index configurations.
+
+Builds each index configuration on the same corpus, then reports recall@k against exact
+search (NumpyVectorStore), p50/p99 single-query latency and the memory of the loaded
+segments, so the cheapest index that meets the recall target can be set in
+config/config.yaml (milvus.index).
+
+The corpus is a .npy matrix of embeddings (--vectors), a text file embedded with the
+configured model, one chunk per line (--texts), or synthetic clustered vectors (default).
+
+    python -m benchmarks.index_sweep --synthetic 100000 --queries 500 --top-k 10 --recall-target 0.95
+    python -m benchmarks.index_sweep --vectors corpus.npy --configs sweep.json
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.src.config import get_setting
+from app.src.vector_store import MilvusVectorStore, NumpyVectorStore, index_config
+
+# Cấu hình mặc định của sweep, từ rẻ (nén) tới đắt
+DEFAULT_CONFIGS = [
+    {"type": "IVF_PQ", "params": {"nlist": 1024, "m": 16, "nbits": 8}, "search_params": {"nprobe": 16}},
+    {"type": "IVF_PQ", "params": {"nlist": 1024, "m": 48, "nbits": 8}, "search_params": {"nprobe": 32}},
+    {"type": "IVF_SQ8", "params": {"nlist": 1024}, "search_params": {"nprobe": 16}},
+    {"type": "IVF_SQ8", "params": {"nlist": 1024}, "search_params": {"nprobe": 64}},
+    {"type": "IVF_FLAT", "params": {"nlist": 128}, "search_params": {"nprobe": 10}},
+    {"type": "IVF_FLAT", "params": {"nlist": 1024}, "search_params": {"nprobe": 32}},
+    {"type": "HNSW", "params": {"M": 16, "efConstruction": 200}, "search_params": {"ef": 64}},
+    {"type": "HNSW", "params": {"M": 32, "efConstruction": 256}, "search_params": {"ef": 128}},
+    {"type": "FLAT", "params": {}, "search_params": {}},
+]
+
+
+def synthetic_corpus(n: int, dim: int, n_clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_corpus(args, dim: int) -> np.ndarray:
+    if args.vectors:
+        return np.load(args.vectors).astype(np.float32)
+    if args.texts:
+        from app.src.embedding import embed_texts
+        with open(args.texts, "r", encoding="utf-8") as f:
+            return embed_texts([line.strip() for line in f if line.strip()])
+    return synthetic_corpus(args.synthetic, dim)
+
+
+def _rows(n: int) -> list:
+    return [{"text": "", "doc_type": "", "code": "", "issue_date": "", "effective_date": "", "doc_hash": "",
+             "chunk_hash": str(i)} for i in range(n)]
+
+
+def _insert(store, corpus: np.ndarray, batch_size: int = 5000) -> list:
+    ids = []
+    for start in range(0, len(corpus), batch_size):
+        end = min(start + batch_size, len(corpus))
+        ids.extend(store.insert(corpus[start:end], _rows(end - start)))
+    store.flush()
+    return ids
+
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, top_k: int, metric: str) -> list:
+    with tempfile.TemporaryDirectory() as path:
+        store = NumpyVectorStore(path, dim=corpus.shape[1], metric=metric)
+        _insert(store, corpus)
+        results = store.search(queries, top_k)
+        store.close()
+    return [[hit["id"] for hit in hits] for hits in results]
+
+
+def loaded_memory_mb(collection_name: str):
+    from pymilvus import utility
+    try:
+        segments = utility.get_query_segment_info(collection_name)
+        return round(sum(segment.mem_size for segment in segments) / 2 ** 20, 2)
+    except Exception:
+        return None
+
+
+def run_config(config: dict, corpus: np.ndarray, queries: np.ndarray, truth: list, top_k: int, metric: str) -> dict:
+    from pymilvus import utility
+    index_params, search_params = index_config(config["type"], metric, config.get("params", {}), config.get("search_params", {}))
+    name = f"index_sweep_{config['type'].lower()}"
+    start = time.perf_counter()
+    store = MilvusVectorStore(
+        host=get_setting("milvus.host", "localhost"),
+        port=str(get_setting("milvus.port", "19530")),
+        collection_name=name,
+        dim=corpus.shape[1],
+        drop_existing=True,
+        index_params=index_params,
+        search_params=search_params,
+    )
+    try:
+        ids = _insert(store, corpus)
+        utility.wait_for_index_building_complete(name)
+        # Load lại để search dùng segment đã có index thay vì growing segment
+        store.collection.release()
+        store.collection.load()
+        build_seconds = time.perf_counter() - start
+        # Id của Milvus là auto_id, đổi về vị trí trong corpus để so với exact search
+        position = {pk: i for i, pk in enumerate(ids)}
+
+        latencies, recall = [], []
+        for query, expected in zip(queries, truth):
+            t = time.perf_counter()
+            hits = store.search(query[None, :], top_k)[0]
+            latencies.append((time.perf_counter() - t) * 1000)
+            found = {position[hit["id"]] for hit in hits}
+            recall.append(len(found.intersection(expected)) / len(expected))
+        latencies.sort()
+        return {
+            "index_type": config["type"],
+            "params": index_params["params"],
+            "search_params": search_params["params"],
+            f"recall@{top_k}": round(statistics.mean(recall), 4),
+            "latency_ms_p50": round(statistics.median(latencies), 3),
+            "latency_ms_p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+            "index_memory_mb": loaded_memory_mb(name),
+            "build_seconds": round(build_seconds, 2),
+        }
+    finally:
+        utility.drop_collection(name)
+
+
+def cheapest(results: list, top_k: int, target: float):
+    """Lowest-memory configuration meeting the recall target (ties broken by p99 latency)."""
+    passing = [r for r in results if r[f"recall@{top_k}"] >= target]
+    if not passing:
+        return None
+    return min(passing, key=lambda r: (r["index_memory_mb"] if r["index_memory_mb"] is not None else float("inf"),
+                                       r["latency_ms_p99"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--vectors", help=".npy matrix of corpus embeddings")
+    source.add_argument("--texts", help="Text file, one chunk per line, embedded with the configured model")
+    source.add_argument("--synthetic", type=int, default=50000, help="Number of synthetic vectors (default)")
+    parser.add_argument("--configs", help="JSON file with a list of {type, params, search_params}")
+    parser.add_argument("--metric", default=None, help="L2, IP or COSINE (default: vector_store.metric)")
+    parser.add_argument("--queries", type=int, default=500, help="Queries sampled (held out) from the corpus")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--recall-target", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    metric = (args.metric or get_setting("vector_store.metric", "L2")).upper()
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs, "r", encoding="utf-8") as f:
+            configs = json.load(f)
+
+    vectors = load_corpus(args, get_setting("embedding.dim", 384))
+    rng = np.random.default_rng(args.seed)
+    held_out = rng.choice(len(vectors), size=min(args.queries, len(vectors) // 10), replace=False)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    corpus, queries = vectors[mask], vectors[held_out]
+
+    truth = exact_neighbours(corpus, queries, args.top_k, metric)
+    results = []
+    for config in configs:
+        result = run_config(config, corpus, queries, truth, args.top_k, metric)
+        results.append(result)
+        print(json.dumps(result), flush=True)
+
+    best = cheapest(results, args.top_k, args.recall_target)
+    print(json.dumps({
+        "corpus": len(corpus),
+        "queries": len(queries),
+        "metric": metric,
+        "recall_target": args.recall_target,
+        "results": results,
+        "recommended": best,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
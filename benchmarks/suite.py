@@ -0,0 +1,342 @@
+"""End-to-end benchmark of the ingest and query hot paths on a synthetic Vietnamese legal corpus.
+
+Each stage is timed on its own so a regression can be pinned to one step:
+
+    extract          extract_text_from_pdf_url against a local HTTP server (download + parse)
+    chunking         chunk_text (LegalStructureChunker, the ingest path)
+    chunking_legacy  Chunking.split_document_with_order_overlap
+    embed_single     embed_text, one chunk per call
+    embed_batch      embed_texts over all chunks
+    insert           embedding.bulk_insert into a fresh vector store (incl. BM25 update) + flush
+    retrieve         retrieve_similar_metadata with the result cache cleared before each query
+    chat             ask_chatbot with the LLM replaced by a local OpenAI-compatible stub
+
+insert/retrieve/chat use synthetic unit vectors and pre-warmed query embeddings, so they
+measure storage and retrieval alone (the model is timed in the embed stages) and run
+without the embedding model. A stage that cannot run (e.g. the model cannot be loaded)
+is reported with its error instead of numbers.
+
+Results are JSON: per stage the number of operations, throughput, latency percentiles and
+the process peak RSS after the stage. With --baseline, throughput drops and p99 increases
+beyond --tolerance are reported as regressions and the exit code is 1.
+
+    python -m benchmarks.suite --docs 20 --pages 10 --output results.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+import argparse
+import html
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fitz
+import numpy as np
+
+from app.pre_processing.chunking import Chunking
+from app.src import chatbot, downloader, embedding, rag
+from app.src.cache import answer_cache, query_embedding_cache, search_result_cache
+from app.src.data_processing import chunk_text, extract_text_from_pdf_url
+from app.src.vector_store import NumpyVectorStore
+from benchmarks.bench_chunking import SENTENCES, synthetic_pages
+
+QUERIES = [
+    "Mức phạt vượt đèn đỏ theo Nghị định 100/2019/NĐ-CP",
+    "Trách nhiệm của Ủy ban nhân dân cấp tỉnh",
+    "Tước quyền sử dụng giấy phép lái xe khi tái phạm",
+    "Người điều khiển phương tiện phải chấp hành hiệu lệnh",
+    "Điều 12 quy định về nội dung gì",
+]
+DOC_TYPES = ["luật", "nghị định", "thông tư"]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies: list, units: int = None, elapsed: float = None) -> dict:
+    """Throughput and latency percentiles (ms) of a list of per-operation latencies in seconds."""
+    elapsed = elapsed if elapsed is not None else sum(latencies)
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3)
+
+    return {
+        "ops": len(latencies),
+        "seconds": round(elapsed, 4),
+        "throughput_per_sec": round((units or len(latencies)) / elapsed, 2) if elapsed else None,
+        "latency_ms_p50": round(statistics.median(ordered) * 1000, 3),
+        "latency_ms_p95": pct(0.95),
+        "latency_ms_p99": pct(0.99),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def timed(fn, items) -> list:
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def make_pdf(pages: list) -> bytes:
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        # insert_htmlbox dùng font Noto có sẵn nên giữ được dấu tiếng Việt khi extract
+        page.insert_htmlbox(page.rect + (36, 36, -36, -36),
+                            f'<pre style="font-size:7px;white-space:pre-wrap">{html.escape(text)}</pre>')
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class _StaticHandler(BaseHTTPRequestHandler):
+    routes = {}
+
+    def do_GET(self):
+        body = self.routes.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _LLMStubHandler(BaseHTTPRequestHandler):
+    '''OpenAI-compatible /chat/completions returning a fixed answer.'''
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({
+            "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "Theo quy định tại Điều 12, mức phạt là ..."}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_extract(documents: list, workdir: str) -> dict:
+    _StaticHandler.routes = {f"/doc{i}.pdf": make_pdf(pages) for i, pages in enumerate(documents)}
+    server = serve(_StaticHandler)
+    # Cache riêng cho benchmark để mọi lần tải đều là full transfer
+    downloader._downloader = downloader.PdfDownloader(cache_dir=os.path.join(workdir, "pdf_cache"))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        latencies = timed(extract_text_from_pdf_url, [base + path for path in _StaticHandler.routes])
+    finally:
+        server.shutdown()
+    result = summarize(latencies)
+    result["pages_per_sec"] = round(sum(len(pages) for pages in documents) / sum(latencies), 2)
+    return result
+
+
+def bench_chunking(texts: list) -> dict:
+    chunks = []
+    latencies = timed(lambda text: chunks.extend(chunk_text(text)), texts)
+    result = summarize(latencies)
+    result["chunks"] = len(chunks)
+    return result
+
+
+def bench_chunking_legacy(texts: list) -> dict:
+    chunker = Chunking(1000, 50)
+    return summarize(timed(chunker.split_document_with_order_overlap, texts))
+
+
+def bench_embed_single(chunks: list) -> dict:
+    embedding.embed_text(chunks[0])  # load model ngoài phần đo
+    return summarize(timed(embedding.embed_text, chunks))
+
+
+def bench_embed_batch(chunks: list) -> dict:
+    embedding.embed_texts(chunks[:embedding.EMBED_BATCH_SIZE])
+    start = time.perf_counter()
+    embedding.embed_texts(chunks)
+    elapsed = time.perf_counter() - start
+    result = summarize([elapsed], units=len(chunks), elapsed=elapsed)
+    result["unit"] = "chunks"
+    return result
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_insert(chunks: list, workdir: str, batch_size: int) -> dict:
+    store = NumpyVectorStore(os.path.join(workdir, "store"), dim=embedding.EMBEDDING_DIM, metric="COSINE")
+    embedding.collection = store
+    vectors = synthetic_vectors(len(chunks), embedding.EMBEDDING_DIM)
+    rows = [{"text": text, "doc_type": DOC_TYPES[i % len(DOC_TYPES)], "code": f"{i % 50}/2020/NĐ-CP",
+             "issue_date": "", "effective_date": "", "doc_hash": f"doc{i // 20}", "chunk_hash": embedding.chunk_hash(text)}
+            for i, text in enumerate(chunks)]
+    latencies = []
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        t = time.perf_counter()
+        embedding.bulk_insert(vectors[offset:offset + batch_size], rows[offset:offset + batch_size], batch_size)
+        latencies.append(time.perf_counter() - t)
+    store.flush()
+    elapsed = time.perf_counter() - start
+    result = summarize(latencies, units=len(rows), elapsed=elapsed)
+    result["unit"] = "chunks"
+    return result
+
+
+def warm_query_embeddings(queries: list):
+    for i, query in enumerate(queries):
+        query_embedding_cache.set(rag._cache_key(query), synthetic_vectors(1, embedding.EMBEDDING_DIM, seed=i + 1)[0].tolist())
+
+
+def bench_retrieve(queries: list) -> dict:
+    store = embedding.get_collection()
+
+    def run(query):
+        search_result_cache.clear()
+        rag.retrieve_similar_metadata(query, store)
+
+    return summarize(timed(run, queries))
+
+
+def bench_chat(queries: list) -> dict:
+    from openai import OpenAI
+    server = serve(_LLMStubHandler)
+    original = chatbot.client
+    chatbot.client = OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="stub")
+
+    def run(query):
+        search_result_cache.clear()
+        answer_cache.clear()
+        chatbot.ask_chatbot(query)
+
+    try:
+        return summarize(timed(run, queries))
+    finally:
+        chatbot.client = original
+        server.shutdown()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Stage metrics that regressed by more than `tolerance` (a fraction) against the baseline."""
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        old, new = previous.get("throughput_per_sec"), current.get("throughput_per_sec")
+        if old and new is not None and new < old * (1 - tolerance):
+            regressions.append({"stage": stage, "metric": "throughput_per_sec", "baseline": old, "current": new})
+        old, new = previous.get("latency_ms_p99"), current.get("latency_ms_p99")
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append({"stage": stage, "metric": "latency_ms_p99", "baseline": old, "current": new})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20, help="Synthetic documents")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per document")
+    parser.add_argument("--queries", type=int, default=200, help="Queries for retrieve/chat")
+    parser.add_argument("--insert-batch-size", type=int, default=embedding.INSERT_BATCH_SIZE)
+    parser.add_argument("--stages", default=None, help="Comma-separated subset of stages to run")
+    parser.add_argument("--output", help="Write the JSON results here as well as to stdout")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--save-baseline", help="Write the results as the new baseline")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    documents = [synthetic_pages(args.pages, seed=args.seed + i) for i in range(args.docs)]
+    texts = ["".join(page + "\n" for page in pages) for pages in documents]
+    chunks = [chunk["content"] for text in texts for chunk in chunk_text(text)]
+    queries = [rng.choice(QUERIES) + " " + rng.choice(SENTENCES)[:40] for _ in range(args.queries)]
+    warm_query_embeddings(queries)
+
+    workdir = tempfile.mkdtemp(prefix="legal-bench-")
+    stages = {
+        "extract": lambda: bench_extract(documents, workdir),
+        "chunking": lambda: bench_chunking(texts),
+        "chunking_legacy": lambda: bench_chunking_legacy(texts),
+        "embed_single": lambda: bench_embed_single(chunks[:100]),
+        "embed_batch": lambda: bench_embed_batch(chunks),
+        "insert": lambda: bench_insert(chunks, workdir, args.insert_batch_size),
+        "retrieve": lambda: bench_retrieve(queries),
+        "chat": lambda: bench_chat(queries),
+    }
+    selected = args.stages.split(",") if args.stages else list(stages)
+    if ("retrieve" in selected or "chat" in selected) and "insert" not in selected:
+        selected.insert(0, "insert")  # retrieve/chat cần dữ liệu trong store
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "documents": args.docs,
+            "pages_per_document": args.pages,
+            "chunks": len(chunks),
+            "queries": len(queries),
+        },
+        "stages": {},
+    }
+    for name in selected:
+        try:
+            results["stages"][name] = stages[name]()
+        except Exception as e:
+            results["stages"][name] = {"error": f"{type(e).__name__}: {e}"}
+        print(f"{name}: {json.dumps(results['stages'][name], ensure_ascii=False)}", file=sys.stderr, flush=True)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    print(output)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,64 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+import asyncio
 import logging
+import time
 from app.router import api
-from app.src import embedding
+from app.src import embedding, metrics
+from app.src.chatbot import close_async_client, llm_configured
+from app.src.executor import query_executor
+from app.src.config import get_setting
+from app.src.jobs import ingest_queue
+from app.src.lexical import lexical_index, load_lexical_index
 
-embedding.init_collection()
 
-
-# Cấu hình logging
-logging.basicConfig(level=logging.DEBUG)
+# Cấu hình logging; DEBUG ghi rất nhiều trên đường query, chỉ bật khi cần
+logging.basicConfig(level=get_setting("logging.level", "INFO"))
 logger = logging.getLogger(__name__)
 
-app = FastAPI(docs_url="/docs", title="Legal Doc QA API", description="API for uploading PDF and querying legal documents with BERT")
+
+def _init_collection():
+    try:
+        embedding.init_collection()
+        load_lexical_index(embedding.get_collection())
+    except Exception:
+        logger.exception("Khởi tạo collection thất bại")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load collection ở background để /health trả lời ngay, /ready báo khi đã load xong
+    init_task = asyncio.get_running_loop().run_in_executor(None, _init_collection)
+    if not llm_configured():
+        logger.warning(f"Biến môi trường {get_setting('llm.api_key_env', 'OPENROUTER_API_KEY')} chưa được đặt, /chat sẽ trả lỗi 503")
+    yield
+    ingest_queue.shutdown(wait=False)
+    query_executor.shutdown(wait=False)
+    await close_async_client()
+    await init_task
+    # Index BM25 chỉ được ghi định kỳ khi ingest, ghi nốt phần chưa lưu
+    lexical_index.save_if_due(force=True)
+
+
+app = FastAPI(docs_url="/docs", title="Legal Doc QA API", description="API for uploading PDF and querying legal documents with BERT", lifespan=lifespan)
 app.include_router(api.router)
 
 
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    timings = metrics.start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.labels(request.method, route.path if route else "unmatched", str(response.status_code)).observe(elapsed)
+    if metrics.DEBUG_TIMING_HEADERS:
+        timings["total"] = elapsed
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings)
+    return response
+
+
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from app.src import embedding
+from app.src.lexical import BM25Index
+from app.src.vector_store import NumpyVectorStore
+
+DIM = 8
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """NumpyVectorStore used as embedding.collection, with a fresh BM25 index and a fake embed_texts.
+
+    The fake model maps each text to a vector derived from its chunk_hash and records the
+    embedded texts in store.embedded. Modules with their own `store` fixture override this one.
+    """
+    store = NumpyVectorStore(str(tmp_path / "store"), dim=DIM)
+    embedded = []
+
+    def embed_texts(texts, batch_size=None, progress_callback=None):
+        embedded.extend(texts)
+        return np.stack([np.frombuffer(embedding.chunk_hash(t).encode()[:DIM], dtype=np.uint8) for t in texts]).astype(np.float32)
+
+    monkeypatch.setattr(embedding, "collection", store)
+    monkeypatch.setattr(embedding, "lexical_index", BM25Index())
+    monkeypatch.setattr(embedding, "embed_texts", embed_texts)
+    store.embedded = embedded
+    yield store
+    store.close()
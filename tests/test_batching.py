@@ -0,0 +1,146 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from app.src import rag
+from app.src.batching import MicroBatcher
+from app.src.vector_store import NumpyVectorStore
+
+
+def _run_concurrently(fn, items):
+    results = [None] * len(items)
+    barrier = threading.Barrier(len(items))
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = fn(items[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_micro_batcher_groups_concurrent_calls_and_keeps_order():
+    batches = []
+
+    def handler(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(handler, max_batch_size=4, max_wait_ms=50)
+    assert _run_concurrently(batcher.submit, list(range(8))) == [i * 10 for i in range(8)]
+    assert max(len(batch) for batch in batches) > 1
+    assert all(len(batch) <= 4 for batch in batches)
+
+
+def test_micro_batcher_propagates_handler_errors():
+    def handler(items):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(handler, max_batch_size=8, max_wait_ms=20)
+    results = _run_concurrently(batcher.submit, [1, 2, 3])
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_search_many_sends_one_search_per_filter_group(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "store"), dim=4)
+    vectors = np.eye(4, dtype=np.float32)
+    rows = [{"text": f"t{i}", "doc_type": "luật" if i < 2 else "nghị định", "code": "", "issue_date": "",
+             "effective_date": "", "doc_hash": "", "chunk_hash": str(i)} for i in range(4)]
+    ids = store.insert(vectors, rows)
+
+    calls = []
+    search = store.search
+    store.search = lambda queries, **kwargs: calls.append(len(queries)) or search(queries, **kwargs)
+
+    requests = [
+        (store, vectors[0].tolist(), {"doc_type": "luật"}, 1, ["text"]),
+        (store, vectors[2].tolist(), {"doc_type": "nghị định"}, 2, ["text"]),
+        (store, vectors[1].tolist(), {"doc_type": "luật"}, 2, ["text"]),
+    ]
+    results = rag.search_many(requests)
+
+    assert sorted(calls) == [1, 2]
+    assert [hit["id"] for hit in results[0]] == [ids[0]]
+    assert results[1][0]["text"] == "t2" and len(results[1]) == 2
+    assert results[2][0]["id"] == ids[1]
+
+
+def test_query_batch_encodes_once_and_streams_ndjson_per_filter_group(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.router import api
+    from app.src.cache import query_embedding_cache, search_result_cache
+    from main import app
+
+    store = NumpyVectorStore(str(tmp_path / "store"), dim=4)
+    rows = [{"text": f"t{i}", "doc_type": "luật" if i < 2 else "nghị định", "code": f"c{i}", "issue_date": "",
+             "effective_date": "", "doc_hash": "", "chunk_hash": str(i)} for i in range(4)]
+    store.insert(np.eye(4, dtype=np.float32), rows)
+
+    encoded = []
+    def encode_queries(queries):
+        encoded.append(list(queries))
+        return [np.eye(4)[int(query[1])].tolist() for query in queries]
+
+    searches = []
+    search = store.search
+    store.search = lambda queries, **kwargs: searches.append(len(queries)) or search(queries, **kwargs)
+    monkeypatch.setattr(rag, "encode_queries", encode_queries)
+    monkeypatch.setattr(rag, "HYBRID_SEARCH", False)
+    monkeypatch.setattr(api, "get_collection", lambda: store)
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+
+    response = TestClient(app).post("/query/batch", json={"queries": [
+        {"query": "q0", "doc_type": "luật", "top_k": 1},
+        {"query": "q2", "doc_type": "nghị định", "top_k": 2},
+        {"query": "q1", "doc_type": "luật", "top_k": 1},
+        {"query": "q1", "doc_type": "luật", "top_k": 1},
+    ]})
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 2, 3, 1]
+    by_index = {line["index"]: line["results"] for line in lines}
+    assert [item["code"] for item in by_index[0]] == ["c0"]
+    assert [item["code"] for item in by_index[2]] == ["c1"] == [item["code"] for item in by_index[3]]
+    assert by_index[1][0]["code"] == "c2" and len(by_index[1]) == 2
+    assert encoded == [["q0", "q2", "q1"]]
+    assert sorted(searches) == [1, 3]
+
+
+def test_micro_batcher_fails_every_item_when_handler_returns_too_few_results():
+    batcher = MicroBatcher(lambda items: [item * 10 for item in items][:1], max_batch_size=8, max_wait_ms=50)
+    results = _run_concurrently(batcher.submit, [1, 2, 3])
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_micro_batcher_submit_times_out_and_skips_abandoned_items():
+    release = threading.Event()
+    handled = []
+
+    def handler(items):
+        handled.extend(items)
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(handler, max_batch_size=1, max_wait_ms=0, timeout=0.2)
+    with pytest.raises(TimeoutError):
+        batcher.submit("slow")
+    # "queued" chờ sau batch đang treo; bên gọi bỏ đi nên worker không xử lý nó
+    with pytest.raises(TimeoutError):
+        batcher.submit("queued", timeout=0.05)
+    release.set()
+    assert batcher.submit("next", timeout=5) == "next"
+    assert handled == ["slow", "next"]
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+from app.src import bulk_ingest, embedding
+from app.src.downloader import CachedDocument
+from app.src.schemas import UploadRequest
+
+SHARED = "Điều 9. Người vi phạm bị phạt tiền theo quy định."
+TEXTS = {
+    "a.pdf": ["Điều 1. Phạm vi của nghị định A.", SHARED],
+    "b.pdf": ["Điều 1. Phạm vi của nghị định B.", SHARED],
+    "c.pdf": ["Điều 1. Phạm vi của nghị định C."],
+}
+
+
+@pytest.fixture
+def store(store, monkeypatch):
+    """The conftest store, with downloads and parsing of TEXTS faked; URLs in store.failing fail to download."""
+    failing = set()
+
+    def download_pdf(url):
+        if url in failing:
+            raise ConnectionError(f"cannot download {url}")
+        return CachedDocument(url, url, f"h-{url}", 0, from_cache=True)
+
+    monkeypatch.setattr(bulk_ingest, "lexical_index", embedding.lexical_index)
+    monkeypatch.setattr(bulk_ingest, "download_pdf", download_pdf)
+    monkeypatch.setattr(embedding, "extract_document_chunks", lambda pdf, progress_callback=None: TEXTS[pdf.url])
+    monkeypatch.setattr(embedding, "select_quality_chunks", lambda texts: (texts, 0))
+    store.failing = failing
+    return store
+
+
+def _texts(store, code):
+    rows = store.query({"code": code}, ["text", "chunk_index"])
+    return [row["text"] for row in sorted(rows, key=lambda row: row["chunk_index"])]
+
+
+def test_parse_manifest_skips_blank_lines_and_names_the_bad_line():
+    records = bulk_ingest.parse_manifest(['{"url": "a.pdf", "code": "A"}\n', "\n", '{"url": "b.pdf"}'])
+    assert [(r.url, r.code) for r in records] == [("a.pdf", "A"), ("b.pdf", None)]
+
+    with pytest.raises(ValueError, match="line 2"):
+        bulk_ingest.parse_manifest(['{"url": "a.pdf"}', '{"code": "B"}'])
+
+
+def test_chunks_shared_across_buffered_documents_are_embedded_once_and_stored_per_document(store):
+    records = [UploadRequest(url="a.pdf", code="A"), UploadRequest(url="b.pdf", code="B")]
+
+    summary = bulk_ingest.bulk_ingest(records, workers=1, insert_batch_size=100)
+
+    assert sorted(store.embedded) == sorted({t for texts in TEXTS.values() for t in texts} - set(TEXTS["c.pdf"]))
+    assert (summary["ingested_documents"], summary["new_chunks"], summary["reused_chunks"]) == (2, 3, 1)
+    assert _texts(store, "A") == TEXTS["a.pdf"] and _texts(store, "B") == TEXTS["b.pdf"]
+    assert len(embedding.lexical_index) == 4
+
+
+def test_resume_skips_documents_recorded_in_the_checkpoint(store, tmp_path):
+    checkpoint = str(tmp_path / "manifest.checkpoint")
+    records = [UploadRequest(url="a.pdf", code="A"), UploadRequest(url="c.pdf", code="C")]
+    store.failing.add("c.pdf")
+
+    first = bulk_ingest.bulk_ingest(records, checkpoint_path=checkpoint, workers=1, insert_batch_size=1)
+    assert first["ingested_documents"] == 1 and [f["url"] for f in first["failed_documents"]] == ["c.pdf"]
+    with open(checkpoint, encoding="utf-8") as f:
+        assert [json.loads(line)["url"] for line in f] == ["a.pdf"]
+
+    store.failing.clear()
+    store.embedded.clear()
+    second = bulk_ingest.bulk_ingest(records, checkpoint_path=checkpoint, workers=1)
+
+    assert (second["resumed_skipped"], second["ingested_documents"]) == (1, 1)
+    assert store.embedded == TEXTS["c.pdf"]
+    assert bulk_ingest.Checkpoint(checkpoint).done == {"a.pdf", "c.pdf"}
+
+
+def test_repeated_documents_and_doc_ids_in_one_run_are_stored_once(store):
+    records = [
+        UploadRequest(url="a.pdf", code="A"),
+        UploadRequest(url="a.pdf", code="A (bản sao)"),
+        UploadRequest(url="b.pdf", code="A"),
+    ]
+
+    summary = bulk_ingest.bulk_ingest(records, workers=2, insert_batch_size=100)
+
+    assert (summary["ingested_documents"], summary["duplicate_documents"]) == (1, 1)
+    assert [f["url"] for f in summary["failed_documents"]] == ["b.pdf"]
+    assert "earlier line" in summary["failed_documents"][0]["error"]
+    assert _texts(store, "A") == TEXTS["a.pdf"] and store.count() == 2
+    # Khoá được trả lại khi kết thúc
+    assert embedding.claim("h-a.pdf") and embedding.claim(embedding.doc_key("A"))
+    embedding.release("h-a.pdf")
+    embedding.release(embedding.doc_key("A"))
+
+
+def test_document_being_ingested_by_another_job_is_not_stored(store):
+    assert embedding.claim("h-a.pdf")
+    try:
+        summary = bulk_ingest.bulk_ingest([UploadRequest(url="a.pdf", code="A")], workers=1)
+    finally:
+        embedding.release("h-a.pdf")
+
+    assert [f["url"] for f in summary["failed_documents"]] == ["a.pdf"] and store.count() == 0
+
+
+def test_resume_completes_a_document_whose_chunks_were_only_partly_inserted(store, tmp_path):
+    metadata = {"doc_type": "", "code": "A", "issue_date": "", "effective_date": ""}
+    # Lần chạy trước dừng sau khi insert chunk đầu của a.pdf, trước khi ghi checkpoint
+    embedding.replace_document_chunks("A", "h-a.pdf", TEXTS["a.pdf"][:1], metadata)
+    embedding.replace_document_chunks("B", "h-b.pdf", TEXTS["b.pdf"], dict(metadata, code="B"))
+    records = [UploadRequest(url="a.pdf", code="A"), UploadRequest(url="b.pdf", code="B")]
+
+    summary = bulk_ingest.bulk_ingest(records, checkpoint_path=str(tmp_path / "checkpoint"), workers=1)
+
+    assert (summary["ingested_documents"], summary["duplicate_documents"]) == (1, 1)
+    assert _texts(store, "A") == TEXTS["a.pdf"] and store.count() == 4
+    assert sorted(embedding.lexical_index.doc_len) == sorted(row["id"] for row in store.query({}, ["id"]))
@@ -0,0 +1,120 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI
+
+from app.src import chatbot
+from app.src.cache import answer_cache
+
+PIECES = ["Theo ", "Điều 5, ", "mức phạt là 2 triệu đồng."]
+
+
+class _MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests.append(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, piece in enumerate(PIECES):
+            chunk = {"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            self._write(f"data: {json.dumps(chunk)}\n\n")
+        usage = {"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": body["model"], "choices": [],
+                 "usage": {"prompt_tokens": 40, "completion_tokens": 3, "total_tokens": 43}}
+        self._write(f"data: {json.dumps(usage)}\n\n")
+        self._write("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _MockOpenAIHandler.requests = []
+    monkeypatch.setattr(chatbot, "_async_client",
+                        AsyncOpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="test"))
+    monkeypatch.setattr(chatbot, "get_collection", lambda: object())
+    monkeypatch.setattr(chatbot, "encode_query", lambda prompt: [1.0, 0.0] if "phạt" in prompt else [0.0, 1.0])
+    answer_cache.clear()
+    monkeypatch.setattr(chatbot, "retrieve_metadata_by_query", lambda prompt, col: [
+        {"doc_type": "nghị định", "code": "100/2019/NĐ-CP", "issue_date": "", "effective_date": "",
+         "text": "Điều 5. Phạt tiền từ 1 triệu đến 2 triệu đồng."}
+    ])
+    yield _MockOpenAIHandler
+    server.shutdown()
+    answer_cache.clear()
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_sends_sse_deltas_then_done(mock_llm):
+    from main import app
+
+    response = TestClient(app).post("/chat/stream", json={"message": "Vượt đèn đỏ bị phạt bao nhiêu?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert [data["delta"] for name, data in events if name == "message"] == PIECES
+    assert events[-1] == ("done", {})
+
+    sent = mock_llm.requests[0]
+    assert sent["stream"] is True
+    assert "100/2019/NĐ-CP" in sent["messages"][1]["content"]
+
+
+def test_chat_stream_reports_llm_failure_as_error_event(mock_llm, monkeypatch):
+    from main import app
+
+    monkeypatch.setattr(chatbot, "_async_client",
+                        AsyncOpenAI(base_url="http://127.0.0.1:9/v1", api_key="test", max_retries=0))
+    response = TestClient(app).post("/chat/stream", json={"message": "câu hỏi"})
+
+    assert _events(response.text)[-1][0] == "error"
+
+
+def test_chat_stream_reuses_cached_answer_for_similar_question(mock_llm):
+    from main import app
+
+    first = TestClient(app).post("/chat/stream", json={"message": "Vượt đèn đỏ bị phạt bao nhiêu?"})
+    second = TestClient(app).post("/chat/stream", json={"message": "Mức phạt vượt đèn đỏ?"})
+
+    answer = "".join(data["delta"] for name, data in _events(first.text) if name == "message")
+    assert [data["delta"] for name, data in _events(second.text) if name == "message"] == [answer]
+    assert len(mock_llm.requests) == 1
+
+
+def test_chat_without_api_key_fails_clearly(mock_llm, monkeypatch):
+    from main import app
+
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    monkeypatch.setattr(chatbot, "client", None)
+    monkeypatch.setattr(chatbot, "_async_client", None)
+
+    response = TestClient(app).post("/chat/", json={"message": "Vượt đèn đỏ bị phạt bao nhiêu?"})
+    assert response.status_code == 503 and "OPENROUTER_API_KEY" in response.json()["detail"]
+    stream = TestClient(app).post("/chat/stream", json={"message": "Vượt đèn đỏ bị phạt bao nhiêu?"})
+    assert _events(stream.text)[-1] == ("error", {"error": response.json()["detail"]})
+    assert chatbot.client is None and chatbot._async_client is None
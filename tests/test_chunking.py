@@ -0,0 +1,51 @@
+from app.pre_processing.chunking import LegalStructureChunker
+
+PAGES = [
+    "LUẬT GIAO THÔNG ĐƯỜNG BỘ\nChương I\nNHỮNG QUY ĐỊNH CHUNG\nĐiều 1. Phạm vi điều chỉnh\n"
+    + "Luật này quy định về quy tắc giao thông đường bộ. " * 8
+    + "\nĐiều 2. Đối tượng áp dụng\n1. Cơ quan, tổ chức, cá nhân liên quan.\n",
+    "a) Người điều khiển phương tiện;\nb) Người đi bộ.\nChương II\nĐiều 3. Quy tắc chung\n"
+    + "Người tham gia giao thông phải đi bên phải theo chiều đi của mình. " * 10,
+]
+
+
+def _document(pages):
+    return "".join(page + "\n" for page in pages)
+
+
+def test_chunks_are_exact_slices_with_offset_overlap():
+    chunker = LegalStructureChunker(max_characters=300, overlap_size=40, min_characters=100)
+    chunks = list(chunker.chunk_pages(PAGES))
+    document = _document(PAGES)
+
+    assert [c["chunk_id"] for c in chunks] == list(range(1, len(chunks) + 1))
+    for prev, chunk in zip(chunks, chunks[1:]):
+        assert document[chunk["start"]:chunk["end"]] == chunk["content"]
+        assert len(chunk["content"]) <= 300 + 40
+        assert chunk["start"] < prev["end"]          # overlap lấy từ đuôi chunk trước
+
+
+def test_chunks_start_at_articles_and_carry_structure_path():
+    chunker = LegalStructureChunker(max_characters=2000, overlap_size=0, min_characters=100)
+    chunks = list(chunker.chunk_pages(PAGES))
+
+    assert chunks[1]["content"].startswith("Điều 2.")
+    assert chunks[1]["path"] == "Chương I > Điều 2"
+    assert chunks[-1]["path"] == "Chương II"
+    assert chunks[-1]["page"] == 2
+    assert "Điều 3. Quy tắc chung" in chunks[-1]["content"]
+
+
+def test_long_lines_without_spaces_are_cut():
+    chunker = LegalStructureChunker(max_characters=100, overlap_size=0)
+    chunks = chunker.split_document("x" * 250)
+    assert [len(c["content"]) for c in chunks] == [100, 100, 50]
+
+
+def test_min_characters_zero_splits_at_every_heading():
+    chunker = LegalStructureChunker(max_characters=200, overlap_size=0, min_characters=0)
+    assert [c["content"] for c in chunker.split_document("Điều 1. abc")] == ["Điều 1. abc"]
+
+    chunks = list(chunker.chunk_pages(["Chương I\nĐiều 1. Phạm vi.\nĐiều 2. Đối tượng."]))
+    assert [c["content"] for c in chunks] == ["Chương I", "Điều 1. Phạm vi.", "Điều 2. Đối tượng."]
+    assert chunks[-1]["path"] == "Chương I > Điều 2"
@@ -0,0 +1,46 @@
+from app.pre_processing.chunking import LegalStructureChunker
+from app.src.context import build_context, count_tokens, legacy_context
+
+
+def _doc(text, doc_hash="d1", code="100/2019/NĐ-CP"):
+    return {"text": text, "doc_type": "nghị định", "code": code, "issue_date": "2019-12-30",
+            "effective_date": "2020-01-01", "doc_hash": doc_hash}
+
+
+def test_adjacent_overlapping_chunks_merge_back_into_the_source_text():
+    text = " ".join(f"Điều {i}. Người điều khiển xe phải chấp hành quy định số {i}." for i in range(1, 40))
+    chunks = LegalStructureChunker(max_characters=300, overlap_size=50, min_characters=100).split_document(text)
+    assert len(chunks) > 3
+    # Truy vấn trả về chunk 3, 2, 4 (không theo thứ tự trong văn bản)
+    docs = [_doc(chunks[i]["content"]) for i in (2, 1, 3)]
+
+    context, stats = build_context(docs, max_tokens=10000)
+
+    assert stats["spans"] == 1 and stats["merged"] == 2
+    assert text[chunks[1]["start"]:chunks[3]["end"]] in context
+    assert context.count("Mã số:") == 1
+    assert stats["tokens"] < stats["legacy_tokens"] == count_tokens(legacy_context(docs))
+
+
+def test_duplicate_chunks_are_dropped_and_documents_keep_their_own_header():
+    docs = [
+        _doc("Điều 5. Phạt tiền từ 4 triệu đến 6 triệu đồng đối với hành vi vượt đèn đỏ."),
+        _doc("Điều 3. Giải thích từ ngữ.", doc_hash="d2", code="36/2024/QH15"),
+        _doc("Phạt tiền từ 4 triệu đến 6 triệu đồng"),
+    ]
+    context, stats = build_context(docs, max_tokens=10000)
+    assert stats["duplicates"] == 1 and stats["spans"] == 2
+    assert context.index("100/2019/NĐ-CP") < context.index("36/2024/QH15")
+
+
+def test_packs_spans_in_relevance_order_within_budget():
+    docs = [_doc(f"Điều {i}. " + "quy định chi tiết " * 30, doc_hash=f"d{i}", code=f"{i}/2024/NĐ-CP")
+            for i in range(1, 6)]
+    context, stats = build_context(docs, max_tokens=250)
+    assert stats["tokens"] <= 250
+    assert "1/2024/NĐ-CP" in context and "5/2024/NĐ-CP" not in context
+    assert stats["skipped"] > 0
+
+    # Chunk liên quan nhất luôn được giữ lại, bị cắt nếu vượt ngân sách
+    context, stats = build_context(docs[:1], max_tokens=40)
+    assert "Điều 1." in context and stats["tokens"] <= 40
@@ -0,0 +1,141 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fitz
+import pytest
+
+from app.src.data_processing import extract_text_from_pdf_file
+from app.src.downloader import PdfDownloader
+
+
+def _make_pdf(text):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class _PdfHandler(BaseHTTPRequestHandler):
+    files = {}
+    full_transfers = 0
+    not_modified = 0
+
+    def do_GET(self):
+        body = self.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            type(self).not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        type(self).full_transfers += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def pdf_server():
+    _PdfHandler.files = {}
+    _PdfHandler.full_transfers = 0
+    _PdfHandler.not_modified = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PdfHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", _PdfHandler
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_is_cached_and_revalidated(pdf_server, tmp_path):
+    base_url, handler = pdf_server
+    handler.files["/nd-123.pdf"] = _make_pdf("Dieu 1. Pham vi dieu chinh")
+    downloader = PdfDownloader(str(tmp_path))
+
+    first = downloader.fetch(f"{base_url}/nd-123.pdf")
+    second = downloader.fetch(f"{base_url}/nd-123.pdf")
+
+    assert not first.from_cache
+    assert second.from_cache
+    assert second.path == first.path
+    assert handler.full_transfers == 1
+    assert handler.not_modified == 1
+    assert "Dieu 1" in extract_text_from_pdf_file(second.path)
+
+
+def test_changed_document_is_downloaded_again(pdf_server, tmp_path):
+    base_url, handler = pdf_server
+    handler.files["/nd-123.pdf"] = b"%PDF-1.4 v1"
+    downloader = PdfDownloader(str(tmp_path))
+    first = downloader.fetch(f"{base_url}/nd-123.pdf")
+
+    handler.files["/nd-123.pdf"] = b"%PDF-1.4 v2"
+    second = downloader.fetch(f"{base_url}/nd-123.pdf")
+
+    assert not second.from_cache
+    assert second.content_hash != first.content_hash
+    assert second.read_bytes() == b"%PDF-1.4 v2"
+
+
+def test_mirrors_share_one_cached_file(pdf_server, tmp_path):
+    base_url, handler = pdf_server
+    handler.files["/a.pdf"] = handler.files["/mirror/a.pdf"] = b"%PDF-1.4 same"
+    downloader = PdfDownloader(str(tmp_path))
+
+    a = downloader.fetch(f"{base_url}/a.pdf")
+    b = downloader.fetch(f"{base_url}/mirror/a.pdf")
+
+    assert a.path == b.path
+    assert len(list((tmp_path / "blobs").iterdir())) == 1
+
+
+def test_cache_is_bounded(pdf_server, tmp_path):
+    base_url, handler = pdf_server
+    for i in range(3):
+        handler.files[f"/{i}.pdf"] = bytes([i]) * 100
+    downloader = PdfDownloader(str(tmp_path), max_cache_bytes=250)
+
+    for i in range(3):
+        with downloader.fetch(f"{base_url}/{i}.pdf"):
+            pass
+
+    assert sum(p.stat().st_size for p in (tmp_path / "blobs").iterdir()) <= 250
+    assert f"{base_url}/0.pdf" not in downloader._index
+
+
+def test_http_error_raises(pdf_server, tmp_path):
+    base_url, _ = pdf_server
+    with pytest.raises(ValueError):
+        PdfDownloader(str(tmp_path), retries=0).fetch(f"{base_url}/missing.pdf")
+
+
+def test_cache_does_not_evict_files_of_documents_still_open(pdf_server, tmp_path):
+    base_url, handler = pdf_server
+    for i in range(3):
+        handler.files[f"/{i}.pdf"] = bytes([i]) * 100
+    downloader = PdfDownloader(str(tmp_path), max_cache_bytes=150)
+
+    # Job đang parse 0.pdf trong khi các job khác tải 1.pdf, 2.pdf
+    in_use = downloader.fetch(f"{base_url}/0.pdf")
+    for i in (1, 2):
+        with downloader.fetch(f"{base_url}/{i}.pdf"):
+            pass
+
+    assert in_use.read_bytes() == bytes([0]) * 100
+    in_use.close()
+    in_use.close()
+    assert sum(p.stat().st_size for p in (tmp_path / "blobs").iterdir()) <= 150 and not downloader._pins
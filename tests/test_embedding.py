@@ -0,0 +1,30 @@
+import numpy as np
+
+from app.src import embedding
+
+
+class FakeModel:
+    """Stand-in for SentenceTransformer whose embedding size differs from embedding.dim."""
+    dim = 5
+
+    def __init__(self):
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, show_progress_bar=False):
+        self.calls.append(len(texts))
+        return np.array([[len(text)] * self.dim for text in texts], dtype=np.float32)
+
+
+def test_embed_texts_sizes_vectors_from_the_model_and_batches(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(embedding, "get_embedding_model", lambda: model)
+    progress = []
+
+    vectors = embedding.embed_texts(["a", "bb", "ccc"], batch_size=2, progress_callback=lambda *args: progress.append(args))
+
+    assert vectors.shape == (3, 5) and vectors.dtype == np.float32 and vectors.flags["C_CONTIGUOUS"]
+    assert vectors[:, 0].tolist() == [1, 2, 3]
+    assert model.calls == [2, 1] and progress[-1] == ("embed", 1.0)
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.src.executor import QueryExecutor, ExecutorBusyError, QueryTimeoutError
+
+
+def _elapsed_for(executor, calls, seconds=0.1):
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(executor.run(time.sleep, seconds) for _ in range(calls)))
+        return time.perf_counter() - start
+    return asyncio.run(main())
+
+
+def test_throughput_scales_with_workers():
+    one = QueryExecutor(max_workers=1, max_pending=16)
+    four = QueryExecutor(max_workers=4, max_pending=16)
+    assert _elapsed_for(one, 8) > 0.75
+    assert _elapsed_for(four, 8) < 0.45
+    one.shutdown()
+    four.shutdown()
+
+
+def test_rejects_beyond_max_pending_and_frees_slots():
+    executor = QueryExecutor(max_workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def main():
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorBusyError):
+            await executor.run(lambda: None)
+        release.set()
+        await asyncio.gather(*running)
+        return await executor.run(lambda: "ok")
+
+    assert asyncio.run(main()) == "ok"
+    executor.shutdown()
+
+
+def test_timeout_keeps_slot_until_work_finishes():
+    executor = QueryExecutor(max_workers=1, max_pending=1, timeout=0.05)
+
+    async def main():
+        with pytest.raises(QueryTimeoutError):
+            await executor.run(time.sleep, 0.3)
+        with pytest.raises(ExecutorBusyError):
+            await executor.run(lambda: None)
+        await asyncio.sleep(0.4)
+        return await executor.run(lambda: 42)
+
+    assert asyncio.run(main()) == 42
+    executor.shutdown()
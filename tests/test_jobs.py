@@ -0,0 +1,40 @@
+import time
+
+from app.src.jobs import JobQueue, SUCCEEDED, FAILED
+
+
+def _wait(job, timeout=5):
+    deadline = time.time() + timeout
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_job_reports_stages_and_timings():
+    def pipeline(n, progress_callback=None):
+        progress_callback("download")
+        progress_callback("embed", 0.5)
+        progress_callback("embed", 1.0)
+        return {"inserted_chunks": n}
+
+    queue = JobQueue(max_workers=1)
+    job = queue.submit(pipeline, {"url": "x"}, n=3)
+    _wait(job)
+    state = queue.get(job.job_id).to_dict()
+    assert state["status"] == SUCCEEDED
+    assert state["stage"] == "embed"
+    assert state["progress"] == 1.0
+    assert set(state["timings"]) == {"download", "embed"}
+    assert state["result"] == {"inserted_chunks": 3}
+    queue.shutdown()
+
+
+def test_job_failure_is_recorded():
+    def pipeline(progress_callback=None):
+        raise ValueError("Không tải được file PDF.")
+
+    queue = JobQueue(max_workers=1)
+    job = queue.submit(pipeline, {})
+    _wait(job)
+    assert job.status == FAILED
+    assert "PDF" in job.error
+    queue.shutdown()
@@ -0,0 +1,110 @@
+import numpy as np
+
+from app.src.lexical import BM25Index, load_lexical_index, reciprocal_rank_fusion, sync_lexical_index, tokenize
+from app.src.vector_store import NumpyVectorStore
+
+
+def test_tokenize_keeps_document_codes_and_article_references():
+    tokens = tokenize("Theo Điều 12 Nghị định 123/2020/NĐ-CP")
+    assert "123/2020/nđ-cp" in tokens
+    assert "điều_12" in tokens
+    assert "nghị_định" in tokens
+
+
+def test_bm25_ranks_exact_identifier_first_and_supports_removal():
+    index = BM25Index()
+    index.add(1, "Điều 12. Mức phạt vượt đèn đỏ theo Nghị định 100/2019/NĐ-CP", "nghị định", "100/2019/NĐ-CP")
+    index.add(2, "Điều 5. Hóa đơn điện tử theo Nghị định 123/2020/NĐ-CP", "nghị định", "123/2020/NĐ-CP")
+    index.add(3, "Luật giao thông đường bộ quy định về đèn tín hiệu", "luật", "23/2008/QH12")
+
+    assert index.search("123/2020/NĐ-CP")[0][0] == 2
+    assert [doc_id for doc_id, _ in index.search("đèn", doc_type="luật")] == [3]
+
+    index.remove(2)
+    assert len(index) == 2
+    assert index.search("hóa đơn điện tử") == []
+
+
+def test_bm25_save_and_load(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25.pkl"))
+    index.add(7, "Khoản 3 Điều 8 quy định thời hạn")
+    index.save()
+
+    loaded = BM25Index(path=str(tmp_path / "bm25.pkl"))
+    assert loaded.load()
+    assert loaded.search("điều 8")[0][0] == 7
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]])
+    assert fused[0][0] == 3
+    assert {doc_id for doc_id, _ in fused} == {1, 2, 3, 4}
+
+
+def _rows(texts):
+    return [{"text": text, "doc_type": "luật", "code": "", "issue_date": "", "effective_date": "", "doc_hash": "d",
+             "chunk_hash": text} for text in texts]
+
+
+def _store_with(path, texts, drop_existing=False):
+    store = NumpyVectorStore(path, dim=4, drop_existing=drop_existing)
+    store.insert(np.ones((len(texts), 4), dtype=np.float32), _rows(texts))
+    return store
+
+
+def test_load_lexical_index_rebuilds_when_saved_index_does_not_match_the_store(tmp_path):
+    path, index_path = str(tmp_path / "store"), str(tmp_path / "bm25.pkl")
+    store = _store_with(path, ["Điều 1. Vượt đèn đỏ", "Điều 2. Nồng độ cồn"])
+    load_lexical_index(store, BM25Index(path=index_path))
+    store.close()
+
+    # Store bị tạo lại (drop_existing): id 0 giờ là một chunk khác
+    store = _store_with(path, ["Điều 1. Hóa đơn điện tử"], drop_existing=True)
+    index = BM25Index(path=index_path)
+    load_lexical_index(store, index)
+    assert len(index) == 1 and index.search("đèn đỏ") == [] and index.search("hóa đơn")[0][0] == 0
+
+    # Chunk được insert sau lần save cuối (vd. tiến trình bị tắt đột ngột)
+    store.insert(np.ones((1, 4), dtype=np.float32), _rows(["Điều 2. Thuế"]))
+    index = BM25Index(path=index_path)
+    load_lexical_index(store, index)
+    assert len(index) == 2 and index.search("thuế")[0][0] == 1
+
+    index = BM25Index(path=index_path)
+    assert index.load(fingerprint={"store": store.fingerprint(), "count": 2})
+    store.close()
+
+
+def test_save_if_due_saves_after_save_every_changes_or_when_forced(tmp_path):
+    path = tmp_path / "bm25.pkl"
+    index = BM25Index(path=str(path), save_every=2, save_interval=3600)
+    index.add(1, "Điều 1")
+    assert not index.save_if_due() and not path.exists()
+    index.add(2, "Điều 2")
+    assert index.save_if_due() and path.exists()
+    assert not index.save_if_due(force=True)
+
+    index.remove(1)
+    assert index.save_if_due(force=True)
+    loaded = BM25Index(path=str(path))
+    assert loaded.load() and len(loaded) == 1
+
+
+def test_sync_lexical_index_picks_up_chunks_ingested_by_another_worker(tmp_path):
+    index_path = str(tmp_path / "bm25.pkl")
+    store = _store_with(str(tmp_path / "store"), ["Điều 1. Vượt đèn đỏ"])
+    # Hai worker uvicorn, mỗi worker một index trong bộ nhớ
+    worker_a, worker_b = BM25Index(path=index_path), BM25Index(path=index_path, sync_interval=0)
+    load_lexical_index(store, worker_a)
+    load_lexical_index(store, worker_b)
+
+    ids = store.insert(np.ones((1, 4), dtype=np.float32), _rows(["Điều 2. Nồng độ cồn"]))
+    worker_a.add(ids[0], "Điều 2. Nồng độ cồn")
+    assert worker_b.search("nồng độ cồn") == []
+
+    assert sync_lexical_index(store, worker_b)
+    assert len(worker_b) == 2 and worker_b.search("nồng độ cồn")[0][0] == ids[0]
+    assert not sync_lexical_index(store, worker_b)
+    # Chưa tới sync_interval thì không hỏi lại store
+    assert not sync_lexical_index(store, worker_a) and len(worker_a) == 2
+    store.close()
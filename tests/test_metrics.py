@@ -0,0 +1,44 @@
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.src import metrics
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_records_histogram_counters_and_request_breakdown():
+    before = _sample("legal_qa_stage_seconds_count", stage="test_stage")
+    timings = metrics.start_request_timings()
+    with metrics.stage("test_stage") as counts:
+        counts["chunks"] = 3
+    with pytest.raises(RuntimeError):
+        with metrics.stage("test_stage"):
+            raise RuntimeError("boom")
+
+    assert _sample("legal_qa_stage_seconds_count", stage="test_stage") == before + 2
+    assert _sample("legal_qa_chunks_total", stage="test_stage") >= 3
+    assert _sample("legal_qa_stage_errors_total", stage="test_stage") >= 1
+    assert "test_stage" in timings
+    assert metrics.server_timing_header({"embed": 0.0125}) == "embed;dur=12.5"
+
+
+def test_timed_iterator_counts_only_producer_time():
+    items = metrics.TimedIterator(iter(range(5)))
+    assert list(items) == [0, 1, 2, 3, 4]
+    assert items.items == 5 and items.seconds >= 0
+
+
+def test_metrics_endpoint_and_server_timing_header(monkeypatch):
+    from main import app
+
+    monkeypatch.setattr(metrics, "DEBUG_TIMING_HEADERS", True)
+    client = TestClient(app)
+    response = client.get("/health")
+    assert response.headers["Server-Timing"].startswith("total;dur=")
+
+    body = client.get("/metrics").text
+    assert "legal_qa_http_request_seconds_bucket" in body
+    assert 'route="/health"' in body
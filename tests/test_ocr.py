@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import fitz
+import pytest
+
+from app.src import ocr
+
+PAGES = 10
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    """Run ocr_pdf on threads with a fake _ocr_page; records submitted pages and OCR calls in flight."""
+    path = str(tmp_path / "scan.pdf")
+    doc = fitz.open()
+    for _ in range(PAGES):
+        doc.new_page()
+    doc.save(path)
+    doc.close()
+
+    state = {"path": path, "submitted": [], "started": [], "contexts": [], "fail_on": None}
+
+    class Pool(ThreadPoolExecutor):
+        def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+            state["contexts"].append(mp_context.get_start_method())
+            super().__init__(max_workers)
+
+        def submit(self, fn, *args):
+            state["submitted"].append(args[0])
+            return super().submit(fn, *args)
+
+    lock = threading.Lock()
+
+    def ocr_page(page_number, dpi, lang, config):
+        with lock:
+            state["started"].append(page_number)
+        # Trang sau xong trước, để kiểm tra thứ tự trả về
+        time.sleep(0.002 * (PAGES - page_number))
+        if page_number == state["fail_on"]:
+            raise RuntimeError(f"tesseract failed on page {page_number}")
+        return page_number, f"trang {page_number + 1}"
+
+    monkeypatch.setattr(ocr, "ProcessPoolExecutor", Pool)
+    monkeypatch.setattr(ocr, "_ocr_page", ocr_page)
+    return state
+
+
+def test_ocr_pdf_yields_pages_in_order_with_bounded_pages_in_flight(pool):
+    consumed = 0
+    pages = []
+    for page_number, text in ocr.ocr_pdf(pool["path"], max_workers=2, max_in_flight=3):
+        consumed += 1
+        assert len(pool["submitted"]) - consumed <= 3
+        pages.append((page_number, text))
+
+    assert pages == [(i, f"trang {i}") for i in range(1, PAGES + 1)]
+    assert pool["submitted"] == list(range(PAGES))
+    assert pool["contexts"] == ["spawn"]
+
+
+def test_ocr_pdf_raises_page_error_and_skips_pages_not_started(pool):
+    pool["fail_on"] = 3
+    pages = []
+    with pytest.raises(RuntimeError, match="page 3"):
+        for page_number, _ in ocr.ocr_pdf(pool["path"], max_workers=1, max_in_flight=2):
+            pages.append(page_number)
+
+    assert pages == [1, 2, 3]
+    # Chỉ trang kế tiếp (trang 5) đã được gửi đi; nó bị huỷ nếu chưa chạy và không gửi thêm trang nào
+    assert pool["submitted"] == [0, 1, 2, 3, 4] and max(pool["started"]) <= 4
@@ -0,0 +1,122 @@
+import time
+
+import numpy as np
+
+from app.src.cache import TTLCache, SemanticCache
+
+
+def test_ttl_cache_hit_miss_and_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # "a" trở thành mới dùng gần nhất
+    cache.set("c", 3)                   # đẩy "b" ra
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+
+
+def test_ttl_cache_expiry():
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("q", [0.1, 0.2])
+    time.sleep(0.02)
+    assert cache.get("q") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_semantic_cache_matches_similar_query_with_same_context():
+    cache = SemanticCache(maxsize=2, ttl=60, threshold=0.9)
+    cache.set([1.0, 0.0, 0.0], "ctx", "phạt 4-6 triệu", doc_hashes=["doc-a"])
+    assert cache.get([0.95, 0.1, 0.0], "ctx") == "phạt 4-6 triệu"   # câu hỏi gần nghĩa
+    assert cache.get([0.95, 0.1, 0.0], "ctx-khac") is None          # ngữ cảnh truy xuất đã đổi
+    assert cache.get([0.0, 1.0, 0.0], "ctx") is None                # câu hỏi khác hẳn
+
+    cache.set([0.0, 1.0, 0.0], "ctx", "b", doc_hashes=["doc-b"])
+    cache.set([0.0, 0.0, 1.0], "ctx", "c")                         # đẩy entry ít dùng nhất ra
+    assert cache.get([1.0, 0.0, 0.0], "ctx") is None
+    assert cache.invalidate_documents(["doc-b"]) == 1
+    assert cache.get([0.0, 1.0, 0.0], "ctx") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["evictions"] == 1 and stats["invalidations"] == 1
+
+
+def test_semantic_cache_expiry():
+    cache = SemanticCache(maxsize=10, ttl=0.01, threshold=0.9)
+    cache.set([1.0, 0.0], "ctx", "answer")
+    time.sleep(0.02)
+    assert cache.get([1.0, 0.0], "ctx") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_query_endpoint_filters_vector_and_lexical_hits_by_effective_date(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.router import api
+    from app.src import rag
+    from app.src.cache import query_embedding_cache, search_result_cache
+    from app.src.lexical import BM25Index
+    from app.src.vector_store import NumpyVectorStore
+    from main import app
+
+    store = NumpyVectorStore(str(tmp_path / "store"), dim=4)
+    dates = ["2019-07-01", "2020-12-03", "2021-06-30", ""]
+    texts = ["vượt đèn đỏ phạt tiền", "mức phạt vượt đèn đỏ", "đèn đỏ ô tô", "vượt đèn đỏ xe máy"]
+    rows = [{"text": text, "doc_type": "nghị định", "code": f"c{i}", "issue_date": "", "effective_date": d,
+             "doc_hash": "", "chunk_hash": str(i)} for i, (text, d) in enumerate(zip(texts, dates))]
+    ids = store.insert(np.eye(4, dtype=np.float32), rows)
+    index = BM25Index()
+    index.add_many(ids, texts, ["nghị định"] * 4, [row["code"] for row in rows])
+
+    monkeypatch.setattr(rag, "encode_queries", lambda queries: [[1.0, 0.0, 0.0, 0.0] for _ in queries])
+    monkeypatch.setattr(rag, "lexical_index", index)
+    monkeypatch.setattr(rag, "BATCHING", False)
+    monkeypatch.setattr(api, "get_collection", lambda: store)
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+
+    client = TestClient(app)
+    response = client.get("/query/", params={"keyword": "vượt đèn đỏ", "effective_after": "2020-01-01",
+                                             "effective_before": "2020-12-31"})
+    everything = client.get("/query/", params={"keyword": "vượt đèn đỏ"})
+    invalid = client.get("/query/", params={"keyword": "vượt đèn đỏ", "effective_after": "2021-01-01",
+                                            "effective_before": "2020-01-01"})
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+
+    assert [item["code"] for item in response.json()["answer"]] == ["c1"]
+    assert len(everything.json()["answer"]) == 3
+    assert invalid.status_code == 422
+    assert client.get("/query/", params={"keyword": "x", "effective_before": "31/12/2020"}).status_code == 422
+
+
+def test_query_endpoint_date_range_covering_every_document_returns_nearest(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.router import api
+    from app.src import rag
+    from app.src.cache import query_embedding_cache, search_result_cache
+    from app.src.vector_store import NumpyVectorStore
+    from main import app
+
+    store = NumpyVectorStore(str(tmp_path / "store"), dim=4)
+    # Ngày hiệu lực giảm dần theo id: idx_effective_ymd trả id theo thứ tự ngược lại
+    rows = [{"text": f"t{i}", "doc_type": "luật", "code": f"c{i}", "issue_date": "", "effective_date": f"202{3 - i}-01-01",
+             "doc_hash": "", "chunk_hash": str(i)} for i in range(4)]
+    store.insert(np.eye(4, dtype=np.float32), rows)
+
+    monkeypatch.setattr(rag, "encode_queries", lambda queries: [np.eye(4)["abcd".index(query[-1])].tolist() for query in queries])
+    monkeypatch.setattr(rag, "HYBRID_SEARCH", False)
+    monkeypatch.setattr(rag, "BATCHING", False)
+    monkeypatch.setattr(api, "get_collection", lambda: store)
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+
+    client = TestClient(app)
+    answers = [client.get("/query/", params={"keyword": f"điều {c}", "effective_before": "2099-12-31"}).json()["answer"]
+               for c in "abcd"]
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+
+    assert [answer[0]["code"] for answer in answers] == ["c0", "c1", "c2", "c3"]
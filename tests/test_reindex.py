@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from app.src import embedding
+from app.src.downloader import CachedDocument
+
+METADATA = {"doc_type": "nghị định", "code": "100/2019/NĐ-CP", "issue_date": "2019-12-30", "effective_date": "2020-01-01"}
+
+
+def _chunks(store, doc_id):
+    rows = store.query({"doc_id": doc_id}, ["text", "chunk_index", "doc_hash", "code"])
+    return sorted(rows, key=lambda row: row["chunk_index"])
+
+
+def test_replace_embeds_only_changed_chunks_and_deletes_stale_ones(store):
+    v1 = ["Điều 1. Phạm vi.", "Điều 2. Đối tượng.", "Điều 3. Mức phạt 2 triệu.", "Điều 4. Hiệu lực."]
+    first = embedding.replace_document_chunks("100/2019/NĐ-CP", "h1", v1, METADATA)
+    assert first["new_chunks"] == 4 and store.embedded == v1
+
+    # Sửa Điều 3, chèn Điều 2a, bỏ Điều 4
+    v2 = ["Điều 1. Phạm vi.", "Điều 2. Đối tượng.", "Điều 2a. Giải thích.", "Điều 3. Mức phạt 4 triệu."]
+    store.embedded.clear()
+    second = embedding.replace_document_chunks("100/2019/NĐ-CP", "h2", v2, dict(METADATA, code="100/2019/NĐ-CP (sửa đổi)"))
+
+    assert store.embedded == ["Điều 2a. Giải thích.", "Điều 3. Mức phạt 4 triệu."]
+    assert (second["new_chunks"], second["updated_chunks"], second["deleted_chunks"]) == (2, 2, 2)
+    rows = _chunks(store, "100/2019/NĐ-CP")
+    assert [row["text"] for row in rows] == v2 and [row["chunk_index"] for row in rows] == [0, 1, 2, 3]
+    assert [row["doc_hash"] for row in rows] == ["h2"] * 4
+    assert {row["code"] for row in rows} == {"100/2019/NĐ-CP (sửa đổi)"}
+    hits = embedding.lexical_index.search("mức phạt")
+    assert [store.query({"id": i}, ["text"])[0]["text"] for i, _ in hits] == ["Điều 3. Mức phạt 4 triệu."]
+
+    store.embedded.clear()
+    third = embedding.replace_document_chunks("100/2019/NĐ-CP", "h2", v2, dict(METADATA, code="100/2019/NĐ-CP (sửa đổi)"))
+    assert store.embedded == [] and third["unchanged_chunks"] == 4 and third["updated_chunks"] == 0
+
+
+def test_amendment_with_same_metadata_only_embeds_the_edited_chunk(store, monkeypatch):
+    v1 = [f"Điều {i}. Quy định số {i}." for i in range(1, 21)]
+    embedding.replace_document_chunks("100/2019/NĐ-CP", "h1", v1, METADATA)
+    store.embedded.clear()
+    updated = []
+    update = store.update
+    store.update = lambda ids, rows: updated.extend(rows) or update(ids, rows)
+    tokenized = []
+    monkeypatch.setattr(embedding.lexical_index, "add", lambda *args: tokenized.append(args))
+
+    v2 = v1[:9] + ["Điều 10. Quy định số 10 (sửa đổi)."] + v1[10:]
+    result = embedding.replace_document_chunks("100/2019/NĐ-CP", "h2", v2, METADATA)
+
+    assert (result["new_chunks"], result["updated_chunks"], result["deleted_chunks"]) == (1, 0, 1)
+    assert result["unchanged_chunks"] == 19 and store.embedded == ["Điều 10. Quy định số 10 (sửa đổi)."]
+    # Chunk giữ lại chỉ được ghi lại doc_hash, không phải tokenize lại cho BM25
+    assert len(updated) == 19 and {row["doc_hash"] for row in updated} == {"h2"} and len(tokenized) == 1
+    assert [row["text"] for row in _chunks(store, "100/2019/NĐ-CP")] == v2
+
+    updated.clear()
+    embedding.replace_document_chunks("100/2019/NĐ-CP", "h2", v2, METADATA)
+    assert updated == []
+
+
+def test_reindex_without_new_chunks_replaces_the_stored_version_hash(store):
+    v1 = ["Điều 1. Phạm vi.", "Điều 2. Đối tượng.", "Điều 3. Hiệu lực."]
+    embedding.replace_document_chunks("100/2019/NĐ-CP", "h1", v1, METADATA)
+
+    # Phiên bản mới chỉ bỏ Điều 2 và đổi thứ tự, không có chunk mới
+    result = embedding.replace_document_chunks("100/2019/NĐ-CP", "h2", [v1[2], v1[0]], METADATA)
+
+    assert result["new_chunks"] == 0 and result["deleted_chunks"] == 1
+    assert embedding.document_exists("h2") and not embedding.document_exists("h1")
+    assert embedding.document_hashes("100/2019/NĐ-CP") == {"h2"}
+
+
+def test_delete_document_removes_chunks_and_lexical_entries(store):
+    embedding.replace_document_chunks("a", "ha", ["Điều 1. Vượt đèn đỏ bị phạt."], METADATA)
+    embedding.replace_document_chunks("b", "hb", ["Điều 1. Nồng độ cồn."], METADATA)
+
+    assert embedding.delete_document("a") == 1
+    assert embedding.delete_document("a") == 0
+    assert _chunks(store, "a") == [] and len(_chunks(store, "b")) == 1
+    assert embedding.lexical_index.search("đèn đỏ") == []
+
+
+def test_upload_waits_for_jobs_on_the_same_doc_id(store, monkeypatch):
+    monkeypatch.setattr(embedding, "download_pdf", lambda url: CachedDocument(url, url, f"h-{url}", 0, from_cache=True))
+    monkeypatch.setattr(embedding, "extract_document_chunks", lambda pdf, progress_callback=None: [f"Điều 1. {pdf.url}"])
+    key = embedding.doc_key("100/2019/NĐ-CP")
+    assert embedding.claim(key)
+    try:
+        # PUT / DELETE hoặc một upload phiên bản khác đang giữ doc_id này
+        with pytest.raises(RuntimeError):
+            embedding.insert_embedding("v2.pdf", **METADATA)
+    finally:
+        embedding.release(key)
+    assert embedding.claim("h-v2.pdf")
+    embedding.release("h-v2.pdf")
+
+    assert embedding.insert_embedding("v2.pdf", **METADATA)["new_chunks"] == 1
+    with pytest.raises(ValueError):
+        embedding.insert_embedding("v3.pdf", **METADATA)
+
+
+def test_chunk_shared_with_another_document_is_stored_again_with_the_stored_vector(store, monkeypatch):
+    shared = "Điều 5. Người vi phạm bị phạt tiền theo quy định."
+    texts = {"a.pdf": [shared, "Điều 1. Phạm vi của nghị định A."], "b.pdf": [shared, "Điều 1. Phạm vi của nghị định B."]}
+    monkeypatch.setattr(embedding, "download_pdf", lambda url: CachedDocument(url, url, f"h-{url}", 0, from_cache=True))
+    monkeypatch.setattr(embedding, "extract_document_chunks", lambda pdf, progress_callback=None: texts[pdf.url])
+    embedding.insert_embedding("a.pdf", **dict(METADATA, code="A"))
+    store.embedded.clear()
+
+    result = embedding.insert_embedding("b.pdf", **dict(METADATA, code="B"))
+
+    assert store.embedded == ["Điều 1. Phạm vi của nghị định B."]
+    assert (result["new_chunks"], result["reused_chunks"], result["deduplicated_chunks"]) == (1, 1, 1)
+    assert [row["text"] for row in _chunks(store, "B")] == texts["b.pdf"]
+    vector = store.get_vectors([_chunks(store, "A")[0]["id"]])
+    hits = store.search(list(vector.values()), top_k=1, filters={"code": "B"}, output_fields=["text"])[0]
+    assert [hit["text"] for hit in hits] == [shared]
+
+    # Xoá văn bản A không làm mất chunk chung của B
+    embedding.delete_document("A")
+    assert [row["text"] for row in _chunks(store, "B")] == texts["b.pdf"]
+
+
+def test_replace_reuses_vectors_of_chunks_stored_for_another_document(store):
+    shared = "Điều 5. Người vi phạm bị phạt tiền theo quy định."
+    embedding.replace_document_chunks("a", "ha", [shared], METADATA)
+    store.embedded.clear()
+
+    result = embedding.replace_document_chunks("b", "hb", [shared, "Điều 6. Hiệu lực.", shared], METADATA)
+
+    assert store.embedded == ["Điều 6. Hiệu lực."]
+    assert (result["new_chunks"], result["reused_chunks"], result["deduplicated_chunks"]) == (1, 1, 2)
+    assert [row["text"] for row in _chunks(store, "b")] == [shared, "Điều 6. Hiệu lực."]
+    a, b = _chunks(store, "a")[0]["id"], _chunks(store, "b")[0]["id"]
+    vectors = store.get_vectors([a, b])
+    assert np.array_equal(vectors[a], vectors[b])
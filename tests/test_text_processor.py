@@ -0,0 +1,54 @@
+import pytest
+
+from app.pre_processing import text_processor as tp
+from app.pre_processing.text_processor import TextProcessor
+
+SAMPLES = [
+    "Điều 5. Phạt tiền từ 4.000.000 đồng đến 6.000.000 đồng 😀 (áp dụng +++ cho ô tô)",
+    "<p>Khoản 1&nbsp;Điều 3</p><br/>a) người điều khiển xe &amp; phương tiện",
+    "  dòng 1\nđầu dòng thường\nĐầu dòng hoa\r\n\t☀ hết  ",
+    "Nghị định 100/2019/NĐ-CP; mức phạt: 2 triệu\xa0đồng – [tái phạm] ® ð",
+    "  \n  ",
+    "++ = ; :",
+]
+
+
+def _step_by_step(text, dot=True):
+    if not text:
+        return ""
+    text = tp.normalize_text(text)
+    text = tp.remove_html_tags(text)
+    text = tp.decode_html_entities(text)
+    text = tp.strip_emoji(text)
+    text = tp.remove_special_chars(text)
+    text = tp.sub_multi_plus(text)
+    text = tp.sub_multi_space(text)
+    if dot:
+        text = tp.ensure_ends_with_dot(text)
+    return text.strip()
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_fused_pipeline_matches_step_by_step_functions(text):
+    processor = TextProcessor()
+    assert processor.clean_text(text) == _step_by_step(text)
+    assert processor.process_shortDescription(text) == _step_by_step(text, dot=False)
+
+    expected = tp.strip_emoji(tp.normalize_searchterm(text))
+    expected = tp.sub_multi_plus(tp.remove_special_char_at_ends(tp.remove_special_chars(expected)))
+    assert processor.process_searchterm(text) == tp.sub_multi_space(expected).strip().lower()
+
+
+def test_plain_text_fast_path_matches_html_parser():
+    from bs4 import BeautifulSoup
+
+    for text in ["Điều 1\nphạm vi", "  \n  ", " \t", "a\r\nb\xa0c", ""]:
+        parsed = BeautifulSoup(text, "html.parser").get_text(separator="\n").replace("\xa0", " ")
+        assert tp.remove_html_tags(text) == tp.RE_JOIN_LINE.sub("", parsed)
+
+
+def test_clean_texts_keeps_order_with_a_process_pool():
+    processor = TextProcessor()
+    expected = [processor.clean_text(text) for text in SAMPLES]
+    assert processor.clean_texts(iter(SAMPLES)) == expected
+    assert processor.clean_texts(SAMPLES, workers=2, chunksize=2) == expected
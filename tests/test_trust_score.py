@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.pre_processing.trust_score import VietnameseTextScorer, score_texts
+from app.src.embedding import select_quality_chunks
+
+GOOD = ("Điều 5. Xử phạt người điều khiển xe ô tô vi phạm quy tắc giao thông đường bộ. 1. Phạt tiền từ "
+        "400.000 đồng đến 600.000 đồng đối với người điều khiển xe thực hiện một trong các hành vi vi phạm "
+        "sau đây: a) Không chấp hành hiệu lệnh, chỉ dẫn của biển báo hiệu; b) Chuyển làn đường không đúng nơi cho phép.")
+JUNK = [
+    "Trang 12/45",
+    "~~ ^^ |||| ;;;; @@@ ### lIl1 ]] [[ ::: ... ,,, ~~~ %%% ^&* ()()",
+    "STT | Mã | Số tiền\n1 | 01 | 1.000.000\n2 | 02 | 2.500.000\n3 | 03 | 4.000.000",
+]
+
+
+def test_batch_scores_equal_single_chunk_scores():
+    chunks = [GOOD, "", "   ", "Chương I\nQUY ĐỊNH CHUNG", "Số: 100/2019/NĐ-CP 😀", "İstanbul ĐIỀU!!! Sao?"] + JUNK
+    for source in (None, "vac", "chat"):
+        scores = score_texts(chunks, source)
+        assert isinstance(scores, np.ndarray) and scores.shape == (len(chunks),)
+        assert scores.tolist() == [VietnameseTextScorer().score(chunk, source) for chunk in chunks]
+
+
+def test_score_does_not_leak_features_between_chunks():
+    scorer = VietnameseTextScorer()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda chunk: scorer.score(chunk, None), [GOOD, "không có dấu câu"] * 50))
+    assert results == [VietnameseTextScorer().score(chunk, None) for chunk in [GOOD, "không có dấu câu"] * 50]
+
+
+def test_quality_gate_drops_junk_chunks():
+    kept, dropped = select_quality_chunks([GOOD] + JUNK, min_score=0.35)
+    assert kept == [GOOD] and dropped == len(JUNK)
+    assert select_quality_chunks(JUNK, min_score=0) == (JUNK, 0)
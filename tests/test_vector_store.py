@@ -0,0 +1,227 @@
+import socket
+import uuid
+
+import numpy as np
+import pytest
+
+from app.src.vector_store import (NumpyVectorStore, MilvusVectorStore, milvus_filter, index_config, date_to_int,
+                                  higher_is_better)
+
+DIM = 8
+
+
+def _milvus_available(host="localhost", port=19530) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+# Metric truyền tường minh cho cả hai backend; COSINE là mặc định trong config/config.yaml
+@pytest.fixture(params=[("numpy", "L2"), ("numpy", "COSINE"), ("milvus", "L2"), ("milvus", "COSINE")],
+                ids=lambda param: "-".join(param))
+def store(request, tmp_path):
+    backend, metric = request.param
+    if backend == "numpy":
+        store = NumpyVectorStore(str(tmp_path / "store"), dim=DIM, metric=metric)
+        yield store
+        store.close()
+    else:
+        if not _milvus_available():
+            pytest.skip("Milvus server is not reachable")
+        from pymilvus import utility
+        index_params, search_params = index_config(metric=metric)
+        store = MilvusVectorStore(collection_name=f"test_{uuid.uuid4().hex[:8]}", dim=DIM,
+                                  index_params=index_params, search_params=search_params)
+        yield store
+        utility.drop_collection(store.collection_name)
+
+
+def _row(text, doc_type="luật", code="01/2020/QH14", effective_date=""):
+    return {"text": text, "doc_type": doc_type, "code": code, "issue_date": "", "effective_date": effective_date,
+            "doc_hash": "d-" + code, "chunk_hash": "c-" + text}
+
+
+def _insert(store, n=20, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    rows = [_row(f"chunk {i}", doc_type="luật" if i % 2 else "nghị định", code=f"{i % 3}/2020")
+            for i in range(n)]
+    ids = store.insert(vectors, rows)
+    store.flush()
+    return vectors, rows, ids
+
+
+def test_search_returns_nearest_first_with_fields(store):
+    vectors, rows, ids = _insert(store)
+    hits = store.search(vectors[[4, 7]], top_k=3, output_fields=["text", "code"])
+    assert [h["id"] for h in hits[0]][0] == ids[4]
+    assert hits[1][0]["text"] == "chunk 7"
+    # Khoảng cách tới chính nó là 0 với L2, độ tương đồng là 1 với COSINE
+    if higher_is_better(store.metric):
+        assert hits[0][0]["score"] == pytest.approx(1.0, abs=1e-3)
+        assert all(a["score"] >= b["score"] for a, b in zip(hits[0], hits[0][1:]))
+    else:
+        assert hits[0][0]["score"] == pytest.approx(0.0, abs=1e-3)
+        assert all(a["score"] <= b["score"] for a, b in zip(hits[0], hits[0][1:]))
+
+
+def test_search_and_query_apply_filters(store):
+    vectors, rows, ids = _insert(store)
+    hits = store.search(vectors[[4]], top_k=5, filters={"doc_type": "luật", "code": ["1/2020", "2/2020"]},
+                        output_fields=["doc_type", "code"])[0]
+    assert hits and all(h["doc_type"] == "luật" and h["code"] in ("1/2020", "2/2020") for h in hits)
+
+    rows_found = store.query({"chunk_hash": ["c-chunk 1", "c-chunk 2", "c-missing"]}, output_fields=["chunk_hash"])
+    assert sorted(r["chunk_hash"] for r in rows_found) == ["c-chunk 1", "c-chunk 2"]
+    assert len(store.query({"doc_type": "luật"}, output_fields=["id"], limit=3)) == 3
+
+
+def test_filter_matching_every_row_keeps_ids_paired_with_scores(store):
+    # Thứ tự code / ngày hiệu lực khác thứ tự id nên SQLite trả id theo thứ tự của index
+    vectors = np.eye(4, DIM, dtype=np.float32)
+    rows = [_row(f"chunk {i}", code=code, effective_date=f"202{3 - i}-01-01") for i, code in enumerate("BADC")]
+    ids = store.insert(vectors, rows)
+    store.flush()
+    for filters in ({"code": list("ABCD")}, {"effective_ymd": {"gte": 1, "lte": 20991231}}):
+        hits = store.search(vectors, top_k=1, filters=filters, output_fields=["text"])
+        assert [h[0]["id"] for h in hits] == ids
+        assert [h[0]["text"] for h in hits] == [f"chunk {i}" for i in range(4)]
+
+
+def test_search_and_query_apply_date_ranges(store):
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((6, DIM)).astype(np.float32)
+    dates = ["2019-07-01", "01/01/2020", "2020-12-03", "2021-06-30", "", "ngày 5"]
+    ids = store.insert(vectors, [_row(f"chunk {i}", effective_date=d) for i, d in enumerate(dates)])
+    store.flush()
+
+    rows = store.query({"id": ids}, ["effective_ymd"])
+    assert sorted(r["effective_ymd"] for r in rows) == [0, 0, 20190701, 20200101, 20201203, 20210630]
+
+    in_2020 = {"effective_ymd": {"gte": 20200101, "lt": 20210101}}
+    hits = store.search(vectors[[3]], top_k=6, filters={"doc_type": "luật", **in_2020}, output_fields=["text"])[0]
+    assert sorted(h["text"] for h in hits) == ["chunk 1", "chunk 2"]
+    assert len(store.query({"effective_ymd": {"gt": 0, "lte": 20200101}}, ["id"])) == 2
+    with pytest.raises(ValueError):
+        store.query({"effective_ymd": {"after": 1}}, ["id"])
+
+
+def test_delete_count_and_iterate(store):
+    _insert(store)
+    assert store.count() == 20
+    assert store.delete({"code": "0/2020"}) == 7
+    store.flush()
+    assert store.count() == 13
+    rows = [row for batch in store.iterate(["text", "code"], batch_size=5) for row in batch]
+    assert len(rows) == 13 and all(row["code"] != "0/2020" for row in rows)
+
+
+def test_update_sets_fields_and_keeps_vectors(store):
+    vectors, rows, ids = _insert(store, n=4)
+    assert store.query({"id": ids[0]}, ["doc_id", "chunk_index"])[0] == {"id": ids[0], "doc_id": "d-0/2020", "chunk_index": -1}
+
+    new_ids = store.update(ids[:2], [{"chunk_index": 7}, {"chunk_index": 8, "code": "9/2020"}])
+    store.flush()
+    rows_found = {r["text"]: r for r in store.query({"id": new_ids}, ["text", "code", "chunk_index"])}
+    assert rows_found["chunk 0"]["chunk_index"] == 7 and rows_found["chunk 0"]["code"] == "0/2020"
+    assert rows_found["chunk 1"]["chunk_index"] == 8 and rows_found["chunk 1"]["code"] == "9/2020"
+    assert store.search(vectors[[1]], top_k=1, output_fields=["text"])[0][0]["text"] == "chunk 1"
+    assert store.count() == 4
+
+
+def test_numpy_store_migrates_v1_schema(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "store"
+    path.mkdir()
+    db = sqlite3.connect(path / "metadata.sqlite")
+    db.execute("CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT, doc_type TEXT, code TEXT, issue_date TEXT, "
+               "effective_date TEXT, doc_hash TEXT, chunk_hash TEXT)")
+    db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    db.executemany("INSERT INTO meta VALUES (?, ?)", [("schema_version", "1"), ("dim", str(DIM)), ("size", "1")])
+    db.execute("INSERT INTO chunks VALUES (0, 'chunk 0', 'luật', '1/2020', '', '', 'h0', 'c0')")
+    db.commit()
+    db.close()
+
+    store = NumpyVectorStore(str(path), dim=DIM)
+    assert store.query({"doc_id": "h0"}, ["text", "chunk_index"]) == [{"id": 0, "text": "chunk 0", "chunk_index": -1}]
+
+
+def test_numpy_store_migrates_v2_schema_and_keeps_dates_in_sync(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "store"
+    path.mkdir()
+    db = sqlite3.connect(path / "metadata.sqlite")
+    db.execute("CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT, doc_type TEXT, code TEXT, issue_date TEXT, "
+               "effective_date TEXT, doc_hash TEXT, chunk_hash TEXT, doc_id TEXT, chunk_index INTEGER)")
+    db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    db.executemany("INSERT INTO meta VALUES (?, ?)", [("schema_version", "2"), ("dim", str(DIM)), ("size", "2")])
+    db.executemany("INSERT INTO chunks VALUES (?, ?, 'luật', '1/2020', ?, ?, 'h0', ?, 'h0', ?)",
+                   [(0, "chunk 0", "2020-10-19", "03/12/2020", "c0", 0), (1, "chunk 1", "", "???", "c1", 1)])
+    db.commit()
+    db.close()
+
+    store = NumpyVectorStore(str(path), dim=DIM)
+    assert store.query({}, ["issue_ymd", "effective_ymd"]) == [
+        {"id": 0, "issue_ymd": 20201019, "effective_ymd": 20201203}, {"id": 1, "issue_ymd": 0, "effective_ymd": 0}]
+
+    store.update([1], [{"effective_date": "2021-01-01"}])
+    assert store.query({"effective_ymd": {"gte": 20210101}}, ["text"]) == [{"id": 1, "text": "chunk 1"}]
+
+
+def test_numpy_store_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, dim=DIM)
+    vectors, rows, ids = _insert(store, n=1500)  # vượt capacity ban đầu
+    store.delete({"text": "chunk 3"})
+    store.close()
+
+    reopened = NumpyVectorStore(path, dim=DIM)
+    assert reopened.count() == 1499
+    hit = reopened.search(vectors[[1200]], top_k=1, output_fields=["text"])[0][0]
+    assert hit["id"] == ids[1200] and hit["text"] == "chunk 1200"
+    assert all(h["id"] != ids[3] for h in reopened.search(vectors[[3]], top_k=5)[0])
+    assert reopened.insert(vectors[:1], rows[:1]) == [1500]
+
+
+def test_milvus_filter_passes_values_as_template_params():
+    expr, params = milvus_filter({"code": 'a" or 1 == 1', "id": (1, 2), "effective_ymd": {"gte": 20200101, "lt": 20210101}})
+    assert expr == ("code == {code} and id in {id} and effective_ymd >= {effective_ymd_gte}"
+                    " and effective_ymd < {effective_ymd_lt}")
+    assert params == {"code": 'a" or 1 == 1', "id": [1, 2], "effective_ymd_gte": 20200101, "effective_ymd_lt": 20210101}
+    assert milvus_filter(None) == (None, {})
+    with pytest.raises(ValueError):
+        milvus_filter({"embedding": 1})
+    with pytest.raises(ValueError):
+        milvus_filter({"effective_ymd": {"between": 1}})
+
+
+def test_date_to_int_parses_supported_formats():
+    from datetime import date
+
+    assert date_to_int("2020-12-03") == date_to_int("03/12/2020") == date_to_int(20201203) == 20201203
+    assert date_to_int(date(2021, 1, 5)) == 20210105
+    assert date_to_int("") == date_to_int(None) == 0
+    with pytest.raises(ValueError):
+        date_to_int("2020-13-01")
+
+
+@pytest.mark.parametrize("metric", ["IP", "COSINE"])
+def test_numpy_similarity_metrics_rank_highest_first(tmp_path, metric):
+    store = NumpyVectorStore(str(tmp_path / metric), dim=DIM, metric=metric)
+    vectors, rows, ids = _insert(store)
+    hits = store.search(vectors[[5]], top_k=4)[0]
+    assert all(a["score"] >= b["score"] for a, b in zip(hits, hits[1:]))
+    if metric == "COSINE":
+        assert hits[0]["id"] == ids[5] and hits[0]["score"] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_index_config_fills_type_defaults_and_validates():
+    index_params, search_params = index_config("hnsw", "cosine", params=None, search_params={"ef": 128})
+    assert index_params["index_type"] == "HNSW" and index_params["metric_type"] == "COSINE"
+    assert search_params == {"metric_type": "COSINE", "params": {"ef": 128}}
+    with pytest.raises(ValueError):
+        index_config("ANNOY", "L2")